@@ -0,0 +1,60 @@
+"""Benchmark the cold import time of the uclchem_tools modules.
+
+Every import is timed in a fresh interpreter, so nothing is cached between measurements.
+It also reports which heavy dependencies were pulled in, the readers should only need
+h5py, numpy and pandas.
+
+Example: python scripts/benchmark_import_time.py --repeat 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    "uclchem_tools",
+    "uclchem_tools.io.io",
+    "uclchem_tools.io.rates",
+]
+HEAVY_DEPENDENCIES = ["uclchem", "tables", "tqdm", "joblib"]
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps({{"duration": duration, "loaded": [m for m in {heavy} if m in sys.modules]}}))
+"""
+
+
+def measure(module, repeat=3):
+    durations = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                MEASURE.format(module=module, heavy=HEAVY_DEPENDENCIES),
+            ],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            return None, result.stderr.strip().splitlines()[-1]
+        result = json.loads(result.stdout.strip().splitlines()[-1])
+        durations.append(result["duration"])
+    return statistics.median(durations), result["loaded"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for module in args.modules:
+        duration, loaded = measure(module, args.repeat)
+        if duration is None:
+            print(f"{module:<30} failed: {loaded}")
+        else:
+            print(f"{module:<30} {duration * 1000:8.1f} ms  heavy imports: {loaded}")
@@ -0,0 +1,47 @@
+from uclchem_tools.io.inspector import advise_chunks, apply_chunks, get_layout_notes, inspect_store
+from uclchem_tools.io.trace import AccessTrace
+import argparse
+import os
+
+import pandas as pd
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("hdf_path", help="The store to inspect")
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="An access trace saved with DataLoaderHDF(..., trace=True).trace.save(path), "
+        "to advise the chunking of the abundances for these reads.",
+    )
+    parser.add_argument(
+        "--apply",
+        default=None,
+        help="Repack the store with the advised chunks into this new store, needs --trace.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_parser()
+    report = inspect_store(args.hdf_path)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(report.to_string(index=False))
+    print(f"\n{int(report['count'].sum())} objects, {os.path.getsize(args.hdf_path)} bytes on disk")
+    for note in get_layout_notes(report, os.path.getsize(args.hdf_path)):
+        print(f"- {note}")
+    if args.trace:
+        advice = advise_chunks(args.hdf_path, AccessTrace.load(args.trace))
+        print(
+            f"\nThe chunks of the abundances, {advice['current_chunks'] or 'contiguous'}, read "
+            f"{advice['current_amplification']:.2f}x the requested bytes."
+        )
+        if advice["rechunk"]:
+            print(f"Chunks of {advice['chunks']} would read {advice['amplification']:.2f}x.")
+        else:
+            print("No other chunk shape reads them faster.")
+        if args.apply:
+            apply_chunks(args.hdf_path, args.apply, advice)
+    elif args.apply:
+        raise RuntimeError("--apply needs the access trace of --trace.")
@@ -0,0 +1,49 @@
+from uclchem_tools.io.merge import CONFLICT_POLICIES, merge_stores
+import argparse
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output_path", help="The path of the merged store to create")
+    parser.add_argument(
+        "input_paths",
+        nargs="+",
+        help="The stores to merge, a single store is repacked",
+    )
+    parser.add_argument(
+        "--on_conflict",
+        default="error",
+        choices=CONFLICT_POLICIES,
+        help="What to do with a storage_id that is in several stores: stop, keep the model of the first store "
+        "or rename it by appending the index of the store.",
+    )
+    parser.add_argument(
+        "--compression",
+        default=None,
+        help="Recompress the outputs of the models, e.g. gzip or lzf, none to store them uncompressed. "
+        "Keeps the compression of the stores if omitted.",
+    )
+    parser.add_argument(
+        "--compression_opts",
+        type=int,
+        default=None,
+        help="The options of the compression, e.g. the gzip level.",
+    )
+    parser.add_argument(
+        "--chunk_rows",
+        type=int,
+        default=None,
+        help="Re-chunk the abundances of every model to this many rows per chunk, keeps the chunks if omitted.",
+    )
+    parser.add_argument(
+        "--chunk_columns",
+        type=int,
+        default=None,
+        help="Re-chunk the abundances of every model to this many columns per chunk, keeps the chunks if omitted.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_parser()
+    merge_stores(**vars(args))
@@ -1,6 +1,8 @@
 import uclchem_tools
 import pandas as pd
 from uclchem_tools.io.io import GridConverter
+from uclchem_tools.io.shards import finalize_shards
+from uclchem_tools.utils.partition import resolve_task, wait_for_tasks
 import argparse
 
 
@@ -16,18 +18,65 @@ def get_parser():
     parser.add_argument(
         "--abundances_dir",
         nargs="?",
-        default="default_value",
+        default=None,
         help="Optional directory that stores the abundance files, useful in case you moved these since creating the grid.",
     )
     parser.add_argument(
         "--derivatives_dir",
         nargs="?",
-        default="default_value",
+        default=None,
         help="Optional directory that stores the derivatives files, useful in case you moved these since creating the grid.",
     )
+    parser.add_argument(
+        "--shard_index",
+        type=int,
+        help="Only convert this shard of the grid, to run the conversion on several nodes. "
+        "Read from the job array environment (SLURM, SGE, LSF, PBS) if omitted.",
+    )
+    parser.add_argument(
+        "--num_shards",
+        type=int,
+        help="The total number of shards the grid is converted in. "
+        "Read from the job array environment if omitted.",
+    )
+    parser.add_argument(
+        "--marker_dir",
+        default=None,
+        help="Directory for the per shard completion markers, with --finalize wait until all shards are done.",
+    )
+    parser.add_argument(
+        "--swmr",
+        action="store_true",
+        help="Write in HDF5 single writer multiple reader mode, so DataLoaderHDF(live=True) can follow the conversion.",
+    )
+    parser.add_argument(
+        "--encoding",
+        default="float32",
+        choices=["float32", "log16"],
+        help="Store the abundances as float32 or as 16 bit log10 codes without the species at the floor.",
+    )
+    parser.add_argument(
+        "--summary",
+        action="store_true",
+        help="Also store the final, peak, minimum and mean log abundance of every model and species.",
+    )
+    parser.add_argument(
+        "--finalize",
+        action="store_true",
+        help="Link all num_shards shards into the master store hdf_path, run after all shards are done.",
+    )
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = get_parser()
-    GridConverter(**vars(args))
+    if args.finalize:
+        if args.marker_dir:
+            wait_for_tasks(args.marker_dir, args.num_shards)
+        finalize_shards(args.hdf_path, args.num_shards)
+    else:
+        del args.finalize
+        args.shard_index, args.num_shards = resolve_task(
+            args.shard_index, args.num_shards
+        )
+        GridConverter(**vars(args))
@@ -0,0 +1,134 @@
+"""Batches of model outputs as float32 arrays, read ahead by a background thread.
+
+Rows are read in blocks that follow the layout of the store: a block is a chunk of a
+chunked dataset, or a slice of at most `block_rows` rows of a contiguous one, so every read
+touches as few chunks as possible. Shuffling permutes the order of the blocks and the rows
+within a buffer of blocks, which gives well mixed batches without random access to single
+rows. The next blocks are read in a background thread with its own handle of the store while
+the caller uses the current batch. h5py serializes all its calls, so more reader threads would
+not read faster.
+"""
+import queue
+import threading
+
+import numpy as np
+
+
+def get_blocks(fh, storage_ids, block_rows: int = 4096) -> list:
+    """Split the abundances of the models into chunk aligned blocks.
+
+    Returns:
+        list[tuple[str, int, int]]: The storage_id, first and last (exclusive) row of every block.
+    """
+    blocks = []
+    for storage_id in storage_ids:
+        dataset = fh[f"{storage_id}/abundances"]
+        n_rows = dataset.shape[0]
+        step = dataset.chunks[0] if dataset.chunks else block_rows
+        blocks.extend(
+            (storage_id, start, min(start + step, n_rows))
+            for start in range(0, n_rows, step)
+        )
+    return blocks
+
+
+def iter_batches(
+    loader,
+    batch_size: int,
+    species: list = None,
+    shuffle: bool = False,
+    prefetch: int = 4,
+    storage_ids: list = None,
+    seed: int = None,
+    drop_last: bool = False,
+    block_rows: int = 4096,
+    shuffle_blocks: int = 8,
+):
+    """Iterate over the rows of the abundances of many models in batches.
+
+    Args:
+        loader (DataLoaderHDF): The store to read
+        batch_size (int): The number of rows per batch
+        species (list[str], optional): The columns to read, all columns of the store (see DataLoaderHDF.columns) if None,
+            NaN for the species that are not in the network of a model. Defaults to None.
+        shuffle (bool, optional): Shuffle the blocks and the rows within a buffer of blocks. Defaults to False.
+        prefetch (int, optional): The number of blocks read ahead in the background thread. Defaults to 4.
+        storage_ids (list[str], optional): The models to read, all models if None. Defaults to None.
+        seed (int, optional): The seed of the shuffle. Defaults to None.
+        drop_last (bool, optional): Skip the last batch if it is smaller than batch_size. Defaults to False.
+        block_rows (int, optional): The number of rows per block of contiguous datasets. Defaults to 4096.
+        shuffle_blocks (int, optional): The number of blocks whose rows are shuffled together. Defaults to 8.
+
+    Yields:
+        np.ndarray: C-contiguous float32 arrays with shape (batch_size, columns).
+    """
+    storage_ids = loader.datasets if storage_ids is None else storage_ids
+    rng = np.random.default_rng(seed)
+    with loader.get_h5_filehandle() as fh:
+        # The columns of the store, aligned across the networks of the models.
+        species = loader.columns if species is None else species
+        positions = {
+            storage_id: loader.get_column_positions(storage_id, species, fh)
+            for storage_id in storage_ids
+        }
+        blocks = get_blocks(fh, storage_ids, block_rows)
+    if shuffle:
+        blocks = [blocks[i] for i in rng.permutation(len(blocks))]
+
+    blocks_read = queue.Queue(max(prefetch, 1))
+    stop = threading.Event()
+
+    def read_blocks():
+        try:
+            with loader.open_h5_filehandle() as reader_fh:
+                for storage_id, start, end in blocks:
+                    rows = loader.read_aligned(
+                        storage_id, positions[storage_id], slice(start, end), reader_fh
+                    )
+                    if not put(rows.astype("float32", copy=False)):
+                        return
+        except Exception as exc:
+            put(exc)
+
+    def put(item) -> bool:
+        # Wait for room in the queue until the caller stops iterating.
+        while not stop.is_set():
+            try:
+                blocks_read.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    reader = threading.Thread(target=read_blocks, name="iter_batches", daemon=True)
+    reader.start()
+    try:
+        buffer, n_buffered, n_buffered_blocks = [], 0, 0
+        for n_read in range(1, len(blocks) + 1):
+            rows = blocks_read.get()
+            if isinstance(rows, Exception):
+                raise rows
+            buffer.append(rows)
+            n_buffered += len(rows)
+            n_buffered_blocks += 1
+            exhausted = n_read == len(blocks)
+            if shuffle and n_buffered_blocks < shuffle_blocks and not exhausted:
+                continue
+            if n_buffered < batch_size and not exhausted:
+                continue
+            rows = np.concatenate(buffer)
+            if shuffle:
+                rows = rows[rng.permutation(len(rows))]
+            n_full = len(rows) // batch_size * batch_size
+            for start in range(0, n_full, batch_size):
+                yield np.ascontiguousarray(rows[start : start + batch_size])
+            rest = rows[n_full:]
+            if exhausted:
+                if len(rest) and not drop_last:
+                    yield np.ascontiguousarray(rest)
+                break
+            buffer, n_buffered = [rest], len(rest)
+            n_buffered_blocks = 0
+    finally:
+        stop.set()
+        reader.join()
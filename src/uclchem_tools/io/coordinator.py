@@ -0,0 +1,272 @@
+"""A single writer process per store, so that concurrent runs can write to the same store.
+
+HDF5 does not allow several processes to append to a file at once. Instead of opening the
+store, every process connects to a coordinator that owns the only write session (see
+StoreWriter) and sends it the outputs over a local socket. The first client starts the
+coordinator, the next clients find it through a rendezvous file next to the store and the
+coordinator exits once it has been idle for a while. A lock file next to the store makes
+sure only one coordinator is started and that it never exits while a client connects.
+
+Example:
+    with connect_writer("grid.h5") as writer:
+        full_output_df_to_hdf(df, "grid.h5", datakey, assume_identical_networks=True, writer=writer)
+"""
+from argparse import ArgumentParser
+import fcntl
+import json
+import logging
+import os
+import pathlib
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from .writer import open_writer
+
+# The methods of the StoreWriter a client can call.
+WRITER_METHODS = [
+    "write_network",
+    "write_abundances",
+    "write_derivatives",
+    "write_rates",
+    "model_done",
+    "flush",
+]
+
+
+def get_rendezvous_path(hdf_path) -> pathlib.Path:
+    return pathlib.Path(f"{hdf_path}.writer.json")
+
+
+@contextmanager
+def store_lock(hdf_path):
+    """Hold an exclusive lock on the lock file next to the store."""
+    with open(f"{hdf_path}.writer.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class WriteCoordinator:
+    """Owns the write session of a store and applies the writes of all clients in turn."""
+
+    def __init__(self, hdf_path, idle_timeout: float = 30.0):
+        """Open the store and start listening on a free port of localhost.
+
+        Args:
+            hdf_path (Path): The store to write to
+            idle_timeout (float, optional): Exit after this many seconds without clients. Defaults to 30.0.
+        """
+        self.hdf_path = hdf_path
+        self.idle_timeout = idle_timeout
+        self.authkey = secrets.token_bytes(32)
+        self.writer = open_writer(hdf_path)
+        self.listener = Listener(("localhost", 0), authkey=self.authkey)
+        self.lock = threading.Lock()
+        self.clients = 0
+        self.last_active = time.time()
+
+    def write_rendezvous(self):
+        """Publish the address and key of the coordinator, only readable by the current user."""
+        rendezvous_path = get_rendezvous_path(self.hdf_path)
+        tmp_path = rendezvous_path.with_suffix(f".tmp{os.getpid()}")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as fh:
+            json.dump(
+                {
+                    "address": list(self.listener.address),
+                    "authkey": self.authkey.hex(),
+                    "pid": os.getpid(),
+                },
+                fh,
+            )
+        os.replace(tmp_path, rendezvous_path)
+
+    def serve(self):
+        """Accept clients until the coordinator has been idle for idle_timeout seconds."""
+        self.write_rendezvous()
+        threading.Thread(target=self._accept, daemon=True).start()
+        logging.info(f"Coordinating the writes to {self.hdf_path}")
+        while True:
+            time.sleep(min(1.0, self.idle_timeout))
+            # Clients connect while holding the lock, so none can arrive while we shut down.
+            with store_lock(self.hdf_path):
+                with self.lock:
+                    idle = (
+                        self.clients == 0
+                        and time.time() - self.last_active > self.idle_timeout
+                    )
+                if idle:
+                    get_rendezvous_path(self.hdf_path).unlink(missing_ok=True)
+                    self.listener.close()
+                    self.writer.close()
+                    break
+        logging.info(f"Closed {self.hdf_path} after {self.idle_timeout}s without clients")
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                # The listener was closed.
+                return
+            except Exception as exc:
+                logging.warning(f"Refused a client: {exc}")
+                continue
+            with self.lock:
+                self.clients += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        """Apply the writes of a single client, every call is answered with its status."""
+        try:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except EOFError:
+                    break
+                if method == "ping":
+                    conn.send(("ok", None))
+                    continue
+                with self.lock:
+                    try:
+                        if method not in WRITER_METHODS:
+                            raise NotImplementedError(f"Unknown method {method}")
+                        getattr(self.writer, method)(*args)
+                        reply = ("ok", None)
+                    except Exception as exc:
+                        reply = ("error", f"{type(exc).__name__}: {exc}")
+                conn.send(reply)
+        finally:
+            conn.close()
+            with self.lock:
+                # Make the models of a finished client durable.
+                self.writer.flush()
+                self.clients -= 1
+                self.last_active = time.time()
+
+
+class CoordinatedWriter:
+    """Client of a WriteCoordinator, with the same interface as StoreWriter."""
+
+    def __init__(self, conn, hdf_path):
+        self.conn = conn
+        self.hdf_path = hdf_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _call(self, method, *args):
+        self.conn.send((method, args))
+        status, message = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(
+                f"The writer of {self.hdf_path} could not {method}: {message}"
+            )
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def flush(self):
+        self._call("flush")
+
+    def write_network(self, network, datakey=None):
+        self._call("write_network", network, datakey)
+
+    def write_abundances(self, datakey, df, network=None):
+        self._call("write_abundances", datakey, df, network)
+
+    def write_derivatives(self, datakey, df):
+        self._call("write_derivatives", datakey, df)
+
+    def write_rates(self, datakey, specie, df_rates, df_production, df_destruction):
+        self._call(
+            "write_rates", datakey, specie, df_rates, df_production, df_destruction
+        )
+
+    def model_done(self):
+        self._call("model_done")
+
+
+def _connect(rendezvous_path):
+    """Connect to the coordinator of a rendezvous file, None if there is no (live) coordinator."""
+    try:
+        with open(rendezvous_path) as fh:
+            rendezvous = json.load(fh)
+        return Client(
+            tuple(rendezvous["address"]), authkey=bytes.fromhex(rendezvous["authkey"])
+        )
+    except (OSError, ValueError, EOFError, AuthenticationError) as exc:
+        logging.debug(f"No coordinator at {rendezvous_path}: {exc}")
+        return None
+
+
+def connect_writer(hdf_path, idle_timeout: float = 30.0, timeout: float = 60.0):
+    """Connect to the coordinator of a store, starting it if it is not running.
+
+    Args:
+        hdf_path (Path): The store to write to
+        idle_timeout (float, optional): The idle timeout of a newly started coordinator. Defaults to 30.0.
+        timeout (float, optional): Seconds to wait for a newly started coordinator. Defaults to 60.0.
+
+    Returns:
+        CoordinatedWriter: A write session that can be used like a StoreWriter.
+    """
+    rendezvous_path = get_rendezvous_path(hdf_path)
+    with store_lock(hdf_path):
+        conn = _connect(rendezvous_path)
+        if conn is None:
+            rendezvous_path.unlink(missing_ok=True)
+            with open(f"{hdf_path}.writer.log", "a") as log:
+                process = subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "uclchem_tools.io.coordinator",
+                        str(hdf_path),
+                        "--idle-timeout",
+                        str(idle_timeout),
+                    ],
+                    stdout=subprocess.DEVNULL,
+                    stderr=log,
+                    start_new_session=True,
+                )
+            start = time.time()
+            while (conn := _connect(rendezvous_path)) is None:
+                if process.poll() is not None:
+                    raise RuntimeError(
+                        f"The writer of {hdf_path} failed to start, see {hdf_path}.writer.log"
+                    )
+                if time.time() - start > timeout:
+                    raise RuntimeError(f"The writer of {hdf_path} did not start in time.")
+                time.sleep(0.1)
+        # Register with the coordinator before releasing the lock, so it cannot exit on us.
+        writer = CoordinatedWriter(conn, hdf_path)
+        writer._call("ping")
+    return writer
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Coordinate the writes of several processes to a store.")
+    parser.add_argument("hdf_path", help="The store to write to")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=30.0,
+        help="Exit after this many seconds without clients.",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    WriteCoordinator(args.hdf_path, idle_timeout=args.idle_timeout).serve()
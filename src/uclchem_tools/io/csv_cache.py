@@ -0,0 +1,109 @@
+"""Binary sidecar cache of the parsed full output files of UCLCHEM.
+
+Parsing a full output file with pandas takes far longer than reading its values back from
+a binary file. The first time a file is parsed, its values are saved in the cache
+directory (by default `.uclchem_cache` next to the file) together with the modification
+time and size of the file, so that later reads load the binary copy as long as the file
+is unchanged. A file that changed is parsed again and its cache entry replaced.
+"""
+import logging
+import os
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIRNAME = ".uclchem_cache"
+
+
+def get_cache_path(path: pathlib.Path, cache_dir: pathlib.Path = None) -> pathlib.Path:
+    cache_dir = path.parent / CACHE_DIRNAME if cache_dir is None else pathlib.Path(cache_dir)
+    return cache_dir / f"{path.name}.npz"
+
+
+def _get_file_key(path: pathlib.Path) -> np.ndarray:
+    stat = os.stat(path)
+    return np.array([stat.st_mtime_ns, stat.st_size], dtype="int64")
+
+
+def _load_cache(cache_path: pathlib.Path, file_key: np.ndarray) -> pd.DataFrame:
+    """The cached output, or None if there is no valid entry for this version of the file."""
+    try:
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if not np.array_equal(cache["file_key"], file_key):
+                return None
+            df = pd.DataFrame(cache["values"], columns=cache["columns"].tolist())
+            # Only cast the few columns that were not float64 (e.g. the integer point),
+            # DataFrame.astype with a dict goes through every column.
+            for column, dtype in zip(df.columns, cache["dtypes"].tolist()):
+                if dtype != "<f8":
+                    df[column] = df[column].astype(dtype)
+            return df
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _save_cache(cache_path: pathlib.Path, file_key: np.ndarray, df: pd.DataFrame):
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes):
+        return
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so concurrent readers never see a partial entry.
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as fh:
+            np.savez(
+                fh,
+                file_key=file_key,
+                values=df.to_numpy(dtype="float64"),
+                columns=np.array(df.columns, dtype="U"),
+                dtypes=np.array([dtype.str for dtype in df.dtypes], dtype="U"),
+            )
+        os.replace(tmp_path, cache_path)
+    except OSError as error:
+        logging.warning(f"Could not write the cache of {cache_path.name}: {error}")
+
+
+def _parse_output(path: pathlib.Path) -> pd.DataFrame:
+    import uclchem
+
+    return uclchem.analysis.read_output_file(path)
+
+
+def read_cached_output(
+    path: pathlib.Path, cache: bool = True, cache_dir: pathlib.Path = None
+) -> pd.DataFrame:
+    """Read a full output file of UCLCHEM, from the sidecar cache if it is up to date.
+
+    Args:
+        path (Path): The full output file
+        cache (bool, optional): Use and fill the cache, otherwise always parse the file. Defaults to True.
+        cache_dir (Path, optional): The directory of the cache, `.uclchem_cache` next to the file if None. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The full output as read by uclchem.analysis.read_output_file
+    """
+    path = pathlib.Path(path)
+    if not cache:
+        return _parse_output(path)
+    cache_path = get_cache_path(path, cache_dir)
+    file_key = _get_file_key(path)
+    df = _load_cache(cache_path, file_key)
+    if df is None:
+        # Only parsing needs UCLCHEM, a directory that is fully cached can be read without it.
+        df = _parse_output(path)
+        _save_cache(cache_path, file_key, df)
+    return df
+
+
+def is_cached(path: pathlib.Path, cache_dir: pathlib.Path = None) -> bool:
+    """Whether the cache holds an entry for the current version of the file."""
+    path = pathlib.Path(path)
+    try:
+        with np.load(get_cache_path(path, cache_dir), allow_pickle=False) as cache:
+            return np.array_equal(cache["file_key"], _get_file_key(path))
+    except (OSError, KeyError, ValueError):
+        return False
+
+
+def _read_chunk(paths: list, cache: bool, cache_dir: pathlib.Path) -> list:
+    return [read_cached_output(path, cache, cache_dir) for path in paths]
@@ -0,0 +1,162 @@
+"""Compact storage encodings of the full outputs and the row reader that decodes them.
+
+With the "log16" encoding the abundances of a model are stored as 16 bit codes of their
+log10, evenly spaced over `log_range` (about 5e-4 dex apart for the default 30 dex, 0.1%
+in abundance). Code 0 marks values at or below the floor of the range, 10**log_range[0], which
+decode to the floor like the floor abundance of UCLCHEM.
+Species that sit at the floor during the whole model are not stored at all, the runs at the
+floor of the other species cost one bit per row: only the codes off the floor are stored, row
+after row, with a bit mask of the stored columns. The physical columns and every column with
+values outside [0, 1] are stored as float32 next to the codes.
+
+A model `<key>` written with log16 consists of:
+    <key>           uint8 bit mask (rows x columns of the codes, packed) of the codes off the
+                    floor, with the attrs encoding, log_range and layout: per column of the
+                    header the column of the codes if >= 0, -1 if the column is at the floor
+                    throughout and -(i + 2) for column i of the raw values
+    <key>_codes     uint16 codes off the floor, row after row
+    <key>_offsets   int64 position of the first code of every row in <key>_codes, and the
+                    number of codes at the end
+    <key>_raw       float32 values of the raw columns
+    <key>_header    the names of all columns, like an unencoded dataset
+
+All loaders read the outputs through read_rows, which handles both layouts. A read of rows
+reads their codes in one piece and decodes only the requested columns, with a single lookup
+into a table of the 2**16 values.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+ENCODINGS = ("float32", "log16")
+LOG16_RANGE = (-30.0, 0.0)
+# The physical columns of the full output of UCLCHEM, never encoded.
+RAW_COLUMNS = ("Time", "Density", "gasTemp", "dustTemp", "av", "radfield", "zeta", "point")
+FLOOR_CODE = 0
+MAX_CODE = 2**16 - 1
+
+
+@lru_cache(maxsize=8)
+def get_log16_table(log_range: tuple) -> np.ndarray:
+    """The float32 value of every code."""
+    table = np.empty(MAX_CODE + 1, dtype="float32")
+    table[FLOOR_CODE] = 10 ** log_range[0]
+    table[1:] = 10 ** np.linspace(log_range[0], log_range[1], MAX_CODE)
+    return table
+
+
+def encode_log16(values: np.ndarray, log_range: tuple = LOG16_RANGE) -> np.ndarray:
+    """Quantize values in [0, 10**log_range[1]] to the nearest code in log10."""
+    step = (log_range[1] - log_range[0]) / (MAX_CODE - 1)
+    with np.errstate(divide="ignore"):
+        log_values = np.log10(values)
+    codes = np.clip(np.rint((log_values - log_range[0]) / step) + 1, 1, MAX_CODE)
+    # Compared in float32, the precision of the outputs, so a floor of 1e-30 is at the floor.
+    codes[~(values > np.float32(10 ** log_range[0]))] = FLOOR_CODE
+    return codes.astype("uint16")
+
+
+def decode_log16(codes: np.ndarray, log_range: tuple = LOG16_RANGE) -> np.ndarray:
+    return get_log16_table(tuple(log_range))[codes]
+
+
+def encode_frame(df: pd.DataFrame, log_range: tuple = LOG16_RANGE) -> tuple:
+    """Encode a full output with log16.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The bit mask, the codes
+            off the floor, their row offsets, the raw values and the layout.
+    """
+    values = df.to_numpy()
+    encodable = np.array(
+        [
+            column not in RAW_COLUMNS
+            and bool(((values[:, i] >= 0) & (values[:, i] <= 10 ** log_range[1])).all())
+            for i, column in enumerate(df.columns)
+        ],
+        dtype=bool,
+    )
+    codes = encode_log16(values[:, encodable], log_range)
+    stored = (codes != FLOOR_CODE).any(axis=0)
+    layout = np.full(len(df.columns), -1, dtype="int32")
+    layout[np.flatnonzero(encodable)[stored]] = np.arange(stored.sum())
+    layout[~encodable] = -(np.arange((~encodable).sum()) + 2)
+    off_floor = codes[:, stored] != FLOOR_CODE
+    offsets = np.concatenate([[0], np.cumsum(off_floor.sum(axis=1))]).astype("int64")
+    return (
+        np.packbits(off_floor, axis=1),
+        codes[:, stored][off_floor],
+        offsets,
+        values[:, ~encodable].astype("float32"),
+        layout,
+    )
+
+
+def is_encoded(dataset) -> bool:
+    return dataset.attrs.get("encoding", "float32") == "log16"
+
+
+def read_header(fh, key: str) -> list:
+    return [column.decode("UTF-8") for column in fh[f"{key}_header"][:]]
+
+
+def read_rows(fh, key: str, rows=slice(None), columns: list = None) -> np.ndarray:
+    """Read rows of a full output (or any dataset written with a header), decoding if needed.
+
+    Args:
+        fh (h5py.File, zarr.Group): The store
+        key (str): The dataset, e.g. "<storage_id>/abundances"
+        rows (slice or int, optional): The rows to read, a single row gives a 1D array. Defaults to all rows.
+        columns (list[int], optional): The positions in the header of the columns to return, all if None. Defaults to None.
+
+    Returns:
+        np.ndarray: The values of the columns in the given order.
+    """
+    dataset = fh[key]
+    if not is_encoded(dataset):
+        values = dataset[rows]
+        return values if columns is None else values[..., columns]
+    layout = np.asarray(dataset.attrs["layout"])
+    log_range = dataset.attrs["log_range"]
+    n_codes = int(layout.max(initial=-1)) + 1
+    if columns is not None:
+        layout = layout[columns]
+    code_columns = np.unique(layout[layout >= 0])
+    raw_columns = np.unique(-(layout[layout <= -2] + 2))
+    row_numbers = np.arange(dataset.shape[0])[rows]
+    single_row = np.ndim(row_numbers) == 0
+    row_numbers = np.atleast_1d(row_numbers)
+    # All rows from the first to the last requested one are read in one piece.
+    first = int(row_numbers.min()) if len(row_numbers) else 0
+    last = int(row_numbers.max()) + 1 if len(row_numbers) else 0
+    rows_read = row_numbers - first
+    floor = np.float32(10 ** log_range[0])
+    decoded = np.full((len(row_numbers), len(code_columns)), floor, dtype="float32")
+    if len(code_columns):
+        off_floor = np.unpackbits(dataset[first:last], axis=1, count=n_codes)
+        off_floor = off_floor[rows_read].astype(bool)
+        offsets = fh[f"{key}_offsets"][first : last + 1]
+        codes = fh[f"{key}_codes"][offsets[0] : offsets[-1]]
+        # The position in codes of every code off the floor, only the requested columns are decoded.
+        code_index = (offsets[rows_read] - offsets[0])[:, None] + np.cumsum(off_floor, axis=1) - 1
+        selected = off_floor[:, code_columns]
+        decoded[selected] = decode_log16(codes[code_index[:, code_columns][selected]], log_range)
+    parts = [decoded]
+    # Only read the raw values when a raw column is asked for.
+    if len(raw_columns):
+        raw = fh[f"{key}_raw"][first:last]
+        parts.append(raw[rows_read][:, raw_columns].astype("float32"))
+    # The columns at the floor throughout read from a column of floor values after the others.
+    parts.append(np.full((len(row_numbers), 1), floor, dtype="float32"))
+    positions = np.where(
+        layout >= 0,
+        np.searchsorted(code_columns, layout),
+        np.where(
+            layout == -1,
+            len(code_columns) + len(raw_columns),
+            len(code_columns) + np.searchsorted(raw_columns, -(layout + 2)),
+        ),
+    )
+    values = np.concatenate(parts, axis=-1)[:, positions]
+    return values[0] if single_row else values
@@ -0,0 +1,303 @@
+"""Inspect the layout of a store and advise its chunking from the recorded reads.
+
+inspect_store reports for every kind of object (the abundances of all models, the rates of
+all species, the network tables, ...) how many there are, their logical and stored bytes,
+their chunks and filters. get_layout_notes points out the usual causes of slow reads: many
+small objects, chunks that are too small or larger than the chunk cache and uncompressed rates.
+
+advise_chunks takes the reads recorded by `DataLoaderHDF(path, trace=True)` (see
+uclchem_tools.io.trace) and estimates for a range of chunk shapes of the abundances how many
+bytes those reads would have to read from disk, the read amplification, with a fixed cost per
+chunk for the lookup and the read call. apply_chunks repacks the store with the best shape.
+"""
+from collections import Counter
+import logging
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from .merge import STORE_KEYS, repack_store
+from .network import NETWORK_GROUP
+from .trace import parse_columns
+
+# The cost of reading a chunk apart from its bytes (chunk lookup, seek, filter call), in bytes.
+CHUNK_OVERHEAD_BYTES = 32 * 2**10
+# The size of the default chunk cache of HDF5, larger chunks are read again for every access.
+MAX_CHUNK_BYTES = 2**20
+MIN_CHUNK_BYTES = 4 * 2**10
+
+
+def _get_pattern(name: str) -> str:
+    """The kind of an object, e.g. <model>/rates/production/<species> for grid_0/rates/production/CO"""
+    parts = name.split("/")
+    if parts[0] not in STORE_KEYS:
+        parts[0] = "<model>"
+    elif parts[0] == NETWORK_GROUP and len(parts) > 1:
+        parts[1] = "<hash>"
+    if parts[0] == "<model>" and len(parts) > 3 and parts[1] == "rates":
+        parts[3] = "<species>_header" if parts[3].endswith("_header") else "<species>"
+    return "/".join(parts)
+
+
+def inspect_store(hdf_path) -> pd.DataFrame:
+    """Report the objects of a store per kind.
+
+    Args:
+        hdf_path (Path): The store, datasets in other files (the shards of a master store) are not followed.
+
+    Returns:
+        pd.DataFrame: A row per kind of object (path) with the columns kind, count, logical_bytes,
+            stored_bytes, compression_ratio, chunks (the most common shape), chunk_bytes,
+            compression and virtual (the number of virtual datasets), by stored_bytes.
+    """
+    kinds = {}
+
+    def visit(name, item):
+        pattern = _get_pattern(name)
+        if isinstance(item, h5py.Group):
+            entry = kinds.setdefault(pattern, {"kind": "group", "count": 0})
+            entry["count"] += 1
+            return
+        entry = kinds.setdefault(
+            pattern,
+            {
+                "kind": "dataset",
+                "count": 0,
+                "logical_bytes": 0,
+                "stored_bytes": 0,
+                "chunks": Counter(),
+                "chunk_bytes": [],
+                "compression": Counter(),
+                "virtual": 0,
+            },
+        )
+        entry["count"] += 1
+        entry["logical_bytes"] += item.size * item.dtype.itemsize
+        entry["stored_bytes"] += item.id.get_storage_size()
+        entry["chunks"][item.chunks] += 1
+        if item.chunks:
+            entry["chunk_bytes"].append(int(np.prod(item.chunks)) * item.dtype.itemsize)
+        entry["compression"][
+            "none" if item.compression is None else f"{item.compression}{'+shuffle' if item.shuffle else ''}"
+        ] += 1
+        entry["virtual"] += item.is_virtual
+
+    with h5py.File(hdf_path, "r") as fh:
+        fh.visititems(visit)
+    rows = []
+    for pattern, entry in kinds.items():
+        row = {"path": pattern, **entry}
+        if entry["kind"] == "dataset":
+            row["chunks"] = str(entry["chunks"].most_common(1)[0][0] or "contiguous")
+            row["chunk_bytes"] = int(np.mean(entry["chunk_bytes"])) if entry["chunk_bytes"] else np.nan
+            row["compression"] = ", ".join(sorted(entry["compression"]))
+            row["compression_ratio"] = (
+                entry["logical_bytes"] / entry["stored_bytes"] if entry["stored_bytes"] else np.nan
+            )
+        rows.append(row)
+    columns = [
+        "path",
+        "kind",
+        "count",
+        "logical_bytes",
+        "stored_bytes",
+        "compression_ratio",
+        "chunks",
+        "chunk_bytes",
+        "compression",
+        "virtual",
+    ]
+    report = pd.DataFrame(rows).reindex(columns=columns)
+    return report.sort_values("stored_bytes", ascending=False, na_position="last").reset_index(drop=True)
+
+
+def get_layout_notes(report: pd.DataFrame, file_size: int = None) -> list:
+    """Point out the parts of the layout of a store that make reading it slow.
+
+    Args:
+        report (pd.DataFrame): The report of inspect_store
+        file_size (int, optional): The size of the store file, to estimate the metadata overhead. Defaults to None.
+
+    Returns:
+        list[str]: A note per problem, empty if none were found.
+    """
+    notes = []
+    datasets = report[report["kind"] == "dataset"]
+    n_objects = int(report["count"].sum())
+    if n_objects > 10000:
+        notes.append(
+            f"The store has {n_objects} objects, every object is a metadata lookup on open and read; "
+            "a dense tensor (dense_times) or fewer rates nodes reduce their number."
+        )
+    for row in datasets.itertuples():
+        if row.count >= 100 and row.logical_bytes / row.count < MIN_CHUNK_BYTES:
+            notes.append(
+                f"{row.path}: {row.count} datasets of on average {int(row.logical_bytes // row.count)} bytes, "
+                "the reads are dominated by the metadata lookups."
+            )
+        if row.chunk_bytes < MIN_CHUNK_BYTES and row.logical_bytes / row.count >= MIN_CHUNK_BYTES:
+            notes.append(
+                f"{row.path}: chunks {row.chunks} of {int(row.chunk_bytes)} bytes are small, every chunk is a separate read."
+            )
+        elif row.chunk_bytes > MAX_CHUNK_BYTES:
+            notes.append(
+                f"{row.path}: chunks {row.chunks} of {int(row.chunk_bytes)} bytes do not fit the default "
+                "chunk cache of 1 MiB and are read again for every access."
+            )
+        if "/rates/" in row.path and "none" in row.compression and row.logical_bytes > 2**20:
+            notes.append(
+                f"{row.path}: {int(row.logical_bytes // 2**20)} MiB of uncompressed rates, "
+                "repack with compression (scripts/merge_stores.py --compression gzip)."
+            )
+    if file_size:
+        metadata_bytes = file_size - int(datasets["stored_bytes"].sum())
+        if metadata_bytes > file_size / 2:
+            notes.append(
+                f"{metadata_bytes} of the {file_size} bytes of the file are metadata or free space, "
+                "repacking reclaims the free space."
+            )
+    return notes
+
+
+def _get_candidates(max_rows: int, max_columns: int, itemsize: int, max_chunk_bytes: int) -> list:
+    def powers(maximum):
+        return sorted({2**i for i in range(int(np.log2(max(maximum, 1))) + 1)} | {maximum})
+
+    return [
+        (rows, columns)
+        for rows in powers(max_rows)
+        for columns in powers(max_columns)
+        if rows * columns * itemsize <= max_chunk_bytes
+    ]
+
+
+def _estimate_reads(trace_df: pd.DataFrame, column_sets: list, groups: np.ndarray, chunks, itemsize: int):
+    """The number of chunks and bytes every recorded read reads with chunks of shape (rows, columns)."""
+    start, stop = trace_df["start"].to_numpy(), trace_df["stop"].to_numpy()
+    n_rows, n_columns = trace_df["n_rows"].to_numpy(), trace_df["n_columns"].to_numpy()
+    if chunks is None:
+        # Contiguous: the rows are read in one call, the columns in between are sieved along.
+        return np.ones(len(trace_df), dtype="int64"), (stop - start) * n_columns * itemsize
+    chunk_rows = np.maximum(np.minimum(chunks[0], n_rows), 1)
+    chunk_columns = np.maximum(np.minimum(chunks[1], n_columns), 1)
+    row_chunks = np.where(stop > start, (stop - 1) // chunk_rows - start // chunk_rows + 1, 0)
+    column_chunks = np.array(
+        [
+            len(np.unique(positions // min(chunks[1], n))) if len(positions) else 0
+            for positions, n in column_sets
+        ],
+        dtype="int64",
+    )[groups]
+    n_chunks = row_chunks * column_chunks
+    return n_chunks, n_chunks * chunk_rows * chunk_columns * itemsize
+
+
+def advise_chunks(
+    hdf_path,
+    trace,
+    max_chunk_bytes: int = MAX_CHUNK_BYTES,
+    chunk_overhead_bytes: int = CHUNK_OVERHEAD_BYTES,
+) -> dict:
+    """Find the chunk shape of the abundances that reads the recorded reads with the least cost.
+
+    The cost of a shape is the bytes of all chunks the reads touch plus chunk_overhead_bytes
+    per chunk. For stores encoded with log16 the chunks are those of the bit mask of the codes
+    and the columns are the columns of the header, which is a rough approximation.
+
+    Example:
+        loader = DataLoaderHDF("grid.h5", trace=True)
+        for batch in loader.iter_batches(1024, species=["Time", "CO"]):
+            ...
+        advice = advise_chunks("grid.h5", loader.trace)
+        apply_chunks("grid.h5", "grid_rechunked.h5", advice)
+
+    Args:
+        hdf_path (Path): The store the trace was recorded on
+        trace (AccessTrace): The recorded reads
+        max_chunk_bytes (int, optional): The largest chunk to consider. Defaults to the 1 MiB chunk cache of HDF5.
+        chunk_overhead_bytes (int, optional): The cost of reading a chunk apart from its bytes. Defaults to CHUNK_OVERHEAD_BYTES.
+
+    Returns:
+        dict: The best "chunks" (rows, columns) with its "amplification" (bytes read per requested byte),
+            whether to "rechunk" (False if the current chunks cost the least, which are then the "chunks"),
+            the "current_chunks" (None if contiguous) and "current_amplification" of the store, and all
+            "candidates" by cost.
+    """
+    trace_df = trace.to_df()
+    if trace_df.empty:
+        raise ValueError("The trace has no reads, read the store with DataLoaderHDF(..., trace=True) first.")
+    with h5py.File(hdf_path, "r") as fh:
+        dataset = fh[f"{trace_df['storage_id'].iloc[0]}/abundances"]
+        itemsize = dataset.dtype.itemsize
+        current_chunks = dataset.chunks
+    # The distinct column selections, usually a handful.
+    groups, column_keys = pd.factorize(
+        pd.Series(list(zip(trace_df["columns"], trace_df["n_columns"])))
+    )
+    column_sets = [(parse_columns(columns, n), n) for columns, n in column_keys]
+    requested = (
+        (trace_df["stop"] - trace_df["start"]).to_numpy()
+        * np.array([len(positions) for positions, _ in column_sets])[groups]
+        * itemsize
+    ).sum()
+
+    def evaluate(chunks):
+        n_chunks, n_bytes = _estimate_reads(trace_df, column_sets, groups, chunks, itemsize)
+        return {
+            "chunks_read": int(n_chunks.sum()),
+            "bytes_read": int(n_bytes.sum()),
+            "amplification": n_bytes.sum() / requested,
+            "cost": int(n_bytes.sum() + chunk_overhead_bytes * n_chunks.sum()),
+        }
+
+    candidates = pd.DataFrame(
+        [
+            {
+                "chunk_rows": rows,
+                "chunk_columns": columns,
+                "chunk_bytes": rows * columns * itemsize,
+                **evaluate((rows, columns)),
+            }
+            for rows, columns in _get_candidates(
+                int(trace_df["n_rows"].max()), int(trace_df["n_columns"].max()), itemsize, max_chunk_bytes
+            )
+        ]
+    ).sort_values(["cost", "chunk_bytes"], ignore_index=True)
+    best = candidates.iloc[0]
+    current = evaluate(current_chunks)
+    # Only re-chunk if it pays off, contiguous models are cheap to read whole.
+    rechunk = best["cost"] < current["cost"]
+    return {
+        "chunks": (int(best["chunk_rows"]), int(best["chunk_columns"])) if rechunk else current_chunks,
+        "amplification": float(best["amplification"] if rechunk else current["amplification"]),
+        "rechunk": bool(rechunk),
+        "current_chunks": current_chunks,
+        "current_amplification": float(current["amplification"]),
+        "candidates": candidates,
+    }
+
+
+def apply_chunks(hdf_path, output_path, advice: dict, **kwargs):
+    """Repack a store with the chunks of advise_chunks into a new store, see merge.repack_store.
+
+    Only the abundances of the models are re-chunked, the advice is based on their reads.
+
+    Args:
+        hdf_path (Path): The store
+        output_path (Path): The re-chunked store to create
+        advice (dict): The result of advise_chunks
+        kwargs: Passed to repack_store, e.g. compression.
+    """
+    if not advice["rechunk"]:
+        logging.warning("The current chunks of the store are the cheapest to read, not repacking.")
+        return
+    chunk_rows, chunk_columns = advice["chunks"]
+    repack_store(
+        hdf_path,
+        output_path,
+        chunk_rows=chunk_rows,
+        chunk_columns=chunk_columns,
+        chunk_datasets=("abundances",),
+        **kwargs,
+    )
@@ -0,0 +1,174 @@
+"""Interpolation of the abundances in a converted grid at arbitrary parameters and times.
+
+All models are resampled once onto a common logarithmic time grid (see resample.py) and the
+parameters are normalized like the nearest neighbour index (see nearest.py). Grids that are
+a full Cartesian product of their parameter values are interpolated with a regular grid
+interpolator, other grids with a Delaunay triangulation of the models and barycentric
+weights. In both cases the interpolation is linear in the normalized parameters, log-time
+and log-abundance. The error estimate is the difference between the linear interpolation
+and the nearest model (in dex), which is large where the grid is too coarse to be trusted.
+Requires scipy.
+"""
+import logging
+
+import numpy as np
+
+from .nearest import NearestIndex
+from .resample import get_common_time_range, get_time_grid, interpolation_weights, resample_log
+
+
+class GridInterpolator:
+    """A precomputed interpolator over the models of a store, built once and queried many times.
+
+    Example:
+        interpolator = GridInterpolator(loader, ["CO", "H2O"])
+        abundances, error = interpolator({"initialDens": [1e4, 2e5], "zeta": 3.0}, times=1e5)
+    """
+
+    def __init__(
+        self,
+        loader,
+        species: list,
+        parameters: list = None,
+        n_times: int = 64,
+        time_range: tuple = None,
+    ):
+        """Resample all models and build the interpolator.
+
+        Args:
+            loader (DataLoaderHDF): The store to interpolate
+            species (list[str]): The species (or physical columns) to interpolate
+            parameters (list[str], optional): The parameters to interpolate over, all varying
+                numeric columns of the model dataframe if None. Defaults to None.
+            n_times (int, optional): The number of points of the log time grid. Defaults to 64.
+            time_range (tuple[float, float], optional): The time range to cover, the range shared
+                by all models if None. Defaults to None.
+        """
+        try:
+            from scipy.interpolate import RegularGridInterpolator
+            from scipy.spatial import Delaunay
+        except ImportError as exc:
+            raise ImportError(
+                "The GridInterpolator requires scipy, install it with `pip install scipy`."
+            ) from exc
+        self.species = list(species)
+        model_df = loader.models_df
+        # In live mode only the completed models can be used.
+        model_df = model_df[model_df["storage_id"].isin(loader.datasets)]
+        self.index = NearestIndex.from_model_df(model_df, columns=parameters)
+        # Models without a value for every parameter are not in the index.
+        self.storage_ids = model_df["storage_id"].iloc[self.index.rows].tolist()
+        self.parameters = self.index.columns
+
+        # Aligned across networks, species that are not in the network of a model are NaN.
+        outputs = [
+            loader.read_abundances(storage_id, ["Time"] + self.species)
+            for storage_id in self.storage_ids
+        ]
+        times_list = [output["Time"].to_numpy() for output in outputs]
+        if time_range is None:
+            time_range = get_common_time_range(times_list)
+        self.time_grid = get_time_grid(*time_range, n_times)
+        self.log_time_grid = np.log10(self.time_grid)
+        # log10 abundances with shape (models, times, species)
+        self.values = np.stack(
+            [
+                resample_log(times, output[self.species].to_numpy(), self.time_grid)
+                for times, output in zip(times_list, outputs)
+            ]
+        )
+        self.axes = self._get_regular_axes()
+        if self.axes is not None:
+            # Sort the models onto the axes, the models can be stored in any order.
+            positions = [
+                np.searchsorted(axis, self.index.points[:, i])
+                for i, axis in enumerate(self.axes)
+            ]
+            shape = [len(axis) for axis in self.axes]
+            grid_values = np.full(shape + list(self.values.shape[1:]), np.nan)
+            grid_values[tuple(positions)] = self.values
+            self._linear = RegularGridInterpolator(
+                (*self.axes, self.log_time_grid), grid_values, bounds_error=False
+            )
+            self._nearest = RegularGridInterpolator(
+                (*self.axes, self.log_time_grid),
+                grid_values,
+                method="nearest",
+                bounds_error=False,
+            )
+            self.triangulation = None
+        else:
+            self.triangulation = Delaunay(self.index.points)
+        logging.info(
+            f"Interpolating {len(self.species)} species over {len(self.storage_ids)} models on a "
+            f"{'regular' if self.axes is not None else 'scattered'} grid of {self.parameters}"
+        )
+
+    def _get_regular_axes(self):
+        """The axes of the grid if every combination of the parameter values is a model, else None."""
+        axes = [np.unique(self.index.points[:, i]) for i in range(len(self.parameters))]
+        if np.prod([len(axis) for axis in axes]) != len(self.storage_ids) or any(
+            len(axis) < 2 for axis in axes
+        ):
+            return None
+        return axes
+
+    def _query_points(self, params: dict, times):
+        missing = [parameter for parameter in self.parameters if parameter not in params]
+        if missing:
+            raise KeyError(f"The parameters {missing} are required for the interpolation.")
+        columns = np.broadcast_arrays(
+            *[np.asarray(params[parameter], dtype="float64") for parameter in self.parameters],
+            np.asarray(times, dtype="float64"),
+        )
+        columns = [np.ravel(column) for column in columns]
+        _, points = self.index.normalize(
+            {parameter: columns[i] for i, parameter in enumerate(self.parameters)}
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_times = np.log10(columns[-1])
+        return points, log_times
+
+    def __call__(self, params: dict, times) -> tuple:
+        """Interpolate the abundances at many (parameters, time) points at once.
+
+        Args:
+            params (dict[str, array_like]): A value or array for every parameter, broadcast together with times.
+            times (array_like): The times in years.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The abundances with shape (points, species), NaN outside the grid,
+                and the error estimate in dex with the same shape.
+        """
+        points, log_times = self._query_points(params, times)
+        if self.axes is not None:
+            query = np.column_stack([points, log_times])
+            log_linear, log_nearest = self._linear(query), self._nearest(query)
+        else:
+            log_linear, log_nearest = self._interpolate_scattered(points, log_times)
+        outside = np.isnan(log_linear).all(axis=1)
+        if outside.any():
+            logging.warning(f"{outside.sum()} points lie outside the grid, returning NaN.")
+        return 10**log_linear, np.abs(log_linear - log_nearest)
+
+    def _interpolate_scattered(self, points, log_times):
+        """Barycentric interpolation in the Delaunay simplices, linear in log-time."""
+        n_dims = points.shape[1]
+        simplices = self.triangulation.find_simplex(points)
+        transform = self.triangulation.transform[simplices]
+        partial = np.einsum(
+            "ijk,ik->ij", transform[:, :n_dims], points - transform[:, n_dims]
+        )
+        weights = np.column_stack([partial, 1 - partial.sum(axis=1)])
+        vertices = self.triangulation.simplices[simplices]
+        # Linear in log-time between the neighbouring points of the time grid.
+        left, time_weight, inside = interpolation_weights(self.log_time_grid, log_times)
+        at_time = (1 - time_weight[:, None, None]) * self.values[
+            vertices, left[:, None]
+        ] + time_weight[:, None, None] * self.values[vertices, left[:, None] + 1]
+        log_linear = np.einsum("ij,ijk->ik", weights, at_time)
+        log_nearest = at_time[np.arange(len(points)), weights.argmax(axis=1)]
+        invalid = (simplices < 0) | ~inside
+        log_linear[invalid] = np.nan
+        log_nearest[invalid] = np.nan
+        return log_linear, log_nearest
@@ -1,16 +1,21 @@
+"""Conversion of UCLCHEM outputs to HDF storage and the loaders to read them back.
+
+Only h5py, numpy and pandas are imported at module level, so that reading an existing store
+does not need UCLCHEM. UCLCHEM, the rates module, PyTables and tqdm are imported on first use.
+"""
+from contextlib import nullcontext
 from typing import Union
 import pandas as pd
-import uclchem
-from .rates import get_rates_of_change, rates_to_dfs
 
 import os
 
-import warnings
-from tables import NaturalNameWarning
 import h5py
 import numpy as np
-from tqdm import tqdm
 import pathlib
+from .encoding import is_encoded, read_header, read_rows
+from .model_table import ModelTable, is_columnar, mask_predicate, read_model_table
+from .network import NETWORK_GROUP, Network, get_uclchem_network
+from .trace import AccessTrace
 import logging
 import glob
 
@@ -25,23 +30,25 @@ def df_to_h5py(fh, key, df):
         f"/{key}",
         data=df.to_numpy(),
     )
-    fh.create_dataset(f"/{key}_header", data=df.columns.values)
+    # h5py cannot store python strings, so store the header as bytes.
+    fh.create_dataset(f"/{key}_header", data=np.array(df.columns.values, dtype="S"))
 
 
 def h5py_to_df(fh: Union[str, h5py.File], dataset_key: str) -> pd.DataFrame:
     """Read a dataset that was generated by the GridConverter.
 
     Args:
-        fh (str, h5py.File): Either a h5py file handle, otherwise it will be treated as a h5py file handle.
+        fh (str, h5py.File): Either a h5py file handle (or zarr group), otherwise it will be treated as a h5py file handle.
         dataset_key (str): The key of the dataset to load.
 
     Returns:
         pd.DataFrame: A dataframe of the dataset you tried to load.
     """
-    with h5py.File(fh) if isinstance(fh, str) else fh as _fh:
+    # Only close the file if we opened it ourselves.
+    with h5py.File(fh) if isinstance(fh, str) else nullcontext(fh) as _fh:
         if isinstance(dataset_key, list):
             dataset_key = "/".join(dataset_key)
-        data = _fh[dataset_key]
+        data = read_rows(_fh, dataset_key)
         dataset_header_key = dataset_key + "_header"
         if dataset_header_key in _fh:
             header = _fh[dataset_header_key]
@@ -52,6 +59,19 @@ def h5py_to_df(fh: Union[str, h5py.File], dataset_key: str) -> pd.DataFrame:
             return pd.DataFrame(data)
 
 
+def read_columns(dataset, indices: list) -> np.ndarray:
+    """Read columns (the last axis) of a h5py or zarr dataset in any order.
+
+    Both only read sorted column selections, so the sorted unique columns are read and reordered.
+    """
+    unique_indices = sorted(set(indices))
+    if isinstance(dataset, h5py.Dataset):
+        values = dataset[..., unique_indices]
+    else:
+        values = dataset.oindex[(slice(None),) * (dataset.ndim - 1) + (unique_indices,)]
+    return values[..., [unique_indices.index(i) for i in indices]]
+
+
 def full_output_csv_to_hdf(
     csv_path: str,
     hdf_path: str,
@@ -60,6 +80,8 @@ def full_output_csv_to_hdf(
     derivatives_path: str = None,
     assume_identical_networks: bool = False,
     storage_backend: str = "h5py",
+    network: Network = None,
+    writer=None,
 ):
     """Convert the full output of UCLCHEM into a HDF datastore.
 
@@ -68,139 +90,91 @@ def full_output_csv_to_hdf(
         hdf_path (str): The path of the target hdf store
         datakey (str): the key for the particular dataframe. Defaults to "".
         get_rates (bool, optional): Whether to obtain the rates, dramatically reduces performance. Defaults to False.
+        network (Network, optional): The network of the model, loaded from UCLCHEM (once per process) if None.
+        writer (StoreWriter, optional): An open write session of hdf_path, see full_output_df_to_hdf. Defaults to None.
     """
-    abundances_header = None
-    species_lookup = None
-    if assume_identical_networks is False:
-        raise NotImplementedError(
-            "Writing and reading to different networks is not yet implemented."
-        )
-    if storage_backend == "h5py":
-        with h5py.File(hdf_path, "a") as fh:
-            df = uclchem.analysis.read_output_file(csv_path)
-            # cast down to float32 since we lost accurary in custom ascii anyway.
-            df = df.astype("float32")
-            if not abundances_header:
-                # Set the abundances header on first write of a grid.
-                abundances_header = df.columns.values
-            if (abundances_header == df.columns.values).all():
-                df_to_h5py(fh, f"{datakey}/abundances", df)
-            else:
-                raise RuntimeError(
-                    "I found different abundances columns from the first entry, stopping."
-                )
-            if derivatives_path:
-                derivatives = pd.read_csv(derivatives_path, index_col=0)
-                df_to_h5py(fh, f"{datakey}/derivatives", derivatives)
-            # Add reactions and species from current UCLCHEM install
-            reactions = uclchem.utils.get_reaction_table()
-            species = uclchem.utils.get_species_table()
-            if assume_identical_networks:
-                # TODO: refactor with species lookup table to get all integers instead of mixed data types.
-                # SPECIE 0 is NAN
-                if "index_species_lookup" in fh:
-                    isl = fh["index_species_lookup"][:]
-                    species_lookup = {k.decode("UTF-8"): int(v) for k, v in isl}
-                else:
-                    from uclchem.makerates.reaction import reaction_types
+    import uclchem
 
-                    species_lookup = {
-                        spec: i
-                        for i, spec in enumerate(
-                            ["NAN"] + list(species["NAME"]) + reaction_types
-                        )
-                    }
-                    # Finally write the species to index lookup to the disk as an recarray:
-                    # We need legacy "S" support to write to h5py
-                    species_lookup_table = np.array(
-                        [[k, v] for k, v in species_lookup.items()], dtype="S"
-                    )
-                    # species_lookup_table = np.stack((names_lookup, indices_lookup))
+    df = uclchem.analysis.read_output_file(csv_path)
+    full_output_df_to_hdf(
+        df,
+        hdf_path,
+        datakey,
+        get_rates=get_rates,
+        derivatives_path=derivatives_path,
+        assume_identical_networks=assume_identical_networks,
+        storage_backend=storage_backend,
+        network=network,
+        writer=writer,
+    )
 
-                    fh.create_dataset(
-                        "/index_species_lookup", data=species_lookup_table
-                    )
-                if "reactions" not in fh:
-                    # For all the headers of the reactants/products, replace them with integers.
-                    for reaction_header in reactions:
-                        if reaction_header.startswith(
-                            "Reactant"
-                        ) or reaction_header.startswith("Product"):
-                            reactions[
-                                f"{reaction_header[:4].lower()}_index_{reaction_header[-1]}"
-                            ] = (
-                                reactions[reaction_header]
-                                .apply(lambda x: species_lookup[str(x).upper()])
-                                .astype("int32")
-                            )
-                    # Identical for the names of the species in the index:
-                    species["name_index"] = (
-                        species["NAME"]
-                        .apply(lambda x: species_lookup[x.upper()])
-                        .astype("int32")
-                    )
-                    # Drop the expensive text columns
-                    reactions = reactions.drop(
-                        [
-                            header
-                            for header in reactions
-                            if header.startswith("Reactant")
-                            or header.startswith("Product")
-                        ],
-                        axis=1,
-                    )
-                    species = species.drop(["NAME"], axis=1)
-                    # Sort the indices, so they move to the front:
-                    reactions = reactions[
-                        sorted(reactions.columns, key=lambda x: "index" not in x)
-                    ]
-                    species = species[
-                        sorted(species.columns, key=lambda x: "index" not in x)
-                    ]
-
-                    df_to_h5py(fh, "/reactions", reactions)
-                    df_to_h5py(fh, "/species", species)
 
-            else:
-                raise NotImplementedError(
-                    "Not yet implemented for individual networks."
-                )
-        # POSTPROCESS UCLCHEM obtain the rates
-        if get_rates:
-            reactions = uclchem.utils.get_reaction_table()
-            species = uclchem.utils.get_species_table()
-            rates_dict = get_rates_of_change(df, species, reactions)
-            # Lazy fix to parse both old and new versions species format:
-            names = None
-            for possible_name_key in ["Name", "NAME", "name"]:
-                if possible_name_key in species:
-                    names = list(species[possible_name_key])
-            if names is None:
-                raise RuntimeError(
-                    "Could not find the species names in the species table, stopping."
-                )
-            for specie in names:
-                df_rates, df_production, df_destruction = rates_to_dfs(
-                    rates_dict, specie
-                )
-                with warnings.catch_warnings():
-                    warnings.filterwarnings("ignore", category=NaturalNameWarning)
-                    with pd.HDFStore(hdf_path) as store:
-                        store.put(
-                            f"{datakey}/rates/total_rates/{specie}",
-                            df_rates,
-                            index=False,
-                        )
-                        store.put(
-                            f"{datakey}/rates/production/{specie}",
-                            df_production,
-                            index=False,
-                        )
-                        store.put(
-                            f"{datakey}/rates/destruction/{specie}",
-                            df_destruction,
-                            index=False,
-                        )
+def full_output_df_to_hdf(
+    df: pd.DataFrame,
+    hdf_path: str,
+    datakey: str = "",
+    get_rates: bool = False,
+    derivatives_path: str = None,
+    assume_identical_networks: bool = False,
+    storage_backend: str = "h5py",
+    network: Network = None,
+    writer=None,
+):
+    """Write a full output of UCLCHEM that is already in memory into a HDF datastore.
+
+    This skips writing and parsing the full output csv, use it together with
+    `run_model(..., return_dataframe=True)`.
+
+    Args:
+        df (pd.DataFrame): The full output, physical columns followed by the abundances.
+        hdf_path (str): The path of the target hdf store
+        datakey (str): the key for the particular dataframe. Defaults to "".
+        get_rates (bool, optional): Whether to obtain the rates, dramatically reduces performance. Defaults to False.
+        assume_identical_networks (bool, optional): Load the network from UCLCHEM once per process instead of for
+            every model. Models of different networks can share a store, every model links to its network. Defaults to False.
+        network (Network, optional): The network of the model, loaded from UCLCHEM if None.
+        writer (StoreWriter, optional): An open write session of hdf_path to write through, opens
+            (and closes) one for just this model if None. Defaults to None.
+    """
+    from .writer import open_writer
+
+    if network is None:
+        network = (
+            get_uclchem_network()
+            if assume_identical_networks
+            else Network.from_uclchem()
+        )
+    if writer is None:
+        with open_writer(hdf_path, storage_backend) as writer:
+            return full_output_df_to_hdf(
+                df,
+                hdf_path,
+                datakey,
+                get_rates=get_rates,
+                derivatives_path=derivatives_path,
+                assume_identical_networks=assume_identical_networks,
+                storage_backend=storage_backend,
+                network=network,
+                writer=writer,
+            )
+    # Add reactions and species from current UCLCHEM install, stored once per distinct network.
+    writer.write_network(network, datakey)
+    # cast down to float32 since we lost accurary in custom ascii anyway.
+    df = df.astype("float32")
+    writer.write_abundances(datakey, df, network.hash)
+    if derivatives_path:
+        derivatives = pd.read_csv(derivatives_path, index_col=0)
+        writer.write_derivatives(datakey, derivatives)
+    # POSTPROCESS UCLCHEM obtain the rates
+    if get_rates:
+        from .rates import get_rates_of_change, rates_to_dfs
+
+        rates_dict = get_rates_of_change(
+            df, network.species_table, network.reaction_table, network=network
+        )
+        for specie in network.species_names:
+            writer.write_rates(datakey, specie, *rates_to_dfs(rates_dict, specie))
+    writer.model_done()
 
 
 class GridConverter:
@@ -213,6 +187,15 @@ class GridConverter:
         abundances_dir: Path = None,
         derivatives_dir: Path = None,
         get_rates: bool = False,
+        storage_backend: str = "h5py",
+        shard_index: int = None,
+        num_shards: int = None,
+        marker_dir: Path = None,
+        swmr: bool = False,
+        dense_times: int = None,
+        dense_time_range: tuple = None,
+        summary: bool = False,
+        encoding: str = "float32",
     ):
         """
         Initializes an instance of the IO class.
@@ -224,7 +207,39 @@ class GridConverter:
                 (in case the data was moved compared to the time the model_df was generated). Defaults to None.
             derivatives_dir (Path, optional): The path to the directory containing the derivative files. Defaults to None.
             get_rates (bool, optional): Whether to obtain all rates directly from UCLCHEM. Defaults to False.
+            storage_backend (str, optional): Either "h5py" for a HDF5 file or "zarr" for a zarr directory store,
+                which allows independent processes to write models concurrently. Defaults to "h5py".
+            shard_index (int, optional): Only convert this shard of the grid into its own store next to hdf_path,
+                combine all shards with `uclchem_tools.io.shards.finalize_shards` afterwards. Defaults to None.
+            num_shards (int, optional): The total number of shards, required with shard_index. Defaults to None.
+            marker_dir (Path, optional): Write a completion marker for this shard into this directory when it is done,
+                see `uclchem_tools.utils.partition`. Defaults to None.
+            swmr (bool, optional): Write in HDF5 single writer multiple reader mode, so that the models that are
+                done can be read with DataLoaderHDF(live=True) during the conversion. Defaults to False.
+            dense_times (int, optional): Also resample all models onto a common log time grid with this many
+                points into a dense (models x times x columns) tensor, see DataLoaderHDF.get_dense. Defaults to None.
+            dense_time_range (tuple[float, float], optional): The time range of the dense tensor in years,
+                from 1 year to the largest finalTime of the model dataframe if None. Defaults to None.
+            summary (bool, optional): Also store the final, peak, time of the peak, minimum and mean log abundance
+                of every model and species, see DataLoaderHDF.summary. Defaults to False.
+            encoding (str, optional): Store the abundances as "float32", or as "log16" 16 bit log10 codes without
+                the species that stay at the floor, several times smaller, see uclchem_tools.io.encoding. Defaults to "float32".
         """
+        from tqdm import tqdm
+        from .writer import open_writer
+
+        if shard_index is not None:
+            from .shards import get_shard_path
+
+            if storage_backend != "h5py":
+                raise NotImplementedError("Sharding is only implemented for h5py stores.")
+            if not (num_shards and 0 <= shard_index < num_shards):
+                raise ValueError(f"Invalid shard {shard_index} of {num_shards} shards.")
+            hdf_path = get_shard_path(hdf_path, shard_index, num_shards)
+        if swmr and (storage_backend != "h5py" or get_rates or encoding != "float32"):
+            raise NotImplementedError(
+                "SWMR mode is only implemented for float32 h5py stores without rates."
+            )
         if pathlib.Path(hdf_path).exists():
             raise RuntimeError("The store already exists, stoppping")
         # Make sure the directories are Path objects:
@@ -272,22 +287,104 @@ class GridConverter:
                 for file_name in model_df["abundances_path"]
             ]
 
-        # Save model_df with the model dataframe as a pandas object (inefficient, but we only store it once.)
         model_df["storage_id"] = self.get_storage_id(model_df)
-        # Write the model dataframe to the store:
-        model_df.to_hdf(hdf_path, "model_df")
+        if shard_index is not None:
+            from ..utils.partition import estimate_file_cost, get_task_items
+
+            # Shard after assigning the storage_ids, so they are identical for every shard.
+            # Balance the shards by the size of the output files, not the number of models.
+            model_df = model_df.iloc[
+                get_task_items(
+                    [estimate_file_cost(path) for path in model_df["abundances_path"]],
+                    shard_index,
+                    num_shards,
+                )
+            ]
 
-        for idx, row in tqdm(enumerate(model_df.iterrows()), total=len(model_df)):
-            row = row[1]  # throw away the pandas index
-            full_output_csv_to_hdf(
-                row["abundances_path"],
+        dense_time_grid = None
+        if dense_times:
+            from .resample import get_default_time_range, get_time_grid
+
+            if dense_time_range is None:
+                dense_time_range = get_default_time_range(model_df)
+            dense_time_grid = get_time_grid(*dense_time_range, dense_times)
+
+        # Load the network once for all models and the rates.
+        network = get_uclchem_network()
+        if swmr:
+            writer = self._open_swmr_writer(
                 hdf_path,
-                row["storage_id"],
-                get_rates=get_rates,
-                assume_identical_networks=True,
-                derivatives_path=row["derivatives_path"] if derivatives_dir else None,
+                model_df,
+                network,
+                bool(derivatives_dir),
+                dense_time_grid,
+                summary,
+            )
+        else:
+            writer = open_writer(hdf_path, storage_backend, encoding=encoding)
+        # Keep a single handle open for all models.
+        with writer:
+            if not swmr:
+                # The SWMR writer already wrote the model dataframe, the dense tensor and the summary.
+                writer.write_model_df(model_df)
+                if dense_time_grid is not None:
+                    writer.enable_dense(model_df["storage_id"], dense_time_grid)
+                if summary:
+                    writer.enable_summary(model_df["storage_id"])
+            for idx, row in tqdm(
+                enumerate(model_df.iterrows()), total=len(model_df)
+            ):
+                row = row[1]  # throw away the pandas index
+                full_output_csv_to_hdf(
+                    row["abundances_path"],
+                    hdf_path,
+                    row["storage_id"],
+                    get_rates=get_rates,
+                    assume_identical_networks=True,
+                    derivatives_path=row["derivatives_path"]
+                    if derivatives_dir
+                    else None,
+                    storage_backend=storage_backend,
+                    network=network,
+                    writer=writer,
+                )
+        if marker_dir:
+            from ..utils.partition import write_marker
+
+            write_marker(
+                marker_dir,
+                shard_index or 0,
+                num_shards or 1,
+                list(model_df["storage_id"]),
             )
 
+    def _open_swmr_writer(
+        self, hdf_path, model_df, network, get_derivatives, dense_time_grid, summary
+    ):
+        """Create the store in SWMR mode, the columns are taken from the first model."""
+        import uclchem
+        from .writer import SWMRStoreWriter
+
+        abundances_columns = uclchem.analysis.read_output_file(
+            model_df["abundances_path"].iloc[0]
+        ).columns
+        derivatives_columns = (
+            pd.read_csv(
+                model_df["derivatives_path"].iloc[0], index_col=0, nrows=0
+            ).columns
+            if get_derivatives
+            else None
+        )
+        return SWMRStoreWriter(
+            hdf_path,
+            model_df,
+            abundances_columns,
+            network,
+            derivatives_columns=derivatives_columns,
+            dense_time_grid=dense_time_grid,
+            summary=summary,
+        )
+
     def process_outputFile(self, output_files, strict_check=False):
         """Function that obtains the common directory and individual filenames of the output files.
 
@@ -333,17 +430,29 @@ class DataLoaderCSV:
         csv_directory: str,
         match_statement: str = "*Full.dat",
         get_rates: bool = False,
+        preload: bool = False,
+        n_jobs: int = -1,
+        cache: bool = True,
+        cache_dir: str = None,
     ):
         """Dataloader that can be used to load a whole grid of files.
 
+        The files are only parsed when a model is first accessed (or all at once with preload),
+        and the parsed values are kept in a binary sidecar cache (see csv_cache), so opening
+        the same directory again reads the binary copies instead of parsing the files.
+
         Args:
-            csv_directory (str): _description_
-            match_statement (str, optional): _description_. Defaults to "*Full.dat".
-            get_rates (bool, optional): _description_. Defaults to False.
+            csv_directory (str): The directory with the full output files
+            match_statement (str, optional): The glob pattern of the full output files. Defaults to "*Full.dat".
+            get_rates (bool, optional): Also return the rates of every species, computed on first access. Defaults to False.
+            preload (bool, optional): Parse all files now using n_jobs worker processes. Defaults to False.
+            n_jobs (int, optional): The number of worker processes of preload, -1 uses all cores. Defaults to -1.
+            cache (bool, optional): Read and write the sidecar cache. Defaults to True.
+            cache_dir (str, optional): The directory of the cache, `.uclchem_cache` in csv_directory if None. Defaults to None.
 
         Raises:
-            RuntimeError: _description_
-            RuntimeError: _description_
+            RuntimeError: If no files match
+            RuntimeError: If several files have the same name
         """
         self.get_rates = get_rates
         if self.get_rates:
@@ -351,122 +460,765 @@ class DataLoaderCSV:
                 "get_rates is true, ensure the version that created ran the model (identical version& network) is used\n If not, you might get unexpected behaviour. Currently there are NO checks."
             )
         csv_files = [
-            pathlib.Path(p) for p in glob.glob(csv_directory + match_statement)
+            pathlib.Path(p) for p in sorted(glob.glob(csv_directory + match_statement))
         ]
         if len(csv_files) == 0:
             raise RuntimeError(
                 f"Found zero files, is the path {csv_directory} correct?"
             )
-        print(csv_files)
         self.model_df = pd.DataFrame()
         self.model_df["FullOutput"] = csv_files
         self.model_df["storage_id"] = [p.stem for p in self.model_df["FullOutput"]]
-        self.species = self.get_species()["NAME"].to_list()
-        self.reactions = self.get_reactions()
+        if self.model_df["storage_id"].duplicated().any():
+            raise RuntimeError(
+                "Found duplicate entries in the csv directory, make sure all names are unique"
+            )
+        self._paths = dict(zip(self.model_df["storage_id"], csv_files))
+        self.cache = cache
+        self.cache_dir = cache_dir
+        self._network = None
+        # Filled on first access of every model.
         self.csv_store = {}
         self.rates_store = {}
-        for row in self.model_df.iterrows():
-            row = row[1]
-            row_id = row["storage_id"]
-            if row_id in self.csv_store:
-                raise RuntimeError(
-                    "Found duplicate entries in the csv directory, make sure all names are unique"
+        if preload:
+            self.preload(n_jobs=n_jobs)
+
+    def preload(self, keys: list = None, n_jobs: int = -1, progress: bool = True):
+        """Parse the files of the models that are not loaded yet in worker processes.
+
+        Files with an up to date cache entry are read in this process, only the others are
+        parsed by the workers, which also fill the cache.
+
+        Args:
+            keys (list[str], optional): The storage_ids to load, all if None. Defaults to None.
+            n_jobs (int, optional): The number of worker processes, -1 uses all cores, 1 parses in this process. Defaults to -1.
+            progress (bool, optional): Show a progress bar. Defaults to True.
+        """
+        from tqdm import tqdm
+        from .csv_cache import _read_chunk, is_cached, read_cached_output
+        from .parallel import iter_parallel
+
+        keys = [key for key in (keys or self.keys()) if key not in self.csv_store]
+        if self.cache:
+            cached = [key for key in keys if is_cached(self._paths[key], self.cache_dir)]
+        else:
+            cached = []
+        to_parse = [key for key in keys if key not in set(cached)]
+        n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        with tqdm(total=len(keys), disable=not progress) as progress_bar:
+            for key in cached:
+                self.csv_store[key] = read_cached_output(
+                    self._paths[key], self.cache, self.cache_dir
                 )
-            fulloutput = uclchem.analysis.read_output_file(row["FullOutput"])
-            self.csv_store[row_id] = fulloutput
-            if self.get_rates:
-                rates_dict = get_rates_of_change(
-                    fulloutput, self.species, self.reactions
+                progress_bar.update()
+            if n_jobs == 1 or len(to_parse) <= 1:
+                chunks = [to_parse[i : i + 1] for i in range(len(to_parse))]
+                results = (
+                    _read_chunk([self._paths[key] for key in chunk], self.cache, self.cache_dir)
+                    for chunk in chunks
                 )
-                self.rates_store[row_id] = {
-                    "total_rates": {},
-                    "production": {},
-                    "destruction": {},
-                }
-                for specie in self.species:
-                    total_rates, production, destruction = rates_to_dfs(
-                        rates_dict, specie
-                    )
-                    self.rates_store[row_id]["total_rates"][specie] = total_rates
-                    self.rates_store[row_id]["production"][specie] = production
-                    self.rates_store[row_id]["destruction"][specie] = destruction
             else:
-                self.rates_store[row_id] = {}
+                chunksize = max(1, min(16, len(to_parse) // (4 * n_jobs)))
+                chunks = [
+                    to_parse[i : i + chunksize] for i in range(0, len(to_parse), chunksize)
+                ]
+                results = iter_parallel(
+                    _read_chunk,
+                    [
+                        ([self._paths[key] for key in chunk], self.cache, self.cache_dir)
+                        for chunk in chunks
+                    ],
+                    n_jobs,
+                )
+            for chunk, outputs in zip(chunks, results):
+                self.csv_store.update(zip(chunk, outputs))
+                progress_bar.update(len(chunk))
+
+    def _load_abundances(self, key) -> pd.DataFrame:
+        from .csv_cache import read_cached_output
+
+        if key not in self.csv_store:
+            self.csv_store[key] = read_cached_output(
+                self._paths[key], self.cache, self.cache_dir
+            )
+        return self.csv_store[key]
+
+    def _load_rates(self, key) -> dict:
+        if not self.get_rates:
+            return {}
+        if key not in self.rates_store:
+            from .rates import get_rates_of_change, rates_to_dfs
+
+            rates_dict = get_rates_of_change(
+                self._load_abundances(key),
+                self.network.species_table,
+                self.reactions,
+                network=self.network,
+            )
+            rates = {"total_rates": {}, "production": {}, "destruction": {}}
+            for specie in self.species:
+                total_rates, production, destruction = rates_to_dfs(rates_dict, specie)
+                rates["total_rates"][specie] = total_rates
+                rates["production"][specie] = production
+                rates["destruction"][specie] = destruction
+            self.rates_store[key] = rates
+        return self.rates_store[key]
+
+    @property
+    def network(self) -> Network:
+        """The network of the installed UCLCHEM, loaded on first use."""
+        if self._network is None:
+            self._network = get_uclchem_network()
+        return self._network
+
+    @property
+    def species(self) -> list:
+        return list(self.network.species_names)
+
+    @property
+    def reactions(self) -> pd.DataFrame:
+        return self.network.reaction_table
 
     def keys(self):
-        return list(self.csv_store.keys())
+        return list(self._paths.keys())
 
     def get_species(self):
-        try:
-            return uclchem.utils.get_species_table()
-        except (NameError, AttributeError) as exc:
-            raise exc("Cannot find UCLCHEM, so cannot obtain the species table")
+        return self.network.species_table
 
     def get_reactions(self):
-        try:
-            return uclchem.utils.get_reaction_table()
-        except (NameError, AttributeError) as exc:
-            raise exc("Cannot find UCLCHEM, so cannot obtain the species table")
+        return self.network.reaction_table
 
     def __getitem__(self, key) -> dict:
+        if key not in self._paths:
+            raise KeyError(f"No full output file for {key}")
         return {
             **{
-                "abundances": self.csv_store[key],
+                "abundances": self._load_abundances(key),
                 "reactions": self.reactions,
                 "species": self.species,
             },
-            **self.rates_store[key],
+            **self._load_rates(key),
         }
 
 
 class DataLoaderHDF:
     """Loads results as written to a common hdf datastore (see GridConverter for the format)"""
 
-    def __init__(self, h5path, h5mode="r"):
-        try:
-            self.models_df = pd.read_hdf(h5path, "model_df")
-            self.datasets = self.models_df["storage_id"].to_list()
-        except KeyError:
-            with h5py.File(h5path, mode=h5mode) as fh:
-                self.datasets = list(fh.keys())
+    def __init__(self, h5path, h5mode="r", live=False, trace=False):
+        """Open a store.
+
+        Args:
+            h5path (Path): The store to read
+            h5mode (str, optional): The mode to open the store with. Defaults to "r".
+            live (bool, optional): Read a store that is still being written in SWMR mode
+                (see GridConverter), call refresh() to see the models completed since. Defaults to False.
+            trace (bool, optional): Record which rows and columns of the abundances are read in
+                the AccessTrace `trace`, see uclchem_tools.io.inspector.advise_chunks. Defaults to False.
+        """
+        self.h5path = h5path
+        self.h5mode = h5mode
+        self.live = live
+        self.trace = AccessTrace() if trace else None
+        self._fh = None
+        self._models_df = None
+        self._nearest_index = None
+        self._interpolators = {}
+        # Check with h5py first, pd.read_hdf needs to import PyTables.
+        with self.get_h5_filehandle() as fh:
+            has_model_df = "model_df" in fh
+            if not has_model_df:
+                self.datasets = [key for key in fh.keys() if key != NETWORK_GROUP]
+                self._storage_ids = np.array(self.datasets, dtype=object)
                 print(
                     "No model DataFrame, obtained these keys instead (filter at your own discretion):",
                     self.datasets,
                 )
-        self.h5path = h5path
-        self.h5mode = h5mode
-        self.get_rates = "rates" in self.datasets[0]
+        self._has_model_df = has_model_df
+        if has_model_df:
+            # Only the storage_ids, the model dataframe is loaded on first use.
+            self._storage_ids = self._load_storage_ids()
+            self.datasets = list(self._storage_ids)
+        with self.get_h5_filehandle() as fh:
+            self.get_rates = f"{self.datasets[0]}/rates" in fh
+            has_completed = "completed" in fh
+            # The networks of the store by their hash, empty for stores with a single network at the root.
+            self.networks = list(fh[NETWORK_GROUP]) if NETWORK_GROUP in fh else []
+            self.default_network = fh[self.datasets[0]].attrs.get(
+                "network", self.networks[0] if self.networks else None
+            )
+        self._model_networks = {}
+        self._network_tables = {}
+        self.columns, self._column_maps = self._load_column_maps()
+        self._column_index = {column: i for i, column in enumerate(self.columns)}
+        if has_completed:
+            # Only the models that are completely written.
+            self.refresh()
         self._lookup_index_to_species = self.get_lookup_index_to_species()
         self.species_table = self._load_species_table()
-        self.reaction_table = self._load_species_table()
+        self.reactions_table = self._load_reactions_table()
         self.species = list(self.species_table["NAME"])
         self.reactions = None
 
     def get_h5_filehandle(self) -> h5py.File:
+        if self._fh is not None:
+            # A handle kept open with keep_open(), the caller must not close it.
+            return nullcontext(self._fh)
+        return self.open_h5_filehandle()
+
+    def open_h5_filehandle(self):
+        """Open a new handle to the store, also when one is kept open with keep_open()."""
+        if self.live:
+            return h5py.File(self.h5path, "r", swmr=True)
         return h5py.File(self.h5path, self.h5mode)
 
-    def get_lookup_index_to_species(self):
+    def keep_open(self):
+        """Keep one handle open for all following reads instead of opening the store per read.
+
+        Returns:
+            DataLoaderHDF: The loader itself, call close() to release the handle.
+        """
+        if self._fh is None:
+            self._handle = self.open_h5_filehandle()
+            self._fh = self._handle.__enter__()
+        return self
+
+    @property
+    def is_kept_open(self) -> bool:
+        """Whether a handle is kept open with keep_open() until close() is called."""
+        return self._fh is not None
+
+    def close(self):
+        if self._fh is not None:
+            self._handle.__exit__(None, None, None)
+            self._fh = None
+
+    def __getstate__(self):
+        # Open handles cannot be pickled, the caches are rebuilt on use.
+        state = self.__dict__.copy()
+        # The reads of worker processes are not traced.
+        state.update(
+            _fh=None,
+            _handle=None,
+            _models_df=None,
+            _nearest_index=None,
+            _interpolators={},
+            trace=None,
+        )
+        return state
+
+    def _load_model_df(self) -> pd.DataFrame:
+        with self.get_h5_filehandle() as fh:
+            if is_columnar(fh):
+                return read_model_table(fh)
+        return pd.read_hdf(self.h5path, "model_df")
+
+    def _load_storage_ids(self) -> np.ndarray:
+        with self.get_h5_filehandle() as fh:
+            if is_columnar(fh):
+                return np.array(ModelTable(fh).storage_ids(), dtype=object)
+        return self.models_df["storage_id"].to_numpy()
+
+    @property
+    def models_df(self) -> pd.DataFrame:
+        """The complete model dataframe, loaded on first use. Use query() to select models by their parameters."""
+        if self._models_df is None:
+            if not self._has_model_df:
+                raise RuntimeError(
+                    "This store has no model dataframe, its models can only be read by their keys."
+                )
+            self._models_df = self._load_model_df()
+        return self._models_df
+
+    def query(self, **predicates) -> list:
+        """Select models by their parameters without loading the model dataframe.
+
+        Every predicate is a tuple of inclusive bounds where None is unbounded, a single value
+        or a list of allowed values, see ModelTable.where.
+
+        Example:
+            loader.query(initialDens=(1e4, 1e6), zeta=(10, None))
+
+        Returns:
+            list[str]: The storage_ids of the matching models, in the order of the model dataframe.
+        """
+        with self.get_h5_filehandle() as fh:
+            if is_columnar(fh):
+                table = ModelTable(fh)
+                storage_ids = table.storage_ids(table.where(**predicates))
+            else:
+                storage_ids = None
+        if storage_ids is None:
+            # Stores written by older versions, filter the model dataframe in memory.
+            mask = np.ones(len(self.models_df), dtype=bool)
+            for column, predicate in predicates.items():
+                mask &= mask_predicate(self.models_df[column].to_numpy(), predicate)
+            storage_ids = self.models_df["storage_id"][mask].tolist()
+        # Live stores only return the models that are completed.
+        available = set(self.datasets)
+        return [storage_id for storage_id in storage_ids if storage_id in available]
+
+    def nearest(self, params: dict, k: int = 1) -> tuple:
+        """Find the k models with parameters closest to the given ones.
+
+        The distance is measured in normalized parameter space, where parameters spanning
+        orders of magnitude are log scaled (see uclchem_tools.io.nearest). The index is read
+        from the store on the first call, stores without one build it from the model dataframe.
+        In live mode, models that are not completed yet can be returned.
+
+        Example:
+            loader.nearest({"initialDens": 1e5, "initialTemp": 20.0, "zeta": 1.0}, k=4)
+
+        Args:
+            params (dict[str, float]): The parameters to match, a subset of the grid parameters is allowed.
+            k (int, optional): The number of models. Defaults to 1.
+
+        Returns:
+            tuple[list[str], np.ndarray]: The storage_ids and distances of the models, closest first.
+        """
+        if self._nearest_index is None:
+            from .nearest import NN_GROUP, NearestIndex
+
+            with self.get_h5_filehandle() as fh:
+                has_index = NN_GROUP in fh
+                if has_index:
+                    self._nearest_index = NearestIndex.from_group(fh)
+            if not has_index:
+                self._nearest_index = NearestIndex.from_model_df(self.models_df)
+        rows, distances = self._nearest_index.query(params, k)
+        return self._storage_ids[rows].tolist(), distances
+
+    def interpolator(self, species: list, **kwargs):
+        """Obtain an interpolator of the abundances at arbitrary parameters and times.
+
+        The interpolator is built on first use and reused for identical arguments, building
+        it reads all models. In live mode it is rebuilt once new models are completed.
+
+        Example:
+            abundances, error = loader.interpolator(["CO"])({"initialDens": densities, "zeta": 1.0}, times)
+
+        Args:
+            species (list[str]): The species to interpolate
+            kwargs: Passed to uclchem_tools.io.interpolate.GridInterpolator.
+
+        Returns:
+            GridInterpolator: The interpolator, call it with the parameters and times.
+        """
+        from .interpolate import GridInterpolator
+
+        key = repr((list(species), sorted(kwargs.items()), len(self.datasets)))
+        if key not in self._interpolators:
+            self._interpolators[key] = GridInterpolator(self, species, **kwargs)
+        return self._interpolators[key]
+
+    def get_dense(self, columns: list = None) -> dict:
+        """Read the dense (models x times x columns) tensor of a grid converted with dense_times.
+
+        Args:
+            columns (list[str], optional): The columns to read, all if None. Defaults to None.
+
+        Returns:
+            dict: The "values", NaN for models not (yet) written, and the "storage_ids", "times" and "columns" of its axes.
+        """
+        with self.get_h5_filehandle() as fh:
+            if "dense" not in fh:
+                raise RuntimeError(
+                    "This store has no dense tensor, convert it with dense_times."
+                )
+            group = fh["dense"]
+            header = [column.decode("UTF-8") for column in group["abundances_header"][:]]
+            if columns is None:
+                columns = header
+                values = group["abundances"][...]
+            else:
+                values = read_columns(
+                    group["abundances"], [header.index(column) for column in columns]
+                )
+            return {
+                "values": values,
+                "storage_ids": [
+                    storage_id.decode("UTF-8") for storage_id in group["storage_id"][:]
+                ],
+                "times": group["time"][:],
+                "columns": list(columns),
+            }
+
+    def summary(self, stat: str, species: list = None) -> pd.DataFrame:
+        """Read a summary statistic of every model, stored when the grid was converted.
+
+        Args:
+            stat (str): One of SUMMARY_STATS, see uclchem_tools.io.summary.
+            species (list[str], optional): The columns to read, all if None. Defaults to None.
+
+        Returns:
+            pd.DataFrame: The statistic of every available model, indexed by storage_id.
+        """
+        from .summary import SUMMARY_GROUP, SUMMARY_STATS
+
+        if stat not in SUMMARY_STATS:
+            raise ValueError(f"Unknown statistic {stat}, choose from {SUMMARY_STATS}.")
+        with self.get_h5_filehandle() as fh:
+            if SUMMARY_GROUP not in fh:
+                raise RuntimeError(
+                    "This store has no summary, convert it with summary=True."
+                )
+            group = fh[SUMMARY_GROUP]
+            header = [column.decode("UTF-8") for column in group["header"][:]]
+            species = header if species is None else list(species)
+            values = read_columns(group[stat], [header.index(specie) for specie in species])
+            storage_ids = [
+                storage_id.decode("UTF-8") for storage_id in group["storage_id"][:]
+            ]
+        summary = pd.DataFrame(
+            values,
+            index=pd.Index(storage_ids, name="storage_id"),
+            columns=species,
+        )
+        # Skip the models that are not (yet) written.
+        return summary[summary.index.isin(self.datasets)]
+
+    def at_time(
+        self,
+        time: float,
+        species: list = None,
+        method: str = "nearest",
+        storage_ids: list = None,
+    ) -> pd.DataFrame:
+        """Read the abundances of all models at one time, e.g. for a map across the grid.
+
+        Every model has a sorted time index, so only the one or two rows around the time are
+        read for every model and the cost scales with the number of models, not their outputs.
+        Stores written before the time index existed read the Time column instead.
+
+        Example:
+            co = loader.at_time(1e5, ["CO"], method="linear")
+
+        Args:
+            time (float): The time in years
+            species (list[str], optional): The species (or physical columns), all columns except Time if None. Defaults to None.
+            method (str, optional): "nearest" takes the output closest in log-time, "linear" interpolates
+                the two surrounding outputs like resample.resample. Defaults to "nearest".
+            storage_ids (list[str], optional): The models, all available models if None. Defaults to None.
+
+        Returns:
+            pd.DataFrame: A row per model indexed by storage_id, NaN for models that do not reach the time.
+        """
+        from .resample import get_time_index, interpolate_between
+
+        if method not in ("nearest", "linear"):
+            raise ValueError(f"Unknown method {method}, choose nearest or linear.")
+        storage_ids = self.datasets if storage_ids is None else list(storage_ids)
+        species = (
+            [column for column in self.columns if column != "Time"]
+            if species is None
+            else list(species)
+        )
+        values = np.full((len(storage_ids), len(species)), np.nan)
+        with self.get_h5_filehandle() as fh:
+            has_time_index = f"{storage_ids[0]}/time_index" in fh
+            for i, storage_id in enumerate(storage_ids):
+                positions = self.get_column_positions(storage_id, species, fh)
+                if has_time_index:
+                    time_index = fh[f"{storage_id}/time_index"][:]
+                    times, rows = time_index[:, 0], time_index[:, 1].astype("int64")
+                else:
+                    time_index = get_time_index(
+                        self.read_aligned(
+                            storage_id, self.get_column_positions(storage_id, ["Time"], fh), fh=fh
+                        )[:, 0]
+                    )
+                    times = time_index["Time"].to_numpy()
+                    rows = time_index["row"].to_numpy("int64")
+                if not len(times) or not times[0] <= time <= times[-1]:
+                    continue
+                left = max(
+                    min(np.searchsorted(times, time, side="right") - 1, len(times) - 2), 0
+                )
+                right = min(left + 1, len(times) - 1)
+                if method == "nearest":
+                    if right != left and np.log(times[right] / time) < np.log(time / times[left]):
+                        left = right
+                    values[i] = self.read_aligned(storage_id, positions, rows[left], fh)
+                    continue
+                if rows[right] == rows[left] + 1:
+                    # The common case, both outputs in one hyperslab.
+                    block = self.read_aligned(
+                        storage_id, positions, slice(rows[left], rows[right] + 1), fh
+                    )
+                else:
+                    block = np.stack(
+                        [
+                            self.read_aligned(storage_id, positions, rows[left], fh),
+                            self.read_aligned(storage_id, positions, rows[right], fh),
+                        ]
+                    )
+                values[i] = interpolate_between(
+                    time, times[left], times[right], block[0], block[-1]
+                )
+        return pd.DataFrame(
+            values, index=pd.Index(storage_ids, name="storage_id"), columns=species
+        )
+
+    def iter_batches(
+        self,
+        batch_size: int,
+        species: list = None,
+        shuffle: bool = False,
+        prefetch: int = 4,
+        **kwargs,
+    ):
+        """Iterate over the rows of the abundances of all models in batches of float32 arrays.
+
+        Blocks of rows are read ahead in a background thread, see uclchem_tools.io.batches.
+
+        Example:
+            for batch in loader.iter_batches(1024, species=["Time", "Density", "CO"], shuffle=True):
+                train_step(batch)
+
+        Args:
+            batch_size (int): The number of rows per batch
+            species (list[str], optional): The columns to read, all columns if None. Defaults to None.
+            shuffle (bool, optional): Shuffle the rows within chunk aligned blocks. Defaults to False.
+            prefetch (int, optional): The number of blocks read ahead. Defaults to 4.
+            kwargs: Passed to uclchem_tools.io.batches.iter_batches, e.g. storage_ids or seed.
+
+        Yields:
+            np.ndarray: C-contiguous float32 arrays with shape (batch_size, columns).
+        """
+        from .batches import iter_batches
+
+        yield from iter_batches(
+            self,
+            batch_size,
+            species=species,
+            shuffle=shuffle,
+            prefetch=prefetch,
+            **kwargs,
+        )
+
+    def map(
+        self,
+        func,
+        keys: list = None,
+        n_jobs: int = -1,
+        chunksize: int = None,
+        ordered: bool = True,
+        progress: bool = True,
+    ):
+        """Apply a function to many models in parallel worker processes.
+
+        Every worker opens its own read handle, see uclchem_tools.io.parallel.
+
+        Example:
+            for key, final_co in loader.map(lambda model: model["abundances"]["CO"].iloc[-1]):
+                ...
+
+        Args:
+            func (callable): Called with a model as returned by __getitem__.
+            keys (list[str], optional): The storage_ids of the models, all models if None. Defaults to None.
+            n_jobs (int, optional): The number of worker processes, -1 uses all cores and 1 runs in this process. Defaults to -1.
+            chunksize (int, optional): The number of models per task, chosen from the number of models if None. Defaults to None.
+            ordered (bool, optional): Yield the results in the order of keys, otherwise as they complete. Defaults to True.
+            progress (bool, optional): Show a progress bar. Defaults to True.
+
+        Yields:
+            tuple[str, object]: The storage_id and the result of func.
+        """
+        from .parallel import parallel_map
+
+        yield from parallel_map(
+            self,
+            func,
+            self.datasets if keys is None else keys,
+            n_jobs=n_jobs,
+            chunksize=chunksize,
+            ordered=ordered,
+            progress=progress,
+        )
+
+    def reduce(self, columns: list = None, n_jobs: int = 1, **kwargs):
+        """Statistics of the columns over all models, streamed from the store without loading the grid.
+
+        Example:
+            statistics = loader.reduce(n_jobs=8)
+            statistics.envelope("CO")  # min, 16th, 50th and 84th percentile and max against time
+
+        Args:
+            columns (list[str], optional): The columns (species), all columns if None. Defaults to None.
+            n_jobs (int, optional): The number of worker processes, 1 reduces in this process. Defaults to 1.
+            kwargs: Passed to uclchem_tools.io.reduce.reduce_grid, e.g. time_range or bin_width.
+
+        Returns:
+            GridStatistics: The statistics with means, moments, extremes and quantiles per time and column.
+        """
+        from .reduce import reduce_grid
+
+        return reduce_grid(self, columns=columns, n_jobs=n_jobs, **kwargs)
+
+    def iter_models(self, storage_ids=None, **predicates):
+        """Load models one at a time, either the given storage_ids or the ones matching the predicates.
+
+        Args:
+            storage_ids (list[str], optional): The models to load, see query() if None. Defaults to None.
+            predicates: The predicates of query().
+
+        Yields:
+            tuple[str, dict]: The storage_id and the model as returned by __getitem__.
+        """
+        if storage_ids is None:
+            storage_ids = self.query(**predicates)
+        for storage_id in storage_ids:
+            yield storage_id, self[storage_id]
+
+    def refresh(self) -> list:
+        """Update the datasets to the models completed in a store written in SWMR mode.
+
+        Returns:
+            list[str]: The storage_ids of the models that were completed since the last refresh.
+        """
+        with self.get_h5_filehandle() as fh:
+            if "completed" not in fh:
+                # Not written in SWMR mode, all models are complete.
+                return []
+            completed = fh["completed"][:]
+        datasets = self._storage_ids[completed].tolist()
+        new_datasets = datasets[len(getattr(self, "datasets", [])) :]
+        self.datasets = datasets
+        return new_datasets
+
+    def _get_network_key(self, key: str, network: str = None) -> str:
+        """The key of a network table, stores with a single network have their tables at the root."""
+        network = self.default_network if network is None else network
+        return key if network is None else f"{NETWORK_GROUP}/{network}/{key}"
+
+    def network_of(self, storage_id: str, fh=None) -> str:
+        """The hash of the network a model was run with, see the networks/<hash> groups of the store."""
+        if storage_id not in self._model_networks:
+            with self.get_h5_filehandle() if fh is None else nullcontext(fh) as fh:
+                self._model_networks[storage_id] = fh[storage_id].attrs.get(
+                    "network", self.default_network
+                )
+        return self._model_networks[storage_id]
+
+    def get_network_tables(self, network: str = None) -> tuple:
+        """The species and reactions tables of a network, the default network if None.
+
+        Returns:
+            tuple[pd.DataFrame, pd.DataFrame]: The species and reactions tables with the names of the species.
+        """
+        network = self.default_network if network is None else network
+        if network not in self._network_tables:
+            lookup = self.get_lookup_index_to_species(network)
+            self._network_tables[network] = (
+                self._load_species_table(network, lookup),
+                self._load_reactions_table(network, lookup),
+            )
+        return self._network_tables[network]
+
+    def _load_column_maps(self) -> tuple:
+        """The union of the columns of all networks and, per network, where they are in its models.
+
+        Returns:
+            tuple[list[str], dict[str, np.ndarray]]: The union of the columns and per network the
+                position of every union column in the header of its models, -1 if it has no such column.
+        """
         with self.get_h5_filehandle() as fh:
-            lookup = fh["index_species_lookup"][:]
+            headers = {
+                network: read_header(fh, f"{NETWORK_GROUP}/{network}/abundances")
+                for network in self.networks
+                if f"{NETWORK_GROUP}/{network}/abundances_header" in fh
+            }
+            if not headers:
+                # Stores written before networks/<hash>, all models have the columns of the first.
+                headers = {
+                    self.default_network: read_header(fh, f"{self.datasets[0]}/abundances")
+                }
+        columns = list(dict.fromkeys(column for header in headers.values() for column in header))
+        column_maps = {}
+        for network, header in headers.items():
+            positions = {column: i for i, column in enumerate(header)}
+            column_maps[network] = np.array(
+                [positions.get(column, -1) for column in columns], dtype="int64"
+            )
+        return columns, column_maps
+
+    def get_column_positions(self, storage_id: str, columns: list, fh=None) -> np.ndarray:
+        """The positions of columns in the abundances of a model, -1 for columns its network does not have."""
+        try:
+            union_positions = [self._column_index[column] for column in columns]
+        except KeyError as exc:
+            raise KeyError(f"The column {exc} is not in any network of the store.") from None
+        return self._column_maps[self.network_of(storage_id, fh)][union_positions]
+
+    def read_aligned(
+        self, storage_id: str, positions: np.ndarray, rows=slice(None), fh=None
+    ) -> np.ndarray:
+        """Read rows of a model in columns given by their positions, see get_column_positions.
+
+        Args:
+            storage_id (str): The model
+            positions (np.ndarray): The positions of the columns, -1 for columns its network does not have.
+            rows (slice | int, optional): The rows. Defaults to slice(None).
+            fh (optional): An open handle of the store, a handle is opened if None. Defaults to None.
+
+        Returns:
+            np.ndarray: The values, NaN for the positions -1.
+        """
+        if fh is None:
+            with self.get_h5_filehandle() as fh:
+                return self.read_aligned(storage_id, positions, rows, fh)
+        present = positions >= 0
+        values = read_rows(fh, f"{storage_id}/abundances", rows, positions[present].tolist())
+        if self.trace is not None:
+            self._record_read(fh, storage_id, rows, positions[present].tolist())
+        if present.all():
+            return values
+        aligned = np.full(values.shape[:-1] + (len(positions),), np.nan, dtype=values.dtype)
+        aligned[..., present] = values
+        return aligned
+
+    def _record_read(self, fh, storage_id: str, rows=slice(None), columns: list = None):
+        dataset = fh[f"{storage_id}/abundances"]
+        # The columns are positions in the header, also for encoded models.
+        n_columns = len(dataset.attrs["layout"]) if is_encoded(dataset) else dataset.shape[1]
+        self.trace.record(storage_id, rows, dataset.shape[0], n_columns, columns)
+
+    def read_abundances(self, storage_id: str, columns: list = None) -> pd.DataFrame:
+        """Read the abundances of a model in the columns of the store, whatever network it was run with.
+
+        Args:
+            storage_id (str): The model
+            columns (list[str], optional): The columns, all columns of all networks (see columns) if None. Defaults to None.
+
+        Returns:
+            pd.DataFrame: The abundances, NaN for the species that are not in the network of the model.
+        """
+        columns = self.columns if columns is None else list(columns)
+        positions = self.get_column_positions(storage_id, columns)
+        with self.get_h5_filehandle() as fh:
+            return pd.DataFrame(self.read_aligned(storage_id, positions, fh=fh), columns=columns)
+
+    def get_lookup_index_to_species(self, network: str = None):
+        with self.get_h5_filehandle() as fh:
+            lookup = fh[self._get_network_key("index_species_lookup", network)][:]
         return {
             b: a.decode("UTF-8") for a, b in zip(lookup[:, 0], lookup[:, 1].astype(int))
         }
 
-    def _load_species_table(self):
+    def _load_species_table(self, network: str = None, lookup: dict = None):
+        lookup = self._lookup_index_to_species if lookup is None else lookup
         with self.get_h5_filehandle() as fh:
-            species_table = h5py_to_df(fh, "species")
-        species_table["NAME"] = species_table["name_index"].apply(
-            lambda r: self._lookup_index_to_species[r]
-        )
+            species_table = h5py_to_df(fh, self._get_network_key("species", network))
+        species_table["NAME"] = species_table["name_index"].apply(lambda r: lookup[r])
         return species_table
 
-    def _load_reactions_table(self):
+    def _load_reactions_table(self, network: str = None, lookup: dict = None):
+        lookup = self._lookup_index_to_species if lookup is None else lookup
         with self.get_h5_filehandle() as fh:
-            reactions_table = h5py_to_df(fh, "reactions")
+            reactions_table = h5py_to_df(fh, self._get_network_key("reactions", network))
         for reaction in [r for r in reactions_table if "_index_" in r]:
             reactions_table[reaction.replace("_index_", " ").upper()] = reactions_table[
                 reaction
-            ].apply(lambda r: self._lookup_index_to_species[r])
+            ].apply(lambda r: lookup[r])
         return reactions_table
 
     def get_species(self):
@@ -481,22 +1233,30 @@ class DataLoaderHDF:
     def get_datasets_keys(self):
         return self.datasets
 
+    def _read_rates(self, fh, rates_key) -> pd.DataFrame:
+        if isinstance(fh[rates_key], h5py.Group):
+            # Stores written before the StoreWriter used PyTables for the rates.
+            return pd.read_hdf(self.h5path, rates_key)
+        rates = h5py_to_df(fh, rates_key)
+        return rates.set_index("Time") if "Time" in rates else rates
+
     def __getitem__(self, key) -> dict:
+        network = self.network_of(key)
+        species = (
+            self.species
+            if network == self.default_network
+            else list(self.get_network_tables(network)[0]["NAME"])
+        )
         with self.get_h5_filehandle() as fh:
+            if self.trace is not None:
+                self._record_read(fh, key)
             if self.get_rates:
                 temp_dict = {
-                    "total_rates": {
-                        spec: pd.read_hdf(fh, f"{key}/rates/total_rates/{spec}")
-                        for spec in self.species
-                    },
-                    "production": {
-                        spec: pd.read_hdf(fh, f"{key}/rates/production/{spec}")
-                        for spec in self.species
-                    },
-                    "destruction": {
-                        spec: pd.read_hdf(fh, f"{key}/rates/destruction/{spec}")
-                        for spec in self.species
-                    },
+                    rate_type: {
+                        spec: self._read_rates(fh, f"{key}/rates/{rate_type}/{spec}")
+                        for spec in species
+                    }
+                    for rate_type in ["total_rates", "production", "destruction"]
                 }
             else:
                 temp_dict = {
@@ -507,6 +1267,6 @@ class DataLoaderHDF:
             return {
                 "abundances": h5py_to_df(fh, key + "/abundances"),
                 "reactions": self.reactions,
-                "species": self.species,
+                "species": species,
                 **temp_dict,
             }
@@ -0,0 +1,377 @@
+"""Merge several stores into one, or repack a store, by copying the datasets at the HDF5 level.
+
+The datasets of the models are copied with H5Ocopy, which copies the stored (compressed)
+chunks as they are, and the dense tensor is copied chunk by chunk, so no values are decoded
+and encoded again. Only when the output is re-chunked or recompressed, or for the virtual
+datasets of a sharded master store, the values are read and written.
+
+Networks are copied once per hash into `networks/<hash>`. The tables of stores written before
+networks/<hash> are moved into a network group too, reusing a network with identical tables.
+The model dataframes are concatenated and indexed again, the dense tensors and summaries are
+stacked if all stores have them with the same columns (and time grid). Of stores written in
+SWMR mode only the completed models are copied.
+"""
+import hashlib
+import logging
+import pathlib
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from .model_table import read_model_df, write_model_table
+from .nearest import NN_GROUP, NearestIndex
+from .network import NETWORK_GROUP
+from .shards import NETWORK_KEYS
+from .summary import SUMMARY_GROUP, SUMMARY_STATS
+from .writer import DENSE_GROUP, get_storage_backend
+
+CONFLICT_POLICIES = ("error", "skip", "rename")
+# The keys at the root of a store that are not models.
+STORE_KEYS = {"model_df", "completed", NN_GROUP, NETWORK_GROUP, DENSE_GROUP, SUMMARY_GROUP}
+STORE_KEYS.update(NETWORK_KEYS)
+# The datasets of a model that chunk_rows and chunk_columns apply to.
+CHUNKED_DATASETS = ("abundances",)
+# The number of bytes read at once when values are copied.
+COPY_BLOCK_BYTES = 64 * 2**20
+
+
+def _read_models(hdf_path) -> tuple:
+    """The model dataframe (None if the store has none) and the storage_ids of the completed models."""
+    with h5py.File(hdf_path, "r") as fh:
+        if "model_df" not in fh:
+            return None, [key for key in fh if key not in STORE_KEYS]
+        completed = np.sort(fh["completed"][:]) if "completed" in fh else None
+    model_df = read_model_df(hdf_path)
+    if completed is not None:
+        model_df = model_df.iloc[completed]
+    return model_df, list(model_df["storage_id"])
+
+
+def _resolve_conflicts(storage_ids: list, on_conflict: str) -> list:
+    """Map the storage_ids of every store to their storage_id in the output.
+
+    Args:
+        storage_ids (list[list[str]]): The storage_ids of every store
+        on_conflict (str): "error" to raise, "skip" to keep the first model of a storage_id,
+            "rename" to add the index of the store, e.g. grid_0_2 for grid_0 of the third store.
+
+    Returns:
+        list[dict[str, str]]: Per store the new storage_id of every model that is copied.
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"on_conflict must be one of {CONFLICT_POLICIES}, not {on_conflict}")
+    seen = set()
+    mappings = []
+    for i, store_ids in enumerate(storage_ids):
+        mapping = {}
+        for storage_id in store_ids:
+            new_id = storage_id
+            if storage_id in seen:
+                if on_conflict == "error":
+                    raise RuntimeError(
+                        f"Found the storage_id {storage_id} in several stores, stopping. "
+                        "Use on_conflict='skip' or 'rename' to merge anyway."
+                    )
+                elif on_conflict == "skip":
+                    continue
+                new_id = f"{storage_id}_{i}"
+                if new_id in seen:
+                    raise RuntimeError(f"Cannot rename {storage_id}, {new_id} exists too.")
+            seen.add(new_id)
+            mapping[storage_id] = new_id
+        mappings.append(mapping)
+    return mappings
+
+
+def _get_creation_kwargs(dataset, repack: dict, name: str = None) -> dict:
+    kwargs = {
+        "chunks": dataset.chunks,
+        "compression": dataset.compression,
+        "compression_opts": dataset.compression_opts,
+        "shuffle": dataset.shuffle,
+        "fillvalue": dataset.fillvalue,
+    }
+    if repack is not None and dataset.ndim >= 2 and dataset.dtype.kind in "iuf":
+        if repack["compression"] is not None:
+            none = repack["compression"] == "none"
+            kwargs["compression"] = None if none else repack["compression"]
+            kwargs["compression_opts"] = None if none else repack["compression_opts"]
+        if (
+            dataset.ndim == 2
+            and name in repack["chunk_datasets"]
+            and (repack["chunk_rows"] is not None or repack["chunk_columns"] is not None)
+        ):
+            chunks = dataset.chunks or dataset.shape
+            kwargs["chunks"] = tuple(
+                max(min(size or chunk, length), 1)
+                for size, chunk, length in zip(
+                    (repack["chunk_rows"], repack["chunk_columns"]), chunks, dataset.shape
+                )
+            )
+        if kwargs["compression"] is not None and kwargs["chunks"] is None:
+            kwargs["chunks"] = True
+    return kwargs
+
+
+def _copy_values(source, target, source_rows=None, target_start: int = 0):
+    """Copy the rows of a dataset in blocks, the rows in increasing order, all if None."""
+    source_rows = np.arange(len(source)) if source_rows is None else np.asarray(source_rows)
+    row_bytes = max(source.dtype.itemsize * int(np.prod(source.shape[1:])), 1)
+    block = max(1, COPY_BLOCK_BYTES // row_bytes)
+    for start in range(0, len(source_rows), block):
+        rows = source_rows[start : start + block]
+        if len(rows) and rows[-1] - rows[0] == len(rows) - 1:
+            values = source[rows[0] : rows[-1] + 1]
+        else:
+            values = source[rows]
+        target[target_start + start : target_start + start + len(rows)] = values
+
+
+def _copy_dataset(dataset, group, name: str, repack: dict):
+    kwargs = _get_creation_kwargs(dataset, repack, name)
+    unchanged = all(
+        kwargs[key] == getattr(dataset, key) for key in ("chunks", "compression", "compression_opts")
+    )
+    if unchanged and not dataset.is_virtual:
+        # H5Ocopy copies the stored chunks and the attributes without decoding.
+        dataset.file.copy(dataset, group, name=name)
+        return
+    target = group.create_dataset(
+        name, shape=dataset.shape, dtype=dataset.dtype, **kwargs
+    )
+    target.attrs.update(dataset.attrs)
+    if dataset.shape and dataset.shape[0]:
+        _copy_values(dataset, target)
+    elif not dataset.shape:
+        target[()] = dataset[()]
+
+
+def _copy_group(source, target, repack: dict = None):
+    """Copy a group recursively, resolving the external links of sharded stores."""
+    target.attrs.update(source.attrs)
+    for name, item in source.items():
+        if isinstance(item, h5py.Dataset):
+            _copy_dataset(item, target, name, repack)
+        else:
+            _copy_group(item, target.create_group(name), repack)
+
+
+def _tables_equal(fh, group) -> bool:
+    return all(
+        (key in fh) == (key in group)
+        and (key not in fh or fh[key][()].tobytes() == group[key][()].tobytes())
+        for key in NETWORK_KEYS
+    )
+
+
+def _check_header(group, header: np.ndarray):
+    if "abundances_header" not in group:
+        group.create_dataset("abundances_header", data=header)
+    elif not np.array_equal(group["abundances_header"][:], header):
+        raise RuntimeError(
+            f"The models of network {group.name} have different abundances columns in the stores, stopping."
+        )
+
+
+def _merge_networks(fh, out, storage_ids: list) -> str:
+    """Copy the networks of a store that are not in the output yet.
+
+    Returns:
+        str: The network the models of a store written before networks/<hash> get, else None.
+    """
+    networks = out.require_group(NETWORK_GROUP)
+    for network, group in fh.get(NETWORK_GROUP, {}).items():
+        if network not in networks:
+            _copy_group(group, networks.create_group(network))
+        elif "abundances_header" in group:
+            _check_header(networks[network], group["abundances_header"][:])
+    if NETWORK_KEYS[0] not in fh:
+        return None
+    network = next(
+        (network for network, group in networks.items() if _tables_equal(fh, group)), None
+    )
+    if network is None:
+        digest = hashlib.sha1()
+        for key in NETWORK_KEYS:
+            if key in fh:
+                digest.update(fh[key][()].tobytes())
+        network = digest.hexdigest()[:16]
+        group = networks.create_group(network)
+        for key in NETWORK_KEYS:
+            if key in fh:
+                _copy_dataset(fh[key], group, key, None)
+    if storage_ids:
+        # All models of these stores have the columns of the first.
+        _check_header(networks[network], fh[f"{storage_ids[0]}/abundances_header"][:])
+    return network
+
+
+def _copy_direct_chunks(source, target, source_rows, target_start: int):
+    """Copy the chunks of one model each without decoding, chunks that were never written stay empty."""
+    rest = (0,) * (source.ndim - 1)
+    for i, row in enumerate(source_rows):
+        if source.id.get_chunk_info_by_coord((row,) + rest).byte_offset is None:
+            continue
+        filter_mask, chunk = source.id.read_direct_chunk((row,) + rest)
+        target.id.write_direct_chunk((target_start + i,) + rest, chunk, filter_mask)
+
+
+def _merge_stacked(out, sources: list, group_name: str, stacked: list, shared: list, repack: dict):
+    """Stack the per-model arrays of a group (e.g. the dense tensor) of all stores, see shards._link_stacked.
+
+    Args:
+        out (h5py.File): The output store
+        sources (list[tuple[h5py.File, dict]]): Every store with the new storage_id of its models
+        group_name (str): The group, skipped unless every store has it
+        stacked (list[str]): The arrays with a row per model
+        shared (list[str]): The arrays that must be identical in all stores, e.g. the header
+        repack (dict): The compression of the output, see merge_stores
+    """
+    groups = [fh.get(group_name) for fh, _ in sources]
+    if any(group is None or shared[0] not in group for group in groups):
+        if any(group is not None for group in groups):
+            logging.warning(f"Not all stores have the {group_name} arrays, not merging them.")
+        return
+    reference = groups[0]
+    if any(
+        group[key].shape[1:] != reference[key].shape[1:] for group in groups for key in stacked
+    ) or any(
+        not np.array_equal(group[key][:], reference[key][:]) for group in groups for key in shared
+    ):
+        logging.warning(f"The {group_name} arrays of the stores differ, not merging them.")
+        return
+    rows = []
+    for group, (_, mapping) in zip(groups, sources):
+        storage_ids = np.char.decode(group["storage_id"][:], "UTF-8")
+        rows.append(np.array([i for i, storage_id in enumerate(storage_ids) if storage_id in mapping], dtype="int64"))
+    n_models = sum(len(store_rows) for store_rows in rows)
+    target_group = out.create_group(group_name)
+    for key in stacked:
+        kwargs = _get_creation_kwargs(reference[key], repack)
+        # Keep one chunk per model (or per block of models) instead of re-chunking the rows.
+        kwargs["chunks"] = reference[key].chunks if reference[key].chunks else True
+        target = target_group.create_dataset(
+            key, shape=(n_models,) + reference[key].shape[1:], dtype=reference[key].dtype, **kwargs
+        )
+        start = 0
+        for group, store_rows in zip(groups, rows):
+            source = group[key]
+            if (
+                not source.is_virtual
+                and source.chunks == target.chunks
+                and source.chunks[0] == 1
+                and (source.compression, source.compression_opts, source.shuffle)
+                == (target.compression, target.compression_opts, target.shuffle)
+            ):
+                _copy_direct_chunks(source, target, store_rows, start)
+            else:
+                _copy_values(source, target, store_rows, start)
+            start += len(store_rows)
+    for key in shared:
+        target_group.create_dataset(key, data=reference[key][:])
+    target_group.create_dataset(
+        "storage_id",
+        data=np.array(
+            [
+                mapping[storage_id]
+                for group, store_rows, (_, mapping) in zip(groups, rows, sources)
+                for storage_id in np.char.decode(group["storage_id"][:][store_rows], "UTF-8")
+            ],
+            dtype="S",
+        ),
+    )
+
+
+def merge_stores(
+    input_paths: list,
+    output_path,
+    on_conflict: str = "error",
+    compression: str = None,
+    compression_opts=None,
+    chunk_rows: int = None,
+    chunk_columns: int = None,
+    chunk_datasets: tuple = CHUNKED_DATASETS,
+    progress: bool = True,
+):
+    """Merge GridConverter stores into a new store without decoding the outputs.
+
+    Args:
+        input_paths (list[Path]): The stores to merge, hdf only
+        output_path (Path): The store to create
+        on_conflict (str, optional): What to do with a storage_id that is in several stores: "error",
+            "skip" (keep the model of the first store) or "rename" (append the index of the store). Defaults to "error".
+        compression (str, optional): Recompress the outputs, e.g. "gzip" or "lzf", "none" to
+            store them uncompressed, keep their compression if None. Defaults to None.
+        compression_opts (optional): The options of the compression, e.g. the gzip level. Defaults to None.
+        chunk_rows (int, optional): Re-chunk the abundances of every model to this many rows per chunk,
+            keep their chunks if None. Defaults to None.
+        chunk_columns (int, optional): Re-chunk the abundances of every model to this many columns per chunk,
+            keep their chunks if None. Defaults to None.
+        chunk_datasets (tuple[str], optional): The datasets of the models that are re-chunked, the
+            other datasets keep their chunks. Defaults to CHUNKED_DATASETS.
+        progress (bool, optional): Show a progress bar. Defaults to True.
+    """
+    from tqdm import tqdm
+
+    output_path = pathlib.Path(output_path)
+    input_paths = [pathlib.Path(path) for path in input_paths]
+    if any(get_storage_backend(path) != "h5py" for path in input_paths + [output_path]):
+        raise NotImplementedError("Only hdf stores can be merged.")
+    if output_path.exists():
+        raise RuntimeError(f"The store {output_path} already exists, stopping.")
+    missing = [str(path) for path in input_paths if not path.exists()]
+    if missing:
+        raise RuntimeError(f"Cannot merge, the stores {missing} do not exist.")
+    repack = None
+    if compression is not None or chunk_rows is not None or chunk_columns is not None:
+        repack = {
+            "compression": compression,
+            "compression_opts": compression_opts,
+            "chunk_rows": chunk_rows,
+            "chunk_columns": chunk_columns,
+            "chunk_datasets": tuple(chunk_datasets),
+        }
+    model_dfs, storage_ids = zip(*[_read_models(path) for path in input_paths])
+    mappings = _resolve_conflicts(storage_ids, on_conflict)
+    with h5py.File(output_path, "w-") as out:
+        if all(model_df is not None for model_df in model_dfs):
+            kept = []
+            for model_df, mapping in zip(model_dfs, mappings):
+                model_df = model_df[model_df["storage_id"].isin(mapping)].copy()
+                model_df["storage_id"] = model_df["storage_id"].map(mapping)
+                kept.append(model_df)
+            model_df = pd.concat(kept, ignore_index=True)
+            write_model_table(out, model_df)
+            NearestIndex.from_model_df(model_df).to_group(out)
+        elif any(model_df is not None for model_df in model_dfs):
+            logging.warning("Not all stores have a model dataframe, the output has none.")
+        handles = [h5py.File(path, "r") for path in input_paths]
+        try:
+            with tqdm(total=sum(map(len, mappings)), disable=not progress) as progress_bar:
+                for fh, mapping in zip(handles, mappings):
+                    network = _merge_networks(fh, out, list(mapping))
+                    for storage_id, new_id in mapping.items():
+                        group = out.create_group(new_id)
+                        _copy_group(fh[storage_id], group, repack)
+                        if network is not None:
+                            group.attrs["network"] = network
+                        progress_bar.update()
+            sources = list(zip(handles, mappings))
+            _merge_stacked(out, sources, DENSE_GROUP, ["abundances"], ["abundances_header", "time"], repack)
+            _merge_stacked(out, sources, SUMMARY_GROUP, list(SUMMARY_STATS), ["header"], repack)
+        finally:
+            for fh in handles:
+                fh.close()
+    logging.info(
+        f"Merged {sum(map(len, mappings))} models from {len(input_paths)} stores into {output_path}"
+    )
+
+
+def repack_store(input_path, output_path, **kwargs):
+    """Copy a store into a new store, e.g. to recompress or re-chunk it, see merge_stores.
+
+    Also makes the master store of a sharded conversion self-contained and reclaims the space
+    of deleted datasets.
+    """
+    merge_stores([input_path], output_path, **kwargs)
@@ -0,0 +1,206 @@
+"""The model dataframe of a store as typed columns, with sorted indexes to query the parameters.
+
+Every column of the model dataframe is its own dataset in the `model_df` group, strings are
+stored as fixed length bytes. For every numeric column the group `model_df/_index/<column>`
+holds the sorted values and the rows they belong to, so a range predicate is resolved with
+a binary search on disk instead of loading and filtering the whole table. NaN is not in the
+index, a model without a value never matches a range. Works for h5py
+and zarr groups alike, stores written by older versions (a PyTables blob) are still read.
+"""
+import bisect
+
+import h5py
+import numpy as np
+import pandas as pd
+
+INDEX_GROUP = "_index"
+
+
+def _create_array(group, key, data):
+    if isinstance(group, h5py.Group):
+        group.create_dataset(key, data=data)
+    else:
+        group.create_array(key, data=data, overwrite=True)
+
+
+def _decode(values: np.ndarray) -> np.ndarray:
+    if values.dtype.kind == "S":
+        return np.char.decode(values, "UTF-8").astype(object)
+    return values
+
+
+def write_model_table(group, model_df: pd.DataFrame):
+    """Store the model dataframe as one typed dataset per column and index the numeric columns.
+
+    Args:
+        group (h5py.Group, zarr.Group): The root of the store
+        model_df (pd.DataFrame): The model dataframe
+    """
+    model_group = group.require_group("model_df")
+    model_group.attrs["columns"] = [str(column) for column in model_df.columns]
+    indexed = []
+    for column in model_df.columns:
+        values = model_df[column].to_numpy()
+        if values.dtype.kind not in "biuf":
+            values = np.array(model_df[column].astype(str), dtype="S")
+        _create_array(model_group, str(column), values)
+        if values.dtype.kind in "iuf":
+            order = np.argsort(values, kind="stable")
+            if values.dtype.kind == "f":
+                # NaN sorts last, leave it out so open ranges do not match it.
+                order = order[~np.isnan(values[order])]
+            index_group = model_group.require_group(f"{INDEX_GROUP}/{column}")
+            _create_array(index_group, "values", values[order])
+            _create_array(index_group, "order", order.astype("int64"))
+            indexed.append(str(column))
+    model_group.attrs["indexed"] = indexed
+
+
+def read_model_table(group) -> pd.DataFrame:
+    """Read the complete model dataframe written by write_model_table."""
+    model_group = group["model_df"]
+    return pd.DataFrame(
+        {
+            column: _decode(model_group[column][:])
+            for column in model_group.attrs["columns"]
+        }
+    )
+
+
+def read_model_df(hdf_path, swmr: bool = False) -> pd.DataFrame:
+    """Read the model dataframe of a hdf store, either stored per column or by pandas (PyTables).
+
+    Args:
+        hdf_path (Path): The store
+        swmr (bool, optional): Open the store as a SWMR reader, only possible with columns. Defaults to False.
+    """
+    with h5py.File(hdf_path, "r", swmr=swmr) as fh:
+        if is_columnar(fh):
+            return read_model_table(fh)
+    return pd.read_hdf(hdf_path, "model_df")
+
+
+def is_columnar(group) -> bool:
+    return "model_df" in group and "columns" in group["model_df"].attrs
+
+
+class _OnDisk:
+    """Sequence view on a sorted dataset, so bisect only reads the elements it compares."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return self.dataset.shape[0]
+
+    def __getitem__(self, i):
+        return self.dataset[i]
+
+
+def _bounds(predicate):
+    """Convert a predicate to inclusive (low, high) bounds, None means unbounded."""
+    if isinstance(predicate, tuple):
+        return predicate
+    return predicate, predicate
+
+
+def mask_predicate(values: np.ndarray, predicate) -> np.ndarray:
+    """Evaluate a single predicate (see ModelTable.where) on the values of a column in memory."""
+    if isinstance(predicate, (list, set, np.ndarray)):
+        return np.isin(values, list(predicate))
+    low, high = _bounds(predicate)
+    mask = np.ones(len(values), dtype=bool)
+    if values.dtype.kind == "f":
+        mask &= ~np.isnan(values)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
+
+
+class ModelTable:
+    """Queries on the columnar model dataframe of an open store."""
+
+    def __init__(self, group):
+        """
+        Args:
+            group (h5py.Group, zarr.Group): The root of the store, written by write_model_table.
+        """
+        self.model_group = group["model_df"]
+        self.columns = list(self.model_group.attrs["columns"])
+        self.indexed = set(self.model_group.attrs.get("indexed", []))
+
+    def __len__(self):
+        return self.model_group["storage_id"].shape[0]
+
+    def where(self, **predicates) -> np.ndarray:
+        """Resolve predicates on the parameters to the rows of the models that match all of them.
+
+        Every predicate is either a tuple of inclusive bounds `(low, high)` where None is
+        unbounded, a single value that has to match exactly or a list of allowed values.
+
+        Example:
+            table.where(initialDens=(1e4, 1e6), zeta=(10, None))
+
+        Returns:
+            np.ndarray: The sorted rows of the matching models.
+        """
+        rows = None
+        for column, predicate in predicates.items():
+            if column not in self.columns:
+                raise KeyError(f"The model dataframe has no column {column}.")
+            if column in self.indexed and not isinstance(
+                predicate, (list, set, np.ndarray)
+            ):
+                column_rows = self._range(column, *_bounds(predicate))
+            else:
+                values = _decode(self.model_group[column][:])
+                column_rows = np.flatnonzero(mask_predicate(values, predicate))
+            rows = (
+                column_rows
+                if rows is None
+                else np.intersect1d(rows, column_rows, assume_unique=True)
+            )
+        if rows is None:
+            return np.arange(len(self))
+        return rows
+
+    def _range(self, column, low, high) -> np.ndarray:
+        index_group = self.model_group[f"{INDEX_GROUP}/{column}"]
+        sorted_values = _OnDisk(index_group["values"])
+        start = 0 if low is None else bisect.bisect_left(sorted_values, low)
+        stop = (
+            len(sorted_values)
+            if high is None
+            else bisect.bisect_right(sorted_values, high)
+        )
+        if start >= stop:
+            return np.array([], dtype="int64")
+        return np.sort(index_group["order"][start:stop])
+
+    def read(self, rows, columns=None) -> pd.DataFrame:
+        """Read some columns of some rows, only the span between the first and last row is read.
+
+        Args:
+            rows (np.ndarray): Sorted rows, as obtained from where()
+            columns (list[str], optional): The columns to read, all if None. Defaults to None.
+        """
+        rows = np.asarray(rows, dtype="int64")
+        columns = self.columns if columns is None else columns
+        if len(rows) == 0:
+            return pd.DataFrame(columns=columns)
+        start, stop = rows[0], rows[-1] + 1
+        return pd.DataFrame(
+            {
+                column: _decode(self.model_group[column][start:stop])[rows - start]
+                for column in columns
+            },
+            index=rows,
+        )
+
+    def storage_ids(self, rows=None) -> list:
+        """The storage_ids of some rows, of all models if None."""
+        if rows is None:
+            return _decode(self.model_group["storage_id"][:]).tolist()
+        return self.read(rows, ["storage_id"])["storage_id"].tolist()
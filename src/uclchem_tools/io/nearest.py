@@ -0,0 +1,182 @@
+"""Nearest neighbour lookups of grid models in parameter space.
+
+The parameters of all models are normalized to [0, 1], after taking the logarithm of the
+parameters that span orders of magnitude (densities, zeta, radfield), and persisted in the
+`nn_index` group of the store when the model dataframe is written. The loader reads the
+points once and builds a KD-tree with scipy if it is installed, otherwise the neighbours are
+found by brute force with numpy, which is fast enough for grids up to ~1e5 models. Models
+with a missing (NaN) or infinite parameter are left out of the index.
+"""
+import numpy as np
+import pandas as pd
+
+from .model_table import _create_array
+
+NN_GROUP = "nn_index"
+
+
+def get_default_columns(model_df: pd.DataFrame) -> list:
+    """The numeric columns that vary between the models, these are the parameters of the grid."""
+    return [
+        str(column)
+        for column in model_df.columns
+        if model_df[column].dtype.kind in "iuf" and model_df[column].nunique() > 1
+    ]
+
+
+def should_log_scale(values: np.ndarray) -> bool:
+    """Take the logarithm of strictly positive parameters that span more than two orders of magnitude."""
+    return bool(np.all(values > 0) and values.max() / values.min() > 100)
+
+
+class NearestIndex:
+    """Normalized points of the models with a KD-tree (scipy) or brute force lookup."""
+
+    def __init__(self, points, columns, log_scaled, offsets, scales, rows=None):
+        """
+        Args:
+            points (np.ndarray): The normalized parameters, one row per indexed model.
+            columns (list[str]): The parameter of every dimension
+            log_scaled (np.ndarray): Whether the logarithm of a parameter was taken
+            offsets (np.ndarray): The minimum of every (log scaled) parameter
+            scales (np.ndarray): The range of every (log scaled) parameter
+            rows (np.ndarray, optional): The row in the model dataframe of every point, the
+                first len(points) rows if None. Defaults to None.
+        """
+        points = np.asarray(points, dtype="float64")
+        # A grid of a single model, or of identical models, has no parameters to index.
+        self.points = (
+            points.reshape(-1, len(columns)) if len(columns) else points.reshape(len(points), 0)
+        )
+        self.rows = np.arange(len(self.points)) if rows is None else np.asarray(rows, dtype="int64")
+        self.columns = list(columns)
+        self.log_scaled = np.asarray(log_scaled, dtype=bool)
+        self.offsets = np.asarray(offsets, dtype="float64")
+        self.scales = np.asarray(scales, dtype="float64")
+        self._trees = {}
+
+    @classmethod
+    def from_model_df(cls, model_df: pd.DataFrame, columns=None, log_scale=None):
+        """Normalize the parameters of a model dataframe.
+
+        Args:
+            model_df (pd.DataFrame): The model dataframe
+            columns (list[str], optional): The parameters to index, all varying numeric columns if None. Defaults to None.
+            log_scale (list[str], optional): The parameters to log scale, decided by their range if None. Defaults to None.
+        """
+        columns = get_default_columns(model_df) if columns is None else list(columns)
+        values = model_df[columns].to_numpy(dtype="float64").reshape(len(model_df), len(columns))
+        if log_scale is None:
+            finite = values[np.isfinite(values).all(axis=1)]
+            log_scaled = np.array(
+                [len(finite) > 0 and should_log_scale(finite[:, i]) for i in range(len(columns))],
+                dtype=bool,
+            )
+        else:
+            log_scaled = np.array([column in log_scale for column in columns], dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values[:, log_scaled] = np.log10(values[:, log_scaled])
+        # Models that miss a parameter cannot be placed in parameter space.
+        rows = np.flatnonzero(np.isfinite(values).all(axis=1))
+        values = values[rows]
+        if len(values):
+            offsets = values.min(axis=0)
+            scales = values.max(axis=0) - offsets
+        else:
+            offsets, scales = np.zeros(len(columns)), np.ones(len(columns))
+        # Constant parameters do not contribute to the distance.
+        scales[scales == 0] = 1.0
+        return cls((values - offsets) / scales, columns, log_scaled, offsets, scales, rows)
+
+    @classmethod
+    def from_group(cls, group):
+        """Read an index written by to_group."""
+        nn_group = group[NN_GROUP]
+        return cls(
+            nn_group["points"][:],
+            list(nn_group.attrs["columns"]),
+            nn_group["log_scaled"][:],
+            nn_group["offsets"][:],
+            nn_group["scales"][:],
+            # Indexes written before models without parameters were left out hold every row.
+            nn_group["rows"][:] if "rows" in nn_group else None,
+        )
+
+    def to_group(self, group):
+        """Persist the index in the `nn_index` group of a store."""
+        nn_group = group.require_group(NN_GROUP)
+        nn_group.attrs["columns"] = self.columns
+        _create_array(nn_group, "points", self.points)
+        _create_array(nn_group, "log_scaled", self.log_scaled)
+        _create_array(nn_group, "offsets", self.offsets)
+        _create_array(nn_group, "scales", self.scales)
+        _create_array(nn_group, "rows", self.rows)
+
+    def normalize(self, params: dict) -> tuple:
+        """Normalize query parameters like the points.
+
+        Args:
+            params (dict[str, float or np.ndarray]): A value, or an array of values, per parameter.
+
+        Returns:
+            tuple[list[int], np.ndarray]: The dimensions of the parameters and the normalized
+                point, or points with shape (n, dimensions) if arrays were given.
+        """
+        unknown = [column for column in params if column not in self.columns]
+        if unknown:
+            raise KeyError(
+                f"The parameters {unknown} are not indexed, choose from {self.columns}."
+            )
+        dims = [self.columns.index(column) for column in params]
+        point = np.array([params[column] for column in params], dtype="float64").T
+        log_scaled = self.log_scaled[dims]
+        point[..., log_scaled] = np.log10(point[..., log_scaled])
+        return dims, (point - self.offsets[dims]) / self.scales[dims]
+
+    def _get_tree(self, dims):
+        key = tuple(dims)
+        if key not in self._trees:
+            try:
+                from scipy.spatial import cKDTree
+            except ImportError:
+                self._trees[key] = None
+            else:
+                self._trees[key] = cKDTree(self.points[:, dims])
+        return self._trees[key]
+
+    def query(self, params: dict, k: int = 1) -> tuple:
+        """Find the k models closest to the parameters.
+
+        Only the given parameters are used for the distance, so a subset of the grid
+        parameters can be matched.
+
+        Args:
+            params (dict[str, float or np.ndarray]): The parameters to match, e.g. {"initialDens": 1e5, "initialTemp": 20},
+                arrays of values query several points at once.
+            k (int, optional): The number of models. Defaults to 1.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The rows of the models in the model dataframe and their distance in
+                normalized parameter space, closest first. With arrays of values, one row (k=1) or k rows per point.
+        """
+        dims, point = self.normalize(params)
+        k = min(k, len(self.points))
+        if k == 0:
+            shape = point.shape[:-1] + (0,)
+            return np.zeros(shape, dtype="int64"), np.zeros(shape)
+        tree = self._get_tree(dims)
+        if tree is not None:
+            distances, rows = tree.query(point, k=k)
+        else:
+            # Broadcast like the tree: (points..., models) distances, the k closest along the last axis.
+            distances = np.linalg.norm(self.points[:, dims] - point[..., None, :], axis=-1)
+            rows = np.argpartition(distances, k - 1, axis=-1)[..., :k]
+            rows = np.take_along_axis(
+                rows,
+                np.argsort(np.take_along_axis(distances, rows, axis=-1), axis=-1, kind="stable"),
+                axis=-1,
+            )
+            distances = np.take_along_axis(distances, rows, axis=-1)
+            if k == 1 and point.ndim > 1:
+                rows, distances = rows[..., 0], distances[..., 0]
+        return self.rows[np.atleast_1d(rows)], np.atleast_1d(distances)
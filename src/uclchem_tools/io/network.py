@@ -0,0 +1,165 @@
+"""The chemical network of UCLCHEM, loaded once and encoded as integer arrays."""
+import functools
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# The index of the empty reactant/product ("NAN") in the species lookup.
+NAN_INDEX = 0
+# The group of the network tables of a store, one subgroup per network hash.
+NETWORK_GROUP = "networks"
+
+
+def get_name_column(table: pd.DataFrame) -> str:
+    """Obtain the column with the species names, older versions of UCLCHEM use different names."""
+    for possible_name_key in ["Name", "NAME", "name"]:
+        if possible_name_key in table:
+            return possible_name_key
+    raise RuntimeError(
+        "Could not find the species names in the species table, stopping."
+    )
+
+
+class Network:
+    """The species and reactions of a network with precomputed lookups.
+
+    The species lookup maps "NAN", all the species and the reaction types (PHOTON, CRP, ...)
+    to integers, which is how the network is stored in the hdf stores. All reactants and
+    products are encoded once into an integer array, so the reactions of a species can be
+    found without comparing strings.
+    """
+
+    def __init__(
+        self,
+        species_table: pd.DataFrame,
+        reaction_table: pd.DataFrame,
+        reaction_types: list,
+    ):
+        """Precompute the lookups of a network.
+
+        Args:
+            species_table (pd.DataFrame): The species table as obtained from uclchem.utils.get_species_table()
+            reaction_table (pd.DataFrame): The reaction table as obtained from uclchem.utils.get_reaction_table()
+            reaction_types (list[str]): The reaction types that can be used as reactants.
+        """
+        self.species_table = species_table
+        self.reaction_table = reaction_table
+        self.species_names = np.array(
+            species_table[get_name_column(species_table)].astype(str)
+        )
+        self.lookup_names = np.array(
+            ["NAN"] + list(self.species_names) + list(reaction_types)
+        )
+        self.species_lookup = {name: i for i, name in enumerate(self.lookup_names)}
+        self.reaction_columns = [
+            header
+            for header in reaction_table
+            if header.startswith("Reactant") or header.startswith("Product")
+        ]
+        # The reactants and products as strings, the format the rates module works with.
+        self.reaction_array = reaction_table[self.reaction_columns].to_numpy()
+        self.encoded_reactions = self.encode(self.reaction_array)
+        self.encoded_species = self.encode(self.species_names)
+        self._reaction_indices = None
+
+    @classmethod
+    def from_uclchem(cls):
+        """Load the network of the current UCLCHEM install."""
+        import uclchem
+        from uclchem.makerates.reaction import reaction_types
+
+        return cls(
+            uclchem.utils.get_species_table(),
+            uclchem.utils.get_reaction_table(),
+            reaction_types,
+        )
+
+    def encode(self, names) -> np.ndarray:
+        """Convert an array of species names to their integer index in the lookup.
+
+        Args:
+            names (np.ndarray): Array of names of any shape, missing entries (NaN) become "NAN".
+
+        Returns:
+            np.ndarray: An int32 array with the same shape as names.
+        """
+        names = np.asarray(names)
+        # Only look up the unique names, the reaction table contains mostly repeats.
+        unique_names, inverse = np.unique(
+            np.char.upper(names.astype(str)), return_inverse=True
+        )
+        unique_codes = np.array(
+            [self.species_lookup[name] for name in unique_names], dtype="int32"
+        )
+        return unique_codes[inverse].reshape(names.shape)
+
+    def reactions_with(self, species_name: str) -> np.ndarray:
+        """Obtain the (zero-based) indices of all reactions a species is involved in.
+
+        Args:
+            species_name (str): The name of the species
+
+        Returns:
+            np.ndarray: The indices of the reactions
+        """
+        if self._reaction_indices is None:
+            self._reaction_indices = self._invert_reactions()
+        return self._reaction_indices[self.species_lookup[species_name.upper()]]
+
+    def _invert_reactions(self):
+        # Invert the encoded reactions in one pass: a list of reaction indices per species index.
+        n_reactions, n_columns = self.encoded_reactions.shape
+        codes = self.encoded_reactions.ravel()
+        reaction_idx = np.repeat(np.arange(n_reactions), n_columns)
+        order = np.argsort(codes, kind="stable")
+        codes, reaction_idx = codes[order], reaction_idx[order]
+        bounds = np.searchsorted(codes, np.arange(len(self.lookup_names) + 1))
+        return [
+            np.unique(reaction_idx[bounds[i] : bounds[i + 1]])
+            for i in range(len(self.lookup_names))
+        ]
+
+    def get_store_tables(self):
+        """Obtain the network tables in the form they are stored in.
+
+        The reactants, products and species names are replaced by their index in
+        the species lookup, so the tables only contain numbers.
+
+        Returns:
+            tuple[np.ndarray, pd.DataFrame, pd.DataFrame]: The species lookup, reactions and species tables.
+        """
+        # We need legacy "S" support to write to h5py
+        species_lookup_table = np.array(
+            [[k, v] for k, v in self.species_lookup.items()], dtype="S"
+        )
+        reactions = self.reaction_table.drop(self.reaction_columns, axis=1)
+        # For all the headers of the reactants/products, replace them with integers.
+        for i, reaction_header in enumerate(self.reaction_columns):
+            reactions[
+                f"{reaction_header[:4].lower()}_index_{reaction_header[-1]}"
+            ] = self.encoded_reactions[:, i]
+        # Identical for the names of the species in the index:
+        species = self.species_table.drop([get_name_column(self.species_table)], axis=1)
+        species["name_index"] = self.encoded_species
+        # Sort the indices, so they move to the front:
+        reactions = reactions[sorted(reactions.columns, key=lambda x: "index" not in x)]
+        species = species[sorted(species.columns, key=lambda x: "index" not in x)]
+        return species_lookup_table, reactions, species
+
+    @functools.cached_property
+    def hash(self) -> str:
+        """A hash of the stored tables, identical networks share their tables in a store."""
+        digest = hashlib.sha1()
+        for table in self.get_store_tables():
+            if isinstance(table, pd.DataFrame):
+                digest.update(repr(list(table.columns)).encode())
+                table = pd.util.hash_pandas_object(table, index=False).to_numpy()
+            digest.update(np.ascontiguousarray(table).tobytes())
+        return digest.hexdigest()[:16]
+
+
+@functools.lru_cache()
+def get_uclchem_network() -> Network:
+    """Load the network of the current UCLCHEM install once per process."""
+    return Network.from_uclchem()
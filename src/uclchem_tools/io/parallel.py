@@ -0,0 +1,117 @@
+"""Process parallel map over the models of a store.
+
+h5py handles cannot be shared between processes, so the loader is sent to the workers
+without its handles and every worker keeps its own read handle open for all its tasks. The
+models are sent in chunks to limit the overhead per model, and only a bounded number of
+chunks is in flight, so the results never pile up faster than the caller consumes them.
+The workers are the reusable loky processes of joblib, which can run lambdas and closures.
+"""
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# The loaders of a worker process, with their handle kept open between tasks.
+_WORKER_LOADERS = {}
+
+
+def get_worker_loader(loader):
+    key = (type(loader).__name__, str(loader.h5path), loader.live)
+    if key not in _WORKER_LOADERS:
+        _WORKER_LOADERS[key] = loader.keep_open()
+    return _WORKER_LOADERS[key]
+
+
+def run_with_worker_loader(func, loader, *args):
+    """Run func(loader, *args) in a worker process with the loader of that process, see iter_parallel.
+
+    Only for worker processes, the handle of the worker loader stays open until the process exits.
+    """
+    return func(get_worker_loader(loader), *args)
+
+
+def _map_chunk(loader, func, keys):
+    loader = get_worker_loader(loader)
+    return [(key, func(loader[key])) for key in keys]
+
+
+def parallel_map(
+    loader,
+    func,
+    keys: list,
+    n_jobs: int = -1,
+    chunksize: int = None,
+    ordered: bool = True,
+    progress: bool = True,
+    max_in_flight: int = None,
+):
+    """Apply func to the models of keys in worker processes, see DataLoaderHDF.map.
+
+    Args:
+        loader (DataLoaderHDF): The store to read
+        func (callable): Called with a model as returned by loader[key]
+        keys (list[str]): The storage_ids of the models
+        n_jobs (int, optional): The number of worker processes, -1 uses all cores, 1 runs in this process. Defaults to -1.
+        chunksize (int, optional): The number of models per task, about four tasks per worker if None. Defaults to None.
+        ordered (bool, optional): Yield in the order of keys, otherwise as the tasks complete. Defaults to True.
+        progress (bool, optional): Show a progress bar. Defaults to True.
+        max_in_flight (int, optional): The maximum number of submitted tasks, twice the workers if None. Defaults to None.
+
+    Yields:
+        tuple[str, object]: The storage_id and the result of func.
+    """
+    from tqdm import tqdm
+
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    with tqdm(total=len(keys), disable=not progress) as progress_bar:
+        if n_jobs == 1:
+            for key in keys:
+                yield key, func(loader[key])
+                progress_bar.update()
+            return
+        if chunksize is None:
+            chunksize = max(1, min(64, len(keys) // (4 * n_jobs)))
+        chunks = [keys[i : i + chunksize] for i in range(0, len(keys), chunksize)]
+        for results in iter_parallel(
+            _map_chunk,
+            [(loader, func, chunk) for chunk in chunks],
+            n_jobs,
+            ordered=ordered,
+            max_in_flight=max_in_flight,
+        ):
+            progress_bar.update(len(results))
+            yield from results
+
+
+def iter_parallel(
+    func, tasks: list, n_jobs: int, ordered: bool = True, max_in_flight: int = None
+):
+    """Run func(*task) for every task in worker processes, with a bounded number of tasks in flight.
+
+    Args:
+        func (callable): The function to run, tasks that read a loader should use get_worker_loader.
+        tasks (list[tuple]): The arguments of every call
+        n_jobs (int): The number of worker processes
+        ordered (bool, optional): Yield in the order of tasks, otherwise as they complete. Defaults to True.
+        max_in_flight (int, optional): The maximum number of submitted tasks, twice the workers if None. Defaults to None.
+
+    Yields:
+        object: The results of func.
+    """
+    from joblib.externals.loky import get_reusable_executor
+
+    max_in_flight = max_in_flight or 2 * n_jobs
+    executor = get_reusable_executor(max_workers=n_jobs)
+    pending = deque()
+    next_task = 0
+    while pending or next_task < len(tasks):
+        while len(pending) < max_in_flight and next_task < len(tasks):
+            pending.append(executor.submit(func, *tasks[next_task]))
+            next_task += 1
+        if ordered:
+            done = [pending.popleft()]
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+        for future in done:
+            yield future.result()
@@ -37,11 +37,14 @@ def key_reactions_to_dict(
     }
 
 
-def _get_rate_of_chance(result_df, reactions, species, species_name, rate_threshold):
-    fortran_reac_indxs = [
-        i + 1 for i, reaction in enumerate(reactions) if species_name in reaction
-    ]
-    reac_indxs = [i for i, reaction in enumerate(reactions) if species_name in reaction]
+def _get_rate_of_chance(
+    result_df, reactions, species, species_name, rate_threshold, reac_indxs=None
+):
+    if reac_indxs is None:
+        reac_indxs = [
+            i for i, reaction in enumerate(reactions) if species_name in reaction
+        ]
+    fortran_reac_indxs = [i + 1 for i in reac_indxs]
     species_index = species.index(species_name) + 1  # fortran index of species
     data = {}
     if len(reac_indxs) <= 500 and species_name not in ["BULK", "SURFACE"]:
@@ -121,35 +124,49 @@ def _get_rate_of_chance(result_df, reactions, species, species_name, rate_thresh
     return data
 
 
-def get_rates_of_change(result_df, species, reactions, rate_threshold=0.99):
+def get_rates_of_change(
+    result_df, species, reactions, rate_threshold=0.99, network=None
+):
     """A function which loops over every time step in an output file and finds the rate of change of a species at that time due to each of the reactions it is involved in.
     From this, the most important reactions are identified and printed to file. This can be used to understand the chemical reason behind a species' behaviour.
 
     Args:
         result_file (str): The path to the file containing the UCLCHEM output
         rate_threshold (float,optional): Analysis output will contain the only the most efficient reactions that are responsible for rate_threshold of the total production and destruction rate. Defaults to 0.99.
+        network (Network, optional): Precomputed network, avoids searching the reactions of every species by name. Defaults to None.
     """
-    if "Name" in species:
+    if network is not None:
+        species = list(network.species_names)
+        reactions = network.reaction_array
+        reac_indxs = {name: list(network.reactions_with(name)) for name in species}
+    elif "Name" in species:
         species = list(species["Name"])
     elif "NAME" in species:
         species = list(species["NAME"])
-    reactions = reactions[
-        [
-            "Reactant 1",
-            "Reactant 2",
-            "Reactant 3",
-            "Product 1",
-            "Product 2",
-            "Product 3",
-            "Product 4",
-        ]
-    ].to_numpy()
+    if network is None:
+        reactions = reactions[
+            [
+                "Reactant 1",
+                "Reactant 2",
+                "Reactant 3",
+                "Product 1",
+                "Product 2",
+                "Product 3",
+                "Product 4",
+            ]
+        ].to_numpy()
+        reac_indxs = {name: None for name in species}
     # all_analyses = {}
     print(f"Found {len(species)} species, brace yourselves.")
     # Get all the reaction rates with parallel worker:
     rates = Parallel(n_jobs=100)(
         delayed(_get_rate_of_chance)(
-            result_df, reactions, species, species_name, rate_threshold
+            result_df,
+            reactions,
+            species,
+            species_name,
+            rate_threshold,
+            reac_indxs[species_name],
         )
         for species_name in species
     )
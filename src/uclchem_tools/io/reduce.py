@@ -0,0 +1,254 @@
+"""Out-of-core statistics of all species across the models of a grid.
+
+The models are streamed one at a time (or in chunks of the dense tensor), resampled onto a
+common log time grid and added to mergeable statistics: the count, sums and moments of the
+log-abundances, the minimum and maximum and a histogram sketch of the log-abundances. The
+quantiles are read from the histograms, so their accuracy is set by the bin width. Only the
+statistics, of size times x columns x bins, are ever in memory, and statistics of disjoint
+sets of models can be merged, which is how the parallel reduction works.
+"""
+import numpy as np
+import pandas as pd
+
+from .parallel import iter_parallel, run_with_worker_loader
+from .resample import ABUNDANCE_FLOOR, get_default_time_range, get_time_grid, resample
+
+
+class GridStatistics:
+    """Mergeable statistics of log10 values on a (times x columns) grid."""
+
+    def __init__(
+        self, time_grid, columns, log_range: tuple = (-30.0, 10.0), bin_width: float = 0.1
+    ):
+        """
+        Args:
+            time_grid (np.ndarray): The common time grid
+            columns (list[str]): The columns (species) of the statistics
+            log_range (tuple[float, float], optional): The range of the histograms in log10, wide enough
+                for the abundances and the physical columns, values outside fall in the first or last
+                bin. Defaults to (-30.0, 10.0).
+            bin_width (float, optional): The width of the histogram bins in dex. Defaults to 0.1.
+        """
+        self.time_grid = np.asarray(time_grid)
+        self.columns = list(columns)
+        self.log_range = log_range
+        self.bin_width = bin_width
+        self.n_bins = int(np.ceil((log_range[1] - log_range[0]) / bin_width))
+        shape = (len(self.time_grid), len(self.columns))
+        self.n_models = 0
+        self.count = np.zeros(shape, dtype="int64")
+        self.sum = np.zeros(shape)
+        self.sum_log = np.zeros(shape)
+        self.sum_log2 = np.zeros(shape)
+        self.min_log = np.full(shape, np.inf)
+        self.max_log = np.full(shape, -np.inf)
+        self.histogram = np.zeros(shape + (self.n_bins,), dtype="int32")
+
+    def update(self, values: np.ndarray):
+        """Add models to the statistics.
+
+        Args:
+            values (np.ndarray): Positive values with shape (times, columns) or (models, times, columns), NaN is skipped.
+        """
+        values = np.asarray(values, dtype="float64").reshape(
+            (-1,) + self.count.shape
+        )
+        valid = ~np.isnan(values)
+        values = np.where(valid, values, 0.0)
+        log_values = np.log10(np.maximum(values, ABUNDANCE_FLOOR))
+        self.n_models += values.shape[0]
+        self.count += valid.sum(axis=0)
+        self.sum += values.sum(axis=0)
+        self.sum_log += np.where(valid, log_values, 0).sum(axis=0)
+        self.sum_log2 += np.where(valid, log_values**2, 0).sum(axis=0)
+        self.min_log = np.minimum(self.min_log, np.where(valid, log_values, np.inf).min(axis=0))
+        self.max_log = np.maximum(self.max_log, np.where(valid, log_values, -np.inf).max(axis=0))
+        bins = np.clip(
+            np.floor((log_values - self.log_range[0]) / self.bin_width).astype("int64"),
+            0,
+            self.n_bins - 1,
+        )
+        cells = np.broadcast_to(
+            np.arange(self.count.size).reshape(self.count.shape), values.shape
+        )
+        flat = (cells * self.n_bins + bins)[valid]
+        if len(flat) > self.histogram.size // 4:
+            self.histogram += np.bincount(flat, minlength=self.histogram.size).reshape(
+                self.histogram.shape
+            )
+        else:
+            np.add.at(self.histogram.reshape(-1), flat, 1)
+
+    def merge(self, other: "GridStatistics") -> "GridStatistics":
+        """Add the statistics of another, disjoint, set of models with the same grid."""
+        if self.columns != other.columns or not np.array_equal(
+            self.time_grid, other.time_grid
+        ):
+            raise RuntimeError("Cannot merge statistics of different grids.")
+        self.n_models += other.n_models
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_log += other.sum_log
+        self.sum_log2 += other.sum_log2
+        self.min_log = np.minimum(self.min_log, other.min_log)
+        self.max_log = np.maximum(self.max_log, other.max_log)
+        self.histogram += other.histogram
+        return self
+
+    def mean(self, log: bool = False) -> np.ndarray:
+        """The mean, or the mean of the log10 values, NaN where no model covers the time."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (self.sum_log if log else self.sum) / self.count
+
+    def std_log(self) -> np.ndarray:
+        """The standard deviation of the log10 values in dex."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = self.sum_log2 / self.count - self.mean(log=True) ** 2
+        return np.sqrt(np.maximum(variance, 0))
+
+    def minimum(self) -> np.ndarray:
+        """The smallest value, floored at ABUNDANCE_FLOOR."""
+        return np.where(self.count > 0, 10**self.min_log, np.nan)
+
+    def maximum(self) -> np.ndarray:
+        """The largest value, floored at ABUNDANCE_FLOOR."""
+        return np.where(self.count > 0, 10**self.max_log, np.nan)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Estimate a quantile from the histograms, interpolating within the bins.
+
+        Args:
+            q (float): The quantile, e.g. 0.5 for the median
+
+        Returns:
+            np.ndarray: The quantile with shape (times, columns), NaN where no model covers the time.
+        """
+        cumulative = np.cumsum(self.histogram, axis=-1)
+        target = q * self.count
+        index = np.minimum((cumulative < target[..., None]).sum(axis=-1), self.n_bins - 1)
+        before = np.take_along_axis(cumulative, index[..., None], -1)[..., 0] - np.take_along_axis(
+            self.histogram, index[..., None], -1
+        )[..., 0]
+        in_bin = np.take_along_axis(self.histogram, index[..., None], -1)[..., 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.clip(np.nan_to_num((target - before) / in_bin), 0, 1)
+        log_quantile = self.log_range[0] + (index + fraction) * self.bin_width
+        log_quantile = np.clip(log_quantile, self.min_log, self.max_log)
+        return np.where(self.count > 0, 10**log_quantile, np.nan)
+
+    def envelope(self, column: str, quantiles=(0.16, 0.5, 0.84)) -> pd.DataFrame:
+        """The statistics of a single column against time, e.g. to plot a median with an envelope."""
+        i = self.columns.index(column)
+        return pd.DataFrame(
+            {
+                "count": self.count[:, i],
+                "min": self.minimum()[:, i],
+                **{f"q{q:g}": self.quantile(q)[:, i] for q in quantiles},
+                "max": self.maximum()[:, i],
+                "mean": self.mean()[:, i],
+                "mean_log": self.mean(log=True)[:, i],
+                "std_log": self.std_log()[:, i],
+            },
+            index=pd.Index(self.time_grid, name="Time"),
+        )
+
+
+def _reduce_models(loader, storage_ids, time_grid, columns, kwargs) -> GridStatistics:
+    """Reduce some models, one at a time."""
+    statistics = GridStatistics(time_grid, columns, **kwargs)
+    for storage_id in storage_ids:
+        # Aligned across networks, species that are not in the network of a model are NaN.
+        abundances = loader.read_abundances(storage_id, ["Time"] + columns)
+        statistics.update(
+            resample(
+                abundances["Time"].to_numpy(), abundances[columns].to_numpy(), time_grid
+            )
+        )
+    return statistics
+
+
+def _reduce_dense(loader, start, stop, columns, kwargs) -> GridStatistics:
+    """Reduce a block of models of the dense tensor."""
+    with loader.get_h5_filehandle() as fh:
+        group = fh["dense"]
+        header = [column.decode("UTF-8") for column in group["abundances_header"][:]]
+        statistics = GridStatistics(group["time"][:], columns, **kwargs)
+        block = group["abundances"][start:stop]
+    statistics.update(block[:, :, [header.index(column) for column in columns]])
+    return statistics
+
+
+def reduce_grid(
+    loader,
+    columns: list = None,
+    n_jobs: int = 1,
+    time_range: tuple = None,
+    n_times: int = 64,
+    use_dense: bool = True,
+    chunksize: int = 64,
+    progress: bool = True,
+    **kwargs,
+) -> GridStatistics:
+    """Compute statistics of every column over all models of a store without loading the grid.
+
+    Args:
+        loader (DataLoaderHDF): The store to reduce
+        columns (list[str], optional): The columns (species), all columns of the store except Time if None. Defaults to None.
+        n_jobs (int, optional): The number of worker processes, 1 reduces in this process. Defaults to 1.
+        time_range (tuple[float, float], optional): The range of the time grid, see get_default_time_range. Defaults to None.
+        n_times (int, optional): The number of points of the log time grid. Defaults to 64.
+        use_dense (bool, optional): Stream the dense tensor on its own time grid if the store has one and
+            no time_range is given. Defaults to True.
+        chunksize (int, optional): The number of models per task. Defaults to 64.
+        progress (bool, optional): Show a progress bar. Defaults to True.
+        kwargs: Passed to GridStatistics, e.g. bin_width.
+
+    Returns:
+        GridStatistics: The merged statistics.
+    """
+    from tqdm import tqdm
+
+    with loader.get_h5_filehandle() as fh:
+        use_dense = use_dense and time_range is None and "dense" in fh
+        if use_dense:
+            n_models = fh["dense/abundances"].shape[0]
+            header = [c.decode("UTF-8") for c in fh["dense/abundances_header"][:]]
+        else:
+            header = loader.columns
+    columns = [column for column in header if column != "Time"] if columns is None else columns
+    if use_dense:
+        tasks = [
+            (loader, start, min(start + chunksize, n_models), columns, kwargs)
+            for start in range(0, n_models, chunksize)
+        ]
+        task_func, n_total = _reduce_dense, n_models
+    else:
+        if time_range is None:
+            time_range = get_default_time_range(loader.models_df)
+        time_grid = get_time_grid(*time_range, n_times)
+        chunks = [
+            loader.datasets[i : i + chunksize]
+            for i in range(0, len(loader.datasets), chunksize)
+        ]
+        tasks = [(loader, chunk, time_grid, columns, kwargs) for chunk in chunks]
+        task_func, n_total = _reduce_models, len(loader.datasets)
+    # In this process one handle is kept open for the reduction and closed afterwards, unless the
+    # caller keeps one open already. Worker processes keep their own handle (see parallel).
+    close = n_jobs == 1 and not loader.is_kept_open
+    if n_jobs == 1:
+        loader.keep_open()
+        results = (task_func(*task) for task in tasks)
+    else:
+        results = iter_parallel(
+            run_with_worker_loader, [(task_func,) + task for task in tasks], n_jobs, ordered=False
+        )
+    statistics = None
+    try:
+        with tqdm(total=n_total, disable=not progress) as progress_bar:
+            for partial in results:
+                statistics = partial if statistics is None else statistics.merge(partial)
+                progress_bar.update(partial.n_models)
+    finally:
+        if close:
+            loader.close()
+    return statistics
@@ -0,0 +1,152 @@
+"""Resampling of model outputs onto a common logarithmic time grid.
+
+UCLCHEM chooses its own timesteps, so no two models share their output times. Comparing,
+stacking or interpolating models needs them on one time grid; abundances and time both span
+many orders of magnitude, so the resampling is linear in log-abundance and log-time.
+"""
+import numpy as np
+import pandas as pd
+
+# Abundances are clipped to this value before taking the logarithm.
+ABUNDANCE_FLOOR = 1.0e-30
+
+
+def get_time_grid(t_min: float, t_max: float, n_times: int = 64) -> np.ndarray:
+    """A logarithmic time grid, the first output of UCLCHEM is at t=0 so t_min must be positive."""
+    if t_min <= 0:
+        raise ValueError("The time grid is logarithmic, t_min has to be positive.")
+    return np.logspace(np.log10(t_min), np.log10(t_max), n_times)
+
+
+def get_default_time_range(model_df) -> tuple:
+    """From 1 year to the latest finalTime of a grid, the time range of the dense tensor and reductions."""
+    if "finalTime" not in model_df:
+        raise RuntimeError(
+            "Cannot obtain the time range of the grid without finalTime, pass a time range."
+        )
+    return 1.0, float(model_df["finalTime"].max())
+
+
+def get_common_time_range(times_list) -> tuple:
+    """The largest positive time range covered by all models.
+
+    Args:
+        times_list (list[np.ndarray]): The output times of every model
+
+    Returns:
+        tuple[float, float]: The earliest and latest time of the range.
+    """
+    t_min = max(times[times > 0].min() for times in times_list)
+    t_max = min(times.max() for times in times_list)
+    if t_min >= t_max:
+        raise RuntimeError("The models do not share a common time range, stopping.")
+    return t_min, t_max
+
+
+def interpolation_weights(x: np.ndarray, x_new: np.ndarray) -> tuple:
+    """Indices and weights for linear interpolation of sorted x onto x_new.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The left index, the weight of the right
+            neighbour and a mask of the points inside the range of x.
+    """
+    inside = (x_new >= x[0]) & (x_new <= x[-1])
+    left = np.clip(np.searchsorted(x, x_new, side="right") - 1, 0, len(x) - 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = (x_new - x[left]) / (x[left + 1] - x[left])
+    return left, np.nan_to_num(weight), inside
+
+
+def get_increasing_times(times: np.ndarray) -> np.ndarray:
+    """Mask of the outputs with a positive time later than all earlier outputs.
+
+    The output at t=0, repeated times and restarts of the clock (e.g. concatenated phases)
+    would make the time axis non-monotonic, these outputs are skipped.
+    """
+    keep = times > 0
+    keep[1:] &= times[1:] > np.maximum.accumulate(times)[:-1]
+    return keep
+
+
+def get_time_index(times: np.ndarray) -> pd.DataFrame:
+    """The sorted time index of a model: the time and row of every output kept by get_increasing_times."""
+    keep = get_increasing_times(times)
+    return pd.DataFrame(
+        {
+            "Time": times[keep].astype("float64"),
+            "row": np.flatnonzero(keep).astype("float64"),
+        }
+    )
+
+
+def interpolate_between(
+    time: float, t_0: float, t_1: float, values_0: np.ndarray, values_1: np.ndarray
+) -> np.ndarray:
+    """Interpolate between two outputs linear in log-time, in log-value where both are positive like resample."""
+    if t_1 == t_0:
+        return np.asarray(values_0, dtype="float64")
+    weight = (np.log10(time) - np.log10(t_0)) / (np.log10(t_1) - np.log10(t_0))
+    values_0 = np.asarray(values_0, dtype="float64")
+    values_1 = np.asarray(values_1, dtype="float64")
+    positive = (values_0 > 0) & (values_1 > 0)
+    interpolated = (1 - weight) * values_0 + weight * values_1
+    interpolated[positive] = 10 ** (
+        (1 - weight) * np.log10(values_0[positive])
+        + weight * np.log10(values_1[positive])
+    )
+    return interpolated
+
+
+def resample_log(
+    times: np.ndarray, values: np.ndarray, time_grid: np.ndarray
+) -> np.ndarray:
+    """Resample the outputs of a model linearly in log-value and log-time.
+
+    Args:
+        times (np.ndarray): The output times of the model, see get_increasing_times for the outputs that are used.
+        values (np.ndarray): The outputs, one row per time and a column per quantity.
+        time_grid (np.ndarray): The times to resample onto
+
+    Returns:
+        np.ndarray: log10 of the values on the time grid, NaN outside the time range of the model.
+    """
+    keep = get_increasing_times(times)
+    log_times = np.log10(times[keep])
+    log_values = np.log10(np.maximum(values[keep], ABUNDANCE_FLOOR))
+    if len(log_times) < 2:
+        return np.full((len(time_grid), values.shape[1]), np.nan)
+    left, weight, inside = interpolation_weights(log_times, np.log10(time_grid))
+    resampled = (1 - weight[:, None]) * log_values[left] + weight[
+        :, None
+    ] * log_values[left + 1]
+    resampled[~inside] = np.nan
+    return resampled
+
+
+def resample(times: np.ndarray, values: np.ndarray, time_grid: np.ndarray) -> np.ndarray:
+    """Resample the outputs of a model onto a time grid, linear in log-time.
+
+    Columns that are strictly positive, like the abundances, density and temperature, are
+    resampled in log-value, other columns (e.g. a visual extinction starting at zero) linearly.
+
+    Returns:
+        np.ndarray: The values on the time grid, NaN outside the time range of the model.
+    """
+    keep = get_increasing_times(times)
+    if keep.sum() < 2:
+        return np.full((len(time_grid), values.shape[1]), np.nan)
+    log_columns = (values[keep] > 0).all(axis=0)
+    resampled = np.empty((len(time_grid), values.shape[1]))
+    resampled[:, log_columns] = 10 ** resample_log(
+        times, values[:, log_columns], time_grid
+    )
+    if not log_columns.all():
+        left, weight, inside = interpolation_weights(
+            np.log10(times[keep]), np.log10(time_grid)
+        )
+        linear = values[keep][:, ~log_columns]
+        resampled[:, ~log_columns] = (1 - weight[:, None]) * linear[left] + weight[
+            :, None
+        ] * linear[left + 1]
+        resampled[~inside] = np.nan
+    return resampled
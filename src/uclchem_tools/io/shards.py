@@ -0,0 +1,147 @@
+"""Sharded conversion of a grid: every worker writes its own store, a master store presents them as one.
+
+The master store contains the full model_df and, for every model, virtual datasets that map
+onto the datasets in the shards, deeper groups such as the rates and the network tables are
+external links. No abundances are copied, so finalizing is fast for any grid size and the
+master can be opened with DataLoaderHDF like any other store. The shards have to stay next to
+the master, the links are relative.
+"""
+import logging
+import pathlib
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from .model_table import read_model_df, write_model_table
+from .nearest import NearestIndex
+from .network import NETWORK_GROUP
+from .summary import SUMMARY_GROUP, SUMMARY_STATS
+from .writer import DENSE_GROUP
+
+# The network tables of stores written before networks/<hash>.
+NETWORK_KEYS = [
+    "index_species_lookup",
+    "reactions",
+    "reactions_header",
+    "species",
+    "species_header",
+]
+
+
+def get_shard_path(hdf_path, shard_index: int, num_shards: int) -> pathlib.Path:
+    """The path of a shard, e.g. grid.shard0003-of-0016.h5 for grid.h5"""
+    hdf_path = pathlib.Path(hdf_path)
+    return hdf_path.with_name(
+        f"{hdf_path.stem}.shard{shard_index:04d}-of-{num_shards:04d}{hdf_path.suffix}"
+    )
+
+
+def _link_model(master_group, shard_group, shard_name):
+    """Recreate the datasets of a model as virtual datasets, subgroups become external links."""
+    # e.g. the network of the model
+    master_group.attrs.update(shard_group.attrs)
+    for name, item in shard_group.items():
+        if isinstance(item, h5py.Dataset):
+            layout = h5py.VirtualLayout(shape=item.shape, dtype=item.dtype)
+            layout[...] = h5py.VirtualSource(shard_name, item.name, shape=item.shape)
+            master_group.create_virtual_dataset(name, layout)
+            # e.g. the encoding of the abundances
+            master_group[name].attrs.update(item.attrs)
+        else:
+            master_group[name] = h5py.ExternalLink(shard_name, item.name)
+
+
+def _link_stacked(fh, shard_paths, group_name: str, stacked: list, shared: list):
+    """Stack the per-model arrays of a group of the shards (e.g. the dense tensor) into virtual arrays.
+
+    Args:
+        fh (h5py.File): The master store
+        shard_paths (list[Path]): The shards, in the order of their models
+        group_name (str): The group, skipped unless every shard has it
+        stacked (list[str]): The arrays with a row per model, stacked along the first axis
+        shared (list[str]): The arrays that must be identical in all shards, e.g. the header
+    """
+    shards = []
+    for shard_path in shard_paths:
+        with h5py.File(shard_path, "r") as shard_fh:
+            if f"{group_name}/{shared[0]}" not in shard_fh:
+                return
+            group = shard_fh[group_name]
+            shards.append(
+                (
+                    shard_path.name,
+                    {key: (group[key].shape, group[key].dtype) for key in stacked},
+                    {key: group[key][:] for key in shared},
+                    group["storage_id"][:],
+                )
+            )
+    _, layouts, reference, _ = shards[0]
+    if any(
+        shard[1][key][0][1:] != layouts[key][0][1:] for shard in shards for key in stacked
+    ) or any(
+        len(shard[2][key]) != len(reference[key]) or (shard[2][key] != reference[key]).any()
+        for shard in shards
+        for key in shared
+    ):
+        logging.warning(f"The {group_name} arrays of the shards differ, not linking them.")
+        return
+    group = fh.create_group(group_name)
+    for key in stacked:
+        shape, dtype = layouts[key]
+        n_models = sum(shard[1][key][0][0] for shard in shards)
+        layout = h5py.VirtualLayout(shape=(n_models,) + shape[1:], dtype=dtype)
+        start = 0
+        for shard_name, shard_layouts, _, _ in shards:
+            shard_shape = shard_layouts[key][0]
+            layout[start : start + shard_shape[0]] = h5py.VirtualSource(
+                shard_name, f"/{group_name}/{key}", shape=shard_shape
+            )
+            start += shard_shape[0]
+        group.create_virtual_dataset(key, layout, fillvalue=np.nan)
+    for key in shared:
+        group.create_dataset(key, data=reference[key])
+    group.create_dataset("storage_id", data=np.concatenate([shard[3] for shard in shards]))
+
+
+def finalize_shards(hdf_path, num_shards: int):
+    """Build the master store of a sharded conversion.
+
+    Args:
+        hdf_path (Path): The path of the master store, the shards are found next to it (see get_shard_path).
+        num_shards (int): The number of shards the grid was converted in.
+    """
+    hdf_path = pathlib.Path(hdf_path)
+    if hdf_path.exists():
+        raise RuntimeError("The store already exists, stoppping")
+    shard_paths = [get_shard_path(hdf_path, i, num_shards) for i in range(num_shards)]
+    missing = [str(path) for path in shard_paths if not path.exists()]
+    if missing:
+        raise RuntimeError(f"Cannot finalize, the shards {missing} do not exist.")
+    model_df = pd.concat(
+        [read_model_df(shard_path) for shard_path in shard_paths]
+    )
+    if model_df["storage_id"].duplicated().any():
+        raise RuntimeError("Found duplicate storage_ids across the shards, stopping.")
+    with h5py.File(hdf_path, "a") as fh:
+        write_model_table(fh, model_df)
+        NearestIndex.from_model_df(model_df).to_group(fh)
+        for shard_path in shard_paths:
+            # Relative to the master, which is where HDF5 looks for the sources and link targets.
+            shard_name = shard_path.name
+            storage_ids = read_model_df(shard_path)["storage_id"]
+            with h5py.File(shard_path, "r") as shard_fh:
+                for key in NETWORK_KEYS:
+                    if key in shard_fh and key not in fh:
+                        fh[key] = h5py.ExternalLink(shard_name, f"/{key}")
+                for network in shard_fh.get(NETWORK_GROUP, []):
+                    key = f"{NETWORK_GROUP}/{network}"
+                    if key not in fh:
+                        fh.require_group(NETWORK_GROUP)[network] = h5py.ExternalLink(
+                            shard_name, f"/{key}"
+                        )
+                for storage_id in storage_ids:
+                    _link_model(fh.create_group(storage_id), shard_fh[storage_id], shard_name)
+        _link_stacked(fh, shard_paths, DENSE_GROUP, ["abundances"], ["abundances_header", "time"])
+        _link_stacked(fh, shard_paths, SUMMARY_GROUP, list(SUMMARY_STATS), ["header"])
+    logging.info(f"Linked {len(model_df)} models from {num_shards} shards into {hdf_path}")
@@ -0,0 +1,39 @@
+"""Per-model summary statistics of every column, computed while a grid is converted.
+
+Screening a grid ("which models end with CH3OH > 1e-8", "the peak CO abundance of every
+model") only needs a handful of numbers per model and species. The writer computes them
+from the full output of every model it writes and stores one (models x columns) array per
+statistic in the `summary` group of the store, which is a few KB to MB for a whole grid.
+"""
+import numpy as np
+
+from .resample import ABUNDANCE_FLOOR
+
+SUMMARY_GROUP = "summary"
+# final: the last output, peak: the maximum, peak_time: the time of the maximum,
+# minimum: the minimum after t=0, log_mean: the mean log10 of the outputs after t=0.
+SUMMARY_STATS = ("final", "peak", "peak_time", "minimum", "log_mean")
+
+
+def summarize(times: np.ndarray, values: np.ndarray) -> dict:
+    """Compute the summary statistics of the outputs of a model.
+
+    The first output of UCLCHEM holds the initial abundances at t=0, where most species are
+    zero, so the minimum and the log-mean only use the later outputs.
+
+    Args:
+        times (np.ndarray): The output times of the model
+        values (np.ndarray): The outputs, one row per time and a column per quantity.
+
+    Returns:
+        dict[str, np.ndarray]: One value per column for every statistic of SUMMARY_STATS.
+    """
+    evolved = values[times > 0] if (times > 0).any() else values
+    peak_rows = values.argmax(axis=0)
+    return {
+        "final": values[-1],
+        "peak": values[peak_rows, np.arange(values.shape[1])],
+        "peak_time": times[peak_rows],
+        "minimum": evolved.min(axis=0),
+        "log_mean": np.log10(np.maximum(evolved, ABUNDANCE_FLOOR)).mean(axis=0),
+    }
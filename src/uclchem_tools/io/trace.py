@@ -0,0 +1,67 @@
+"""Recording which parts of the abundances a loader reads, to choose the chunking of a store.
+
+With `DataLoaderHDF(path, trace=True)` every read of the abundances of a model is recorded as
+the model, the range of rows and the columns (positions in the header of the model) that
+were read. uclchem_tools.io.inspector.advise_chunks turns a trace into the chunk shape with
+the least read amplification for that access pattern. Only the reads of the loader itself are
+recorded, not those of worker processes (map, reduce with n_jobs > 1).
+"""
+import numpy as np
+import pandas as pd
+
+TRACE_COLUMNS = ("storage_id", "start", "stop", "n_rows", "n_columns", "columns")
+
+
+def parse_columns(columns: str, n_columns: int) -> np.ndarray:
+    """The positions of the columns of a recorded read."""
+    if columns == "":
+        return np.arange(n_columns)
+    return np.array(columns.split(), dtype="int64")
+
+
+class AccessTrace:
+    """The reads of the abundances of the models, see DataLoaderHDF(trace=True)."""
+
+    def __init__(self, records: list = None):
+        """
+        Args:
+            records (list[tuple], optional): The reads as tuples of TRACE_COLUMNS, where columns is
+                a space separated string of the positions or "" for all columns. Defaults to None.
+        """
+        # Appending to a list is atomic, so the reader thread of iter_batches can record too.
+        self.records = [] if records is None else list(records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def record(self, storage_id: str, rows, n_rows: int, n_columns: int, columns=None):
+        """Record a read.
+
+        Args:
+            storage_id (str): The model
+            rows (slice or int): The rows that were read, as passed to encoding.read_rows
+            n_rows (int): The number of rows of the model
+            n_columns (int): The number of columns of the model
+            columns (list[int], optional): The positions of the columns that were read, all if None. Defaults to None.
+        """
+        if isinstance(rows, slice):
+            start, stop, _ = rows.indices(n_rows)
+        else:
+            start, stop = int(rows), int(rows) + 1
+        columns = "" if columns is None else " ".join(str(column) for column in columns)
+        self.records.append((storage_id, start, stop, n_rows, n_columns, columns))
+
+    def clear(self):
+        self.records = []
+
+    def to_df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.records, columns=list(TRACE_COLUMNS))
+
+    def save(self, path):
+        """Save the trace as csv, e.g. to advise the chunking of a store later."""
+        self.to_df().to_csv(path, index=False)
+
+    @classmethod
+    def load(cls, path):
+        df = pd.read_csv(path, keep_default_na=False, dtype={"storage_id": str, "columns": str})
+        return cls(df[list(TRACE_COLUMNS)].itertuples(index=False, name=None))
@@ -0,0 +1,439 @@
+"""A write session that keeps a single handle to a store open for a whole conversion."""
+import logging
+import pathlib
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from .encoding import ENCODINGS, LOG16_RANGE, encode_frame
+from .io import df_to_h5py
+from .model_table import write_model_table
+from .nearest import NearestIndex
+from .network import NETWORK_GROUP, Network
+from .resample import get_time_index, resample
+from .summary import SUMMARY_GROUP, SUMMARY_STATS, summarize
+
+# The group of the dense (models x times x columns) tensor, see StoreWriter.enable_dense.
+DENSE_GROUP = "dense"
+
+
+def _same_columns(header, columns) -> bool:
+    return len(header) == len(columns) and bool((header == columns).all())
+
+
+class StoreWriter:
+    """Writes abundances, derivatives, rates and the network of many models through one h5py handle.
+
+    Opening a HDF5 file flushes its metadata, so opening it once per model (and once per
+    species for the rates) dominates the conversion of large grids. The writer opens the
+    store once and only flushes every `flush_every` models and when it is closed.
+
+    The layout differs from the stores written before the writer: the network tables are under
+    `networks/<hash>` instead of the root, the rates are h5py datasets instead of PyTables frames
+    and the model dataframe is stored as typed columns (see uclchem_tools.io.model_table).
+    DataLoaderHDF reads both layouts, but new models should not be appended to an old store.
+
+    Example:
+        with StoreWriter("grid.h5") as writer:
+            for datakey, df in outputs.items():
+                full_output_df_to_hdf(df, "grid.h5", datakey, assume_identical_networks=True, writer=writer)
+    """
+
+    # The number of models per chunk of the summary arrays.
+    summary_chunk_rows = 256
+
+    def __init__(
+        self,
+        hdf_path,
+        flush_every: int = 100,
+        encoding: str = "float32",
+        log_range: tuple = LOG16_RANGE,
+    ):
+        """Open the store in append mode.
+
+        Args:
+            hdf_path (Path): The store to write to
+            flush_every (int, optional): Flush to disk after this many models. Defaults to 100.
+            encoding (str, optional): The encoding of the abundances, "float32" or "log16", see
+                uclchem_tools.io.encoding. Defaults to "float32".
+            log_range (tuple[float, float], optional): The range of the log16 codes in log10. Defaults to LOG16_RANGE.
+        """
+        if encoding not in ENCODINGS:
+            raise NotImplementedError(f"The encoding {encoding} is not implemented.")
+        self.hdf_path = hdf_path
+        self.flush_every = flush_every
+        self.encoding = encoding
+        self.log_range = tuple(log_range)
+        self.fh = self._open(hdf_path)
+        self.abundances_header = None
+        # The columns of the models of every network written so far, by network hash.
+        self._network_headers = {}
+        # The network hash of every model linked by write_network.
+        self._model_networks = {}
+        self.dense_time_grid = None
+        self._dense_rows = None
+        self._summary_rows = None
+        self._unflushed = 0
+
+    def _open(self, hdf_path):
+        fh = h5py.File(hdf_path, "a")
+        if "index_species_lookup" in fh and NETWORK_GROUP not in fh:
+            logging.warning(
+                f"{hdf_path} was written by an earlier version with the network tables at the root, "
+                "convert the models into a new store instead of appending to it."
+            )
+        return fh
+
+    def _write_df(self, key: str, df: pd.DataFrame):
+        df_to_h5py(self.fh, key, df)
+
+    def _create_array(self, group, key: str, data):
+        group.create_dataset(key, data=data)
+
+    def _write_encoded(self, key: str, df: pd.DataFrame):
+        mask, codes, offsets, raw, layout = encode_frame(df, self.log_range)
+        self._create_array(self.fh, key, mask)
+        self._create_array(self.fh, f"{key}_codes", codes)
+        self._create_array(self.fh, f"{key}_offsets", offsets)
+        self._create_array(self.fh, f"{key}_raw", raw)
+        self._create_array(self.fh, f"{key}_header", np.array(df.columns.values, dtype="S"))
+        self.fh[key].attrs.update(
+            {"encoding": "log16", "log_range": list(self.log_range), "layout": layout.tolist()}
+        )
+
+    def _create_nan_array(self, group, key: str, shape, chunks):
+        group.create_dataset(
+            key, shape=shape, chunks=chunks, dtype="float32", fillvalue=np.nan
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+
+    def flush(self):
+        self.fh.flush()
+        self._unflushed = 0
+
+    def enable_dense(self, storage_ids, time_grid, columns=None):
+        """Also resample every model onto a common time grid into one dense tensor.
+
+        The tensor `dense/abundances` has shape (models, times, columns) with the models in
+        the order of storage_ids, models that are not written are NaN. See resample.resample
+        for how the outputs are resampled.
+
+        Args:
+            storage_ids (list[str]): The storage_ids of all models of the grid
+            time_grid (np.ndarray): The common time grid, see resample.get_time_grid
+            columns (list[str], optional): The columns of the full output, if None the tensor is
+                created when the first model is written. Defaults to None.
+        """
+        self.dense_time_grid = np.asarray(time_grid)
+        self._dense_rows = {storage_id: i for i, storage_id in enumerate(storage_ids)}
+        if columns is not None:
+            self._create_dense(list(columns))
+
+    def _create_dense(self, columns):
+        shape = (len(self._dense_rows), len(self.dense_time_grid), len(columns))
+        group = self.fh.require_group(DENSE_GROUP)
+        # One chunk per model, so writing a model never rewrites the chunks of other models.
+        self._create_nan_array(group, "abundances", shape, (1,) + shape[1:])
+        self._create_array(group, "abundances_header", np.array(columns, dtype="S"))
+        self._create_array(group, "time", self.dense_time_grid)
+        self._create_array(
+            group, "storage_id", np.array(list(self._dense_rows), dtype="S")
+        )
+
+    def _write_dense(self, datakey: str, df: pd.DataFrame):
+        if f"{DENSE_GROUP}/abundances" not in self.fh:
+            self._create_dense(list(df.columns))
+        self.fh[f"{DENSE_GROUP}/abundances"][self._dense_rows[datakey]] = resample(
+            df["Time"].to_numpy(), df.to_numpy(), self.dense_time_grid
+        )
+
+    def enable_summary(self, storage_ids, columns=None):
+        """Also write the summary statistics of every model, see uclchem_tools.io.summary.
+
+        Every statistic is a (models x columns) array `summary/<stat>` with the models in
+        the order of storage_ids and all columns except Time, models that are not written are NaN.
+
+        Args:
+            storage_ids (list[str]): The storage_ids of all models of the grid
+            columns (list[str], optional): The columns of the full output, if None the arrays are
+                created when the first model is written. Defaults to None.
+        """
+        self._summary_rows = {storage_id: i for i, storage_id in enumerate(storage_ids)}
+        if columns is not None:
+            self._create_summary([column for column in columns if column != "Time"])
+
+    def _create_summary(self, columns):
+        shape = (len(self._summary_rows), len(columns))
+        chunks = (min(self.summary_chunk_rows, shape[0]), shape[1])
+        group = self.fh.require_group(SUMMARY_GROUP)
+        for stat in SUMMARY_STATS:
+            self._create_nan_array(group, stat, shape, chunks)
+        self._create_array(group, "header", np.array(columns, dtype="S"))
+        self._create_array(
+            group, "storage_id", np.array(list(self._summary_rows), dtype="S")
+        )
+
+    def _write_summary(self, datakey: str, df: pd.DataFrame):
+        columns = [column for column in df.columns if column != "Time"]
+        if f"{SUMMARY_GROUP}/header" not in self.fh:
+            self._create_summary(columns)
+        row = self._summary_rows[datakey]
+        for stat, values in summarize(
+            df["Time"].to_numpy(), df[columns].to_numpy()
+        ).items():
+            self.fh[f"{SUMMARY_GROUP}/{stat}"][row] = values
+
+    def write_network(self, network: Network, datakey: str = None):
+        """Write the tables of a network once under `networks/<hash>` and link a model to it.
+
+        Call it before write_abundances, the model datakey gets the attribute `network` with the
+        hash, and the models of one network must all have the same columns. Models are linked
+        by their datakey, so writes of different models (and networks) can be interleaved.
+
+        Args:
+            network (Network): The network of the model
+            datakey (str, optional): The model that was run with the network. Defaults to None.
+        """
+        group = f"{NETWORK_GROUP}/{network.hash}"
+        if f"{group}/index_species_lookup" not in self.fh:
+            species_lookup_table, reactions, species = network.get_store_tables()
+            self._write_df(f"{group}/reactions", reactions)
+            self._write_df(f"{group}/species", species)
+            # Written last, it marks the tables as complete.
+            self._create_array(self.fh, f"{group}/index_species_lookup", species_lookup_table)
+        if datakey is not None:
+            self._model_networks[datakey] = network.hash
+            self.fh.require_group(datakey).attrs["network"] = network.hash
+
+    def write_model_df(self, model_df: pd.DataFrame):
+        """Write the model dataframe as typed columns and its nearest neighbour index.
+
+        See uclchem_tools.io.model_table and uclchem_tools.io.nearest.
+        """
+        write_model_table(self.fh, model_df)
+        NearestIndex.from_model_df(model_df).to_group(self.fh)
+
+    def _get_model_network(self, datakey: str) -> str:
+        """The network hash linked to a model by write_network, None if it has none."""
+        if datakey not in self._model_networks and datakey in self.fh:
+            # Linked before this session, e.g. the models of a SWMR store.
+            return self.fh[datakey].attrs.get("network")
+        return self._model_networks.get(datakey)
+
+    def write_abundances(self, datakey: str, df: pd.DataFrame, network: str = None):
+        """Write the full output of a model and its time index.
+
+        The models of a network must have the same columns, with a dense tensor or summary all models must.
+
+        Args:
+            datakey (str): The model
+            df (pd.DataFrame): Its full output
+            network (str, optional): The hash of the network of the model, the one linked to the
+                datakey by write_network if None. Defaults to None.
+        """
+        network = self._get_model_network(datakey) if network is None else network
+        if self.abundances_header is None:
+            # Set the abundances header on first write of a grid.
+            self.abundances_header = df.columns.values
+        header = self._network_headers.setdefault(network, df.columns.values)
+        if not _same_columns(header, df.columns.values):
+            raise RuntimeError(
+                "I found different abundances columns from the first entry, stopping."
+            )
+        if (
+            self.dense_time_grid is not None or self._summary_rows is not None
+        ) and not _same_columns(self.abundances_header, df.columns.values):
+            raise RuntimeError(
+                "The dense tensor and the summary need the same columns in all models, stopping."
+            )
+        header_key = f"{NETWORK_GROUP}/{network}/abundances_header"
+        if network is not None and header_key not in self.fh:
+            self._create_array(self.fh, header_key, np.array(df.columns.values, dtype="S"))
+        if self.encoding == "log16":
+            self._write_encoded(f"{datakey}/abundances", df)
+        else:
+            self._write_df(f"{datakey}/abundances", df)
+        # The sorted times and their rows, see DataLoaderHDF.at_time.
+        self._write_df(f"{datakey}/time_index", get_time_index(df["Time"].to_numpy()))
+        if self.dense_time_grid is not None:
+            self._write_dense(datakey, df)
+        if self._summary_rows is not None:
+            self._write_summary(datakey, df)
+
+    def write_derivatives(self, datakey: str, df: pd.DataFrame):
+        self._write_df(f"{datakey}/derivatives", df)
+
+    def write_rates(
+        self,
+        datakey: str,
+        specie: str,
+        df_rates: pd.DataFrame,
+        df_production: pd.DataFrame,
+        df_destruction: pd.DataFrame,
+    ):
+        """Write the rates of one species as obtained from `rates_to_dfs`, the Time index becomes a column."""
+        for rate_type, rate_df in zip(
+            ["total_rates", "production", "destruction"],
+            [df_rates, df_production, df_destruction],
+        ):
+            if len(rate_df.columns):
+                rate_df = rate_df.reset_index()
+            self._write_df(f"{datakey}/rates/{rate_type}/{specie}", rate_df)
+
+    def model_done(self):
+        """Mark the end of a model, flushes the store every `flush_every` models."""
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            logging.debug(f"Flushing {self.hdf_path}")
+            self.flush()
+
+
+class SWMRStoreWriter(StoreWriter):
+    """Writes a grid in HDF5 single writer multiple reader (SWMR) mode, see DataLoaderHDF(live=True).
+
+    In SWMR mode no new datasets can be created, so the model dataframe, the network and
+    empty resizable datasets for every model are created up front, together with the
+    `/completed` dataset that lists the rows of the model dataframe that are written. Every
+    model is flushed when it is done so that readers can see it. The rates are not supported.
+    """
+
+    def __init__(
+        self,
+        hdf_path,
+        model_df: pd.DataFrame,
+        abundances_columns,
+        network: Network,
+        derivatives_columns=None,
+        dense_time_grid=None,
+        summary: bool = False,
+        flush_every: int = 1,
+    ):
+        """Create the store and switch it to SWMR mode.
+
+        Args:
+            hdf_path (Path): The store to create
+            model_df (pd.DataFrame): The model dataframe, with the storage_id of every model
+            abundances_columns (list[str]): The columns of the full output, identical for all models
+            network (Network): The network of the models
+            derivatives_columns (list[str], optional): The columns of the derivatives, if they are converted. Defaults to None.
+            dense_time_grid (np.ndarray, optional): Also write the dense tensor on this time grid, see enable_dense. Defaults to None.
+            summary (bool, optional): Also write the summary statistics, see enable_summary. Defaults to False.
+            flush_every (int, optional): Flush to disk after this many models. Defaults to 1.
+        """
+        super().__init__(hdf_path, flush_every)
+        self.abundances_header = np.array(abundances_columns)
+        self._positions = {
+            storage_id: i for i, storage_id in enumerate(model_df["storage_id"])
+        }
+        self._datakey = None
+        self.write_model_df(model_df)
+        super().write_network(network)
+        self._create_array(
+            self.fh,
+            f"{NETWORK_GROUP}/{network.hash}/abundances_header",
+            np.array(abundances_columns, dtype="S"),
+        )
+        for storage_id in model_df["storage_id"]:
+            self.fh.require_group(storage_id).attrs["network"] = network.hash
+            self._create_empty(f"{storage_id}/abundances", abundances_columns, "float32")
+            self._create_empty(f"{storage_id}/time_index", ["Time", "row"], "float64")
+            if derivatives_columns is not None:
+                self._create_empty(f"{storage_id}/derivatives", derivatives_columns, "float64")
+        if dense_time_grid is not None:
+            self.enable_dense(model_df["storage_id"], dense_time_grid, abundances_columns)
+        if summary:
+            self.enable_summary(model_df["storage_id"], abundances_columns)
+        self.completed = self.fh.create_dataset(
+            "completed", shape=(0,), maxshape=(None,), dtype="int64", chunks=(1024,)
+        )
+        self.fh.swmr_mode = True
+
+    def _open(self, hdf_path):
+        # SWMR needs the file format of the latest HDF5 versions.
+        return h5py.File(hdf_path, "w-", libver="latest")
+
+    def _create_empty(self, key, columns, dtype):
+        self.fh.create_dataset(
+            key,
+            shape=(0, len(columns)),
+            maxshape=(None, len(columns)),
+            chunks=(256, len(columns)),
+            dtype=dtype,
+        )
+        self.fh.create_dataset(f"{key}_header", data=np.array(columns, dtype="S"))
+
+    def _write_df(self, key: str, df: pd.DataFrame):
+        if key not in self.fh:
+            # Before switching to SWMR mode, e.g. the network tables.
+            return super()._write_df(key, df)
+        dataset = self.fh[key]
+        dataset.resize(df.shape)
+        dataset[...] = df.to_numpy()
+        dataset.flush()
+
+    def _write_dense(self, datakey: str, df: pd.DataFrame):
+        super()._write_dense(datakey, df)
+        self.fh[f"{DENSE_GROUP}/abundances"].flush()
+
+    def _write_summary(self, datakey: str, df: pd.DataFrame):
+        super()._write_summary(datakey, df)
+        for stat in SUMMARY_STATS:
+            self.fh[f"{SUMMARY_GROUP}/{stat}"].flush()
+
+    def write_network(self, network: Network, datakey: str = None):
+        # Written before switching to SWMR mode.
+        pass
+
+    def write_abundances(self, datakey: str, df: pd.DataFrame, network: str = None):
+        self._datakey = datakey
+        super().write_abundances(datakey, df, network)
+
+    def write_rates(self, *args):
+        raise NotImplementedError("The rates cannot be written in SWMR mode.")
+
+    def model_done(self):
+        """Mark the last written model as completed, readers see it from now on."""
+        n_completed = len(self.completed)
+        self.completed.resize((n_completed + 1,))
+        self.completed[n_completed] = self._positions[self._datakey]
+        self.completed.flush()
+        super().model_done()
+
+
+def get_storage_backend(path) -> str:
+    """Infer the storage backend from the path of a store, directories ending in .zarr use zarr."""
+    return "zarr" if pathlib.Path(path).suffix == ".zarr" else "h5py"
+
+
+def open_writer(path, storage_backend: str = None, **kwargs) -> StoreWriter:
+    """Open a write session for a store.
+
+    Args:
+        path (Path): The store to write to
+        storage_backend (str, optional): Either "h5py" or "zarr", inferred from the path if None. Defaults to None.
+        kwargs: Passed to the writer.
+
+    Returns:
+        StoreWriter: An open write session.
+    """
+    storage_backend = storage_backend or get_storage_backend(path)
+    if storage_backend == "h5py":
+        return StoreWriter(path, **kwargs)
+    elif storage_backend == "zarr":
+        from .zarr_store import ZarrStoreWriter
+
+        return ZarrStoreWriter(path, **kwargs)
+    raise NotImplementedError(
+        f"The storage backend {storage_backend} is not implemented."
+    )
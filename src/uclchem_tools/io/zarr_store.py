@@ -0,0 +1,85 @@
+"""Zarr directory stores with the same layout as the hdf stores of the GridConverter.
+
+Every array of a zarr directory store is its own directory, so independent processes can
+write different models into the same store at the same time without any locking, which
+HDF5 does not allow. Requires the optional dependency zarr (>=3), the stores are written
+in the zarr v2 format which supports the fixed length strings used for the headers.
+"""
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from .io import DataLoaderHDF
+from .writer import StoreWriter
+
+ZARR_FORMAT = 2
+
+
+def open_zarr_group(path, mode="r"):
+    try:
+        import zarr
+    except ImportError as exc:
+        raise ImportError(
+            "The zarr storage backend requires zarr, install it with `pip install zarr`."
+        ) from exc
+    return zarr.open_group(str(path), mode=mode, zarr_format=ZARR_FORMAT)
+
+
+def _create_array(group, key, data):
+    """Create an array, an identical array written by a concurrent writer is not an error."""
+    from zarr.errors import ContainsArrayError
+
+    try:
+        group.create_array(key.lstrip("/"), data=data)
+    except ContainsArrayError:
+        pass
+
+
+def df_to_zarr(group, key, df):
+    _create_array(group, key, df.to_numpy())
+    _create_array(group, f"{key}_header", np.array(df.columns.values, dtype="S"))
+
+
+class ZarrStoreWriter(StoreWriter):
+    """Write session for a zarr directory store, see StoreWriter."""
+
+    # Concurrent writers must never write to the same chunk.
+    summary_chunk_rows = 1
+
+    def _open(self, hdf_path):
+        return open_zarr_group(hdf_path, mode="a")
+
+    def _write_df(self, key: str, df: pd.DataFrame):
+        df_to_zarr(self.fh, key, df)
+
+    def close(self):
+        # Every array is written when it is created, there is nothing to close.
+        self.fh = None
+
+    def flush(self):
+        self._unflushed = 0
+
+    def _create_array(self, group, key: str, data):
+        _create_array(group, key, data)
+
+    def _create_nan_array(self, group, key: str, shape, chunks):
+        from zarr.errors import ContainsArrayError
+
+        try:
+            group.create_array(
+                key, shape=shape, chunks=chunks, dtype="float32", fill_value=np.nan
+            )
+        except ContainsArrayError:
+            # Created by a concurrent writer.
+            pass
+
+
+class DataLoaderZarr(DataLoaderHDF):
+    """Loads results from a zarr directory store, with the same interface as DataLoaderHDF."""
+
+    def __init__(self, zarr_path):
+        super().__init__(zarr_path, h5mode="r")
+
+    def open_h5_filehandle(self):
+        return nullcontext(open_zarr_group(self.h5path, mode=self.h5mode))
@@ -0,0 +1,217 @@
+"""Content addressed cache of UCLCHEM runs, so unchanged configurations do not have to be rerun."""
+import functools
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+
+# The keys in the parameter dictionary that only control where outputs are written,
+# they do not change the result so they are left out of the cache key.
+OUTPUT_KEYS = ["outputFile", "abundSaveFile", "columnFile"]
+DEFAULT_CACHE_DIR = pathlib.Path(
+    os.environ.get("UCLCHEM_TOOLS_CACHE", pathlib.Path.home() / ".cache/uclchem_tools")
+)
+DEFAULT_MAX_BYTES = 10 * 1024**3
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+@functools.lru_cache()
+def get_uclchem_fingerprint():
+    """Identify the installed UCLCHEM by its version and its compiled extension.
+
+    Worktrees of different UCLCHEM commits report the same version, so the
+    compiled Fortran wrapper is hashed as well.
+
+    Returns:
+        str: The version and the hash of the compiled wrapper.
+    """
+    spec = importlib.util.find_spec("uclchem.uclchemwrap")
+    wrapper_hash = _hash_file(spec.origin) if spec and spec.origin else "unknown"
+    return f"{version('uclchem')}+{wrapper_hash}"
+
+
+def _canonical(obj):
+    """Make an object json serializable in a canonical way: 1e5, 100_000 and 100000.0 hash identically."""
+    if isinstance(obj, dict):
+        return {str(k): _canonical(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return hashlib.sha256(np.ascontiguousarray(obj).tobytes()).hexdigest()
+    if isinstance(obj, (bool, np.bool_)) or obj is None:
+        return bool(obj) if obj is not None else None
+    if isinstance(obj, (int, float, np.number)):
+        return repr(float(obj))
+    return str(obj)
+
+
+class RunCache:
+    """Cache of UCLCHEM outputs keyed by a hash of everything that determines the result.
+
+    Every entry is a directory with the output files of the run (by their param_dict key),
+    the in memory output if there was one, and a `meta.json` that is written last and
+    marks the entry as complete. The least recently used entries are evicted once the
+    cache grows beyond `max_bytes`.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        """Open (and create) the cache.
+
+        Args:
+            cache_dir (Path, optional): Directory of the cache. Defaults to $UCLCHEM_TOOLS_CACHE or ~/.cache/uclchem_tools.
+            max_bytes (int, optional): The maximum size of the cache before entries are evicted. Defaults to 10 GiB.
+        """
+        self.cache_dir = pathlib.Path(cache_dir or DEFAULT_CACHE_DIR) / "runs"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def get_key(
+        self,
+        uclchem_version,
+        name,
+        model_args,
+        param_dict,
+        outspecies,
+        starting_chemistry=None,
+        in_memory=False,
+    ):
+        """Compute the cache key of a run.
+
+        The values of the output paths are ignored, but which outputs are written is part of
+        the key. An abundLoadFile is included by its content.
+
+        Args:
+            uclchem_version (str): The version (fingerprint) of UCLCHEM, see `get_uclchem_fingerprint`
+            name (str): The model name
+            model_args (dict): The model arguments
+            param_dict (dict): The UCLCHEM parameter dictionary
+            outspecies (list[str]): The species written to the output
+            starting_chemistry (np.ndarray, optional): Abundances the run starts from. Defaults to None.
+            in_memory (bool, optional): Whether the output is kept in memory instead of in files. Defaults to False.
+
+        Returns:
+            str: The hex digest that identifies the run.
+        """
+        outputs = sorted(k for k in OUTPUT_KEYS if k in param_dict)
+        param_dict = {k: v for k, v in param_dict.items() if k not in OUTPUT_KEYS}
+        if starting_chemistry is None and pathlib.Path(
+            param_dict.get("abundLoadFile", "")
+        ).is_file():
+            param_dict["abundLoadFile"] = _hash_file(param_dict["abundLoadFile"])
+        elif starting_chemistry is not None:
+            param_dict["abundLoadFile"] = starting_chemistry
+        description = _canonical(
+            {
+                "uclchem_version": uclchem_version,
+                "name": name,
+                "model_args": model_args or {},
+                "param_dict": param_dict,
+                "outputs": outputs,
+                "outspecies": outspecies,
+                "in_memory": in_memory,
+            }
+        )
+        return hashlib.sha256(
+            json.dumps(description, sort_keys=True).encode("UTF-8")
+        ).hexdigest()
+
+    def _entry(self, key):
+        return self.cache_dir / key
+
+    def __contains__(self, key):
+        return (self._entry(key) / "meta.json").exists()
+
+    def restore(self, key, param_dict):
+        """Copy a cached run back to the output paths of the param_dict.
+
+        Args:
+            key (str): The cache key
+            param_dict (dict): The parameter dictionary of the run we want to skip.
+
+        Returns:
+            tuple[pd.DataFrame, np.ndarray]: The in memory output and final abundances if they were cached, otherwise None.
+        """
+        entry = self._entry(key)
+        with open(entry / "meta.json") as fh:
+            meta = json.load(fh)
+        for output_key in OUTPUT_KEYS:
+            if output_key in param_dict and output_key in meta["files"]:
+                shutil.copyfile(entry / output_key, param_dict[output_key])
+        # Mark the entry as recently used for the eviction.
+        os.utime(entry / "meta.json")
+        df, abundances_start = None, None
+        if meta["in_memory"]:
+            df = pd.read_pickle(entry / "output.pkl")
+            if (entry / "abundances_start.npy").exists():
+                abundances_start = np.load(entry / "abundances_start.npy")
+        return df, abundances_start
+
+    def store(self, key, param_dict, df=None, abundances_start=None):
+        """Add a successful run to the cache, then evict old entries if the cache is too large.
+
+        A run that did not write all of its output files is not cached.
+
+        Args:
+            key (str): The cache key
+            param_dict (dict): The parameter dictionary of the run, the output files in there are cached.
+            df (pd.DataFrame, optional): The in memory output of the run. Defaults to None.
+            abundances_start (np.ndarray, optional): The final abundances of an in memory run. Defaults to None.
+        """
+        missing = [
+            output_key
+            for output_key in OUTPUT_KEYS
+            if output_key in param_dict and not pathlib.Path(param_dict[output_key]).is_file()
+        ]
+        if missing:
+            logging.warning(f"The run did not write {missing}, not adding it to the cache.")
+            return
+        # Write into a temporary directory and move it in place, so concurrent runs never see half an entry.
+        tmpdir = pathlib.Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-"))
+        files = []
+        for output_key in OUTPUT_KEYS:
+            if output_key in param_dict:
+                shutil.copyfile(param_dict[output_key], tmpdir / output_key)
+                files.append(output_key)
+        if df is not None:
+            df.to_pickle(tmpdir / "output.pkl")
+        if abundances_start is not None:
+            np.save(tmpdir / "abundances_start.npy", abundances_start)
+        with open(tmpdir / "meta.json", "w") as fh:
+            json.dump({"files": files, "in_memory": df is not None}, fh)
+        try:
+            os.rename(tmpdir, self._entry(key))
+        except OSError:
+            # Someone else stored the same run in the meantime.
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is smaller than max_bytes."""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            if not (entry / "meta.json").exists():
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            entries.append(((entry / "meta.json").stat().st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logging.info(f"Evicting {entry.name} from the run cache.")
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -25,66 +25,393 @@ def get_cli_parser():
     )
     parser.add_argument(
         "--venvpath",
+        nargs="+",
+        help="Run with the UCLCHEM of (a list of) virtual environment(s).\n"
+        "With several environments, every configuration is run with each of them in parallel.",
+    )
+    parser.add_argument(
+        "--comparison-store",
+        help="The store that collects the results of all environments, required with several venvpaths.",
+    )
+    parser.add_argument(
+        "--workers-per-venv",
+        type=int,
+        default=1,
+        help="Number of parallel workers per environment, chained configurations need 1.",
+    )
+    parser.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="Capture the output of UCLCHEM in memory and write it to the hdf store directly,\n"
+        "skipping the csv output. Equivalent to setting `in_memory: true` in the settings.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run the model, instead of reusing the output of an identical earlier run.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory of the run cache, defaults to $UCLCHEM_TOOLS_CACHE or ~/.cache/uclchem_tools",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=10.0,
+        help="Maximum size of the run cache in GiB, the least recently used runs are evicted first.",
+    )
+    parser.add_argument(
+        "--coordinate-writes",
+        action="store_true",
+        help="Send all writes to a store through a single writer process, so that several\n"
+        "invocations can write to the same store at the same time.",
+    )
+    parser.add_argument(
+        "--task-index",
+        type=int,
+        help="Only run the configurations of this task of a job array, balanced by their estimated cost.\n"
+        "Read from the job array environment (SLURM, SGE, LSF, PBS) if omitted.",
+    )
+    parser.add_argument(
+        "--task-count",
+        type=int,
+        help="The number of tasks in the job array, read from the environment if omitted.",
+    )
+    parser.add_argument(
+        "--marker-dir",
+        help="Directory in which every task writes a completion marker when it is done.",
+    )
+    parser.add_argument(
+        "--collect",
+        action="store_true",
+        help="Do not run anything, wait until all --task-count tasks wrote their marker in --marker-dir.",
     )
     return parser.parse_args()
 
 
+# Final abundances of in memory runs, keyed by their abundSaveFile, so that later
+# configurations can start from them using abundLoadFile.
+_STARTING_CHEMISTRY = {}
+
+
+def get_model_name_and_args(config):
+    """Retrieve the name of the model, whether it is a key or a dict with additional arguments."""
+    if isinstance(config["model"], str):
+        name = config["model"]
+        model_args = {}
+    elif isinstance(config["model"], dict):
+        name = str(list(config["model"].keys())[0])
+        model_args = config["model"][name]
+    return name, model_args
+
+
+def get_hdfpath(config, configpath):
+    """Obtain the hdf store to write to from the settings, or False if we should not write one."""
+    csvpath = config["param_dict"].get("outputFile", configpath)
+    # If the hdf_save is True, we convert the file to a standalone hdf5 in the same directory.
+    if config["settings"]["hdf_save"] is True:
+        return pathlib.Path(csvpath).with_suffix(".hdf5")
+    # If the hdf_save is a string, we save the hdf5 file in the specified directory.
+    elif config["settings"]["hdf_save"]:
+        return config["settings"]["hdf_save"]
+    return False
+
+
+def get_venv_command(venvpath, args) -> list:
+    """The command that runs this script again with the python of a virtual environment.
+
+    Args:
+        venvpath (Path): The virtual environment with uclchem and uclchem-tools installed
+        args (Namespace): The parsed command line of this script
+
+    Returns:
+        list[str]: The arguments of the command, it runs without a shell so paths can contain spaces.
+    """
+    command = [
+        str(pathlib.Path(venvpath) / "bin/python"),
+        str(pathlib.Path(__file__).resolve()),
+        *args.configpaths,
+    ]
+    if args.in_memory:
+        command.append("--in-memory")
+    if args.no_cache:
+        command.append("--no-cache")
+    if args.cache_dir:
+        command += ["--cache-dir", str(args.cache_dir)]
+    if args.coordinate_writes:
+        command.append("--coordinate-writes")
+    command += ["--cache-size", str(args.cache_size)]
+    # The configurations are those of this task already, the child inherits the job array
+    # environment and would partition them again.
+    command += ["--task-index", "0", "--task-count", "1"]
+    return command
+
+
+def get_task_configpaths(configpaths, task_index, task_count):
+    """Select the configurations of a single task of a job array.
+
+    Configurations that start from the abundSaveFile of another configuration are kept in the
+    same task as that configuration, so chains run in order on a single node.
+
+    Args:
+        configpaths (list[str]): All configurations of the grid, identical for every task.
+        task_index (int): The index of this task
+        task_count (int): The number of tasks
+
+    Returns:
+        list[str]: The configurations of this task, in their original order.
+    """
+    from uclchem_tools.utils.partition import estimate_config_cost, get_task_items
+
+    configs = []
+    for configpath in configpaths:
+        with open(configpath) as fh:
+            configs.append(yaml.safe_load(fh))
+    # Group the chains, every group is assigned to a task as a whole.
+    chain_of = list(range(len(configs)))
+    saved_by = {}
+    for i, config in enumerate(configs):
+        if "abundSaveFile" in config["param_dict"]:
+            saved_by[config["param_dict"]["abundSaveFile"]] = i
+    for i, config in enumerate(configs):
+        load_file = config["param_dict"].get("abundLoadFile")
+        if load_file in saved_by:
+            chain_of[i] = chain_of[saved_by[load_file]]
+    chains = sorted(set(chain_of))
+    costs = [
+        sum(estimate_config_cost(configs[i]) for i in range(len(configs)) if chain_of[i] == chain)
+        for chain in chains
+    ]
+    task_chains = {chains[i] for i in get_task_items(costs, task_index, task_count)}
+    return [path for path, chain in zip(configpaths, chain_of) if chain in task_chains]
+
+
+def run_in_memory(name, config, model_args):
+    """Run the model without any of its input or output files, returns the full output and final abundances."""
+    from model import FILE_KEYS, run_model
+
+    param_dict = {k: v for k, v in config["param_dict"].items() if k not in FILE_KEYS}
+    starting_chemistry = None
+    if "abundLoadFile" in config["param_dict"]:
+        starting_chemistry = _STARTING_CHEMISTRY[config["param_dict"]["abundLoadFile"]]
+    return run_model(
+        name,
+        param_dict,
+        config["outspecies"],
+        model_args,
+        return_dataframe=True,
+        starting_chemistry=starting_chemistry,
+    )
+
+
+def execute_model(name, config, model_args, in_memory=False, cache=None):
+    """Run the model of a configuration, or restore its outputs from the cache if it ran before.
+
+    Args:
+        name (str): The model name
+        config (dict): The loaded yaml configuration
+        model_args (dict): The model arguments
+        in_memory (bool, optional): Run without the csv output. Defaults to False.
+        cache (RunCache, optional): The run cache to use, None disables caching. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The full output if in_memory, otherwise None.
+    """
+    from cache import get_uclchem_fingerprint
+    from model import run_model
+
+    df, abundances_start = None, None
+    success = True
+    if cache is not None:
+        key = cache.get_key(
+            get_uclchem_fingerprint(),
+            name,
+            model_args,
+            config["param_dict"],
+            config["outspecies"],
+            starting_chemistry=_STARTING_CHEMISTRY.get(
+                config["param_dict"].get("abundLoadFile")
+            )
+            if in_memory
+            else None,
+            in_memory=in_memory,
+        )
+    if cache is not None and key in cache:
+        logging.info(f"Found an identical run in the cache, skipping {name}.")
+        df, abundances_start = cache.restore(key, config["param_dict"])
+    elif in_memory:
+        df, abundances_start = run_in_memory(name, config, model_args)
+    else:
+        success_flag = run_model(
+            name,
+            config["param_dict"],
+            config["outspecies"],
+            model_args,
+        )
+        success = success_flag >= 0
+        if not success:
+            logging.warning(f"UCLCHEM failed with error code {success_flag} for {name}, not caching its outputs.")
+    if cache is not None and success and key not in cache:
+        cache.store(key, config["param_dict"], df, abundances_start)
+    if in_memory and "abundSaveFile" in config["param_dict"]:
+        _STARTING_CHEMISTRY[config["param_dict"]["abundSaveFile"]] = abundances_start
+    return df
+
+
+def run_config(
+    config, configpath, in_memory=False, cache=None, writers=None, coordinate=False
+):
+    """Run a single configuration and convert its output to hdf5 if requested.
+
+    Args:
+        config (dict): The loaded yaml configuration
+        configpath (str): The path of the configuration, used as datakey if there is no outputFile.
+        in_memory (bool, optional): Skip the csv output and write the results to the store directly.
+            Falls back to the csv if this UCLCHEM version does not support it. Defaults to False.
+        cache (RunCache, optional): Reuse the outputs of identical earlier runs, None always runs the model. Defaults to None.
+        writers (dict[str, StoreWriter], optional): Open write sessions by store path, shared between the
+            configurations of one invocation. New stores are added to it, the caller closes them. Defaults to None.
+        coordinate (bool, optional): Open new write sessions through the write coordinator of the store
+            (see uclchem_tools.io.coordinator), requires writers. Defaults to False.
+    """
+    from model import supports_in_memory
+    from uclchem_tools.io.io import full_output_csv_to_hdf, full_output_df_to_hdf
+    from uclchem_tools.io.writer import get_storage_backend
+
+    name, model_args = get_model_name_and_args(config)
+    in_memory = in_memory or config["settings"].get("in_memory", False)
+    if in_memory and not config["settings"]["run_model"]:
+        logging.warning("in_memory only has effect if run_model is true, reading the csv.")
+        in_memory = False
+    if in_memory and not supports_in_memory(name):
+        logging.warning(
+            "This version of UCLCHEM cannot return arrays, falling back to the csv output."
+        )
+        in_memory = False
+    if (
+        in_memory
+        and "abundLoadFile" in config["param_dict"]
+        and config["param_dict"]["abundLoadFile"] not in _STARTING_CHEMISTRY
+    ):
+        logging.warning(
+            f"{config['param_dict']['abundLoadFile']} was not produced by an earlier in memory run, falling back to the csv output."
+        )
+        in_memory = False
+    if config["settings"]["run_model"]:
+        df = execute_model(name, config, model_args, in_memory, cache)
+
+    # The datakey is the name of the output file (or config) without the extension:
+    datakey = pathlib.Path(config["param_dict"].get("outputFile", configpath)).stem
+    hdfpath = get_hdfpath(config, configpath)
+    writer = None
+    if hdfpath and writers is not None:
+        from uclchem_tools.io.coordinator import connect_writer
+        from uclchem_tools.io.writer import open_writer
+
+        if str(hdfpath) not in writers:
+            writers[str(hdfpath)] = (
+                connect_writer(hdfpath) if coordinate else open_writer(hdfpath)
+            )
+        writer = writers[str(hdfpath)]
+    if hdfpath and in_memory:
+        full_output_df_to_hdf(
+            df,
+            hdfpath,
+            datakey,
+            get_rates=config["settings"]["get_rates"],
+            assume_identical_networks=True,
+            storage_backend=get_storage_backend(hdfpath),
+            writer=writer,
+        )
+    elif hdfpath:
+        # Retrieve the name of the output file and convert it to hdf5:
+        full_output_csv_to_hdf(
+            config["param_dict"]["outputFile"],
+            hdfpath,
+            datakey,
+            get_rates=config["settings"]["get_rates"],
+            assume_identical_networks=True,
+            storage_backend=get_storage_backend(hdfpath),
+            writer=writer,
+        )
+
+
 if __name__ == "__main__":
     # See if we need to run using a venv or not. If so, recall ourselves and use the venv.
     args = get_cli_parser()
+    from uclchem_tools.utils.partition import (
+        get_task_from_env,
+        resolve_task,
+        wait_for_tasks,
+        write_marker,
+    )
 
-    if args.venvpath:
-        logging.info(f"Running with virtual environment at {args.venvpath}")
-        subprocess.run(
-            f"{pathlib.Path(args.venvpath)/'bin/python'} {pathlib.Path(__file__).resolve()} {' '.join(args.configpaths)}",
-            shell=True,
+    if args.collect:
+        task_count = args.task_count or get_task_from_env()[1]
+        if not (args.marker_dir and task_count):
+            raise RuntimeError("Collecting requires a --marker-dir and a --task-count")
+        wait_for_tasks(args.marker_dir, task_count)
+        raise SystemExit(0)
+    task_index, task_count = resolve_task(args.task_index, args.task_count)
+    if task_count is not None:
+        args.configpaths = get_task_configpaths(args.configpaths, task_index, task_count)
+        logging.info(
+            f"Task {task_index} of {task_count} runs {len(args.configpaths)} configurations."
         )
-    elif UCLCHEM_AVAIL:
-        # Only import the rates module if AMUSE is there.
-        from model import run_model
-        from uclchem_tools.io.io import full_output_csv_to_hdf
+    succeeded = True
+
+    if args.venvpath and (len(args.venvpath) > 1 or args.comparison_store):
+        from matrix import get_worker_args, run_matrix
 
+        if not args.comparison_store:
+            raise RuntimeError("Running several environments requires a --comparison-store")
+        logging.info(f"Running with virtual environments at {args.venvpath}")
+        run_matrix(
+            args.venvpath,
+            args.configpaths,
+            args.comparison_store,
+            workers_per_venv=args.workers_per_venv,
+            in_memory=args.in_memory,
+            worker_args=get_worker_args(args.no_cache, args.cache_dir, args.cache_size),
+        )
+    elif args.venvpath:
+        logging.info(f"Running with virtual environment at {args.venvpath[0]}")
+        succeeded = not subprocess.run(get_venv_command(args.venvpath[0], args)).returncode
+    elif UCLCHEM_AVAIL:
         UCLCHEM_VERSION = version("uclchem")
         logging.info(f"Running with UCLCHEM version {UCLCHEM_VERSION}")
-        for configpath in args.configpaths:
-            with open(configpath) as fh:
-                config = yaml.safe_load(fh)
-            # retrieve the name of the model, whether it is a key or a dict with additional arguments:
-            if config["settings"]["run_model"]:
-                if isinstance(config["model"], str):
-                    name = config["model"]
-                    model_args = {}
-                elif isinstance(config["model"], dict):
-                    name = str(list(config["model"].keys())[0])
-                    model_args = config["model"][name]
-                run_model(
-                    name,
-                    config["param_dict"],
-                    config["outspecies"],
-                    model_args,
-                )
+        if args.no_cache:
+            cache = None
+        else:
+            from cache import RunCache
 
-            # Retrieve the name of the output file and convert it to hdf5 if requested:
-            csvpath = config["param_dict"]["outputFile"]
-            # The datakey is the name of the file without the extension:
-            datakey = pathlib.Path(csvpath).stem
-            # If the hdf_save is True, we convert the file to a standalone hdf5 in the same directory.
-            if config["settings"]["hdf_save"] is True:
-                hdfpath = csvpath.with_suffix(".hdf5")
-            # If the hdf_save is a string, we save the hdf5 file in the specified directory.
-            elif config["settings"]["hdf_save"]:
-                hdfpath = config["settings"]["hdf_save"]
-            else:
-                hdfpath = False
-            if hdfpath:
-                full_output_csv_to_hdf(
-                    csvpath,
-                    hdfpath,
-                    datakey,
-                    get_rates=config["settings"]["get_rates"],
-                    assume_identical_networks=True,
+            cache = RunCache(args.cache_dir, max_bytes=int(args.cache_size * 1024**3))
+        # Keep every store open for all configurations instead of reopening it per model.
+        writers = {}
+        try:
+            for configpath in args.configpaths:
+                with open(configpath) as fh:
+                    config = yaml.safe_load(fh)
+                run_config(
+                    config,
+                    configpath,
+                    in_memory=args.in_memory,
+                    cache=cache,
+                    writers=writers,
+                    coordinate=args.coordinate_writes,
                 )
+        finally:
+            for writer in writers.values():
+                writer.close()
     else:
         logging.warning(
             "No UCLCHEM could be found and no virtualenv with uclchem was specified. Not running any code."
         )
+        succeeded = False
+    if args.marker_dir and succeeded:
+        write_marker(
+            args.marker_dir,
+            task_index or 0,
+            task_count or 1,
+            [str(configpath) for configpath in args.configpaths],
+        )
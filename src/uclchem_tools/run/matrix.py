@@ -0,0 +1,230 @@
+"""Run a set of configurations with several UCLCHEM virtual environments in parallel.
+
+Every virtual environment gets persistent worker processes (see worker.py), so UCLCHEM is
+imported once per worker instead of once per configuration. Each worker writes to its own
+store and the results are combined in one comparison store with a group per UCLCHEM
+version, built from external links so that no data is copied.
+"""
+import json
+import logging
+import pathlib
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+WORKER_SCRIPT = pathlib.Path(__file__).resolve().parent / "worker.py"
+
+
+class Worker:
+    """A persistent worker process running in a virtual environment."""
+
+    def __init__(self, venvpath, worker_args=None):
+        self.venvpath = pathlib.Path(venvpath)
+        self.process = subprocess.Popen(
+            [str(self.venvpath / "bin/python"), str(WORKER_SCRIPT), *(worker_args or [])],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        handshake = self._receive()
+        self.version = handshake["version"]
+
+    def _receive(self):
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(
+                f"The worker in {self.venvpath} stopped, check that uclchem and uclchem-tools are installed in it."
+            )
+        return json.loads(line)
+
+    def request(self, request):
+        self.process.stdin.write(json.dumps(request) + "\n")
+        return self._receive()
+
+    def stop(self):
+        try:
+            self.process.stdin.write(json.dumps({"command": "stop"}) + "\n")
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+
+
+def get_worker_args(no_cache=False, cache_dir=None, cache_size=None) -> list:
+    """The command line arguments of the workers for the run cache options of main.py."""
+    if no_cache:
+        return ["--no-cache"]
+    worker_args = []
+    if cache_dir:
+        worker_args += ["--cache-dir", str(cache_dir)]
+    if cache_size is not None:
+        worker_args += ["--cache-size", str(cache_size)]
+    return worker_args
+
+
+def get_version_keys(venvpaths, versions):
+    """Name the comparison groups by UCLCHEM version, using the worktree name for duplicates.
+
+    Worktrees made by `scripts/new_uclchem.sh` from different commits often report the same version.
+    """
+    keys = []
+    for venvpath, uclchem_version in zip(venvpaths, versions):
+        if versions.count(uclchem_version) > 1:
+            uclchem_version = f"{uclchem_version}@{pathlib.Path(venvpath).resolve().parent.name}"
+        keys.append(uclchem_version)
+    if len(set(keys)) != len(keys):
+        raise RuntimeError(f"Cannot tell the environments apart by their versions {keys}")
+    return keys
+
+
+def link_comparison_store(comparison_store, version_stores, attributes):
+    """Write the comparison store with one group of external links per version.
+
+    Args:
+        comparison_store (Path): The store to create
+        version_stores (dict[str, list[Path]]): For every version, the stores written by its workers.
+        attributes (dict[str, dict]): Attributes to store on each version group.
+    """
+    import h5py
+
+    with h5py.File(comparison_store, "w") as fh:
+        for version_key, stores in version_stores.items():
+            group = fh.create_group(version_key)
+            group.attrs.update(attributes[version_key])
+            for store in stores:
+                if not store.exists():
+                    continue
+                with h5py.File(store, "r") as store_fh:
+                    names = list(store_fh.keys())
+                # The network tables are identical in all stores of a version, link them once.
+                for name in names:
+                    if name not in group:
+                        # Relative links, so the comparison store can be moved together with its stores.
+                        group[name] = h5py.ExternalLink(
+                            f"{store.parent.name}/{store.name}", f"/{name}"
+                        )
+
+
+def run_matrix(
+    venvpaths,
+    configpaths,
+    comparison_store,
+    workers_per_venv=1,
+    in_memory=False,
+    worker_args=None,
+):
+    """Run every configuration with every virtual environment and collect them in one store.
+
+    The configurations are divided over the workers of an environment round-robin, each worker
+    runs its configurations in order. Chained configurations (abundSaveFile -> abundLoadFile)
+    must therefore use a single worker per environment, which is the default.
+
+    Args:
+        venvpaths (list[Path]): The virtual environments with uclchem and uclchem-tools installed
+        configpaths (list[str]): The configurations to run
+        comparison_store (Path): The store that links the results of all versions
+        workers_per_venv (int, optional): The number of parallel workers for each environment. Defaults to 1.
+        in_memory (bool, optional): Run without the csv outputs, see main.py. Defaults to False.
+        worker_args (list[str], optional): Extra arguments for the workers, see get_worker_args. Defaults to None.
+
+    Returns:
+        list[dict]: The answers of the workers, one per environment and configuration.
+    """
+    comparison_store = pathlib.Path(comparison_store)
+    if comparison_store.exists():
+        raise RuntimeError("The store already exists, stoppping")
+    workdir = comparison_store.with_suffix(".d")
+    configpaths = [str(pathlib.Path(p).resolve()) for p in configpaths]
+    # Start all workers at the same time, they import UCLCHEM while the others start.
+    with ThreadPoolExecutor(len(venvpaths) * workers_per_venv) as pool:
+        futures = [
+            pool.submit(Worker, venvpath, worker_args)
+            for venvpath in venvpaths
+            for _ in range(workers_per_venv)
+        ]
+    # Keep the workers that started, also when others did not, so they can be stopped.
+    workers = [future.result() for future in futures if future.exception() is None]
+    try:
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise errors[0]
+        versions = [workers[i * workers_per_venv].version for i in range(len(venvpaths))]
+        version_keys = get_version_keys(venvpaths, versions)
+    except Exception:
+        for worker in workers:
+            worker.stop()
+        raise
+    jobs = []
+    for venv_idx, version_key in enumerate(version_keys):
+        for worker_idx in range(workers_per_venv):
+            worker = workers[venv_idx * workers_per_venv + worker_idx]
+            store = workdir / f"{version_key}-{worker_idx}.h5"
+            jobs.append(
+                (
+                    worker,
+                    version_key,
+                    store,
+                    configpaths[worker_idx::workers_per_venv],
+                )
+            )
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    def run_jobs(job):
+        worker, version_key, store, worker_configpaths = job
+        answers = []
+        for configpath in worker_configpaths:
+            answer = worker.request(
+                {
+                    "configpath": configpath,
+                    "store": str(store),
+                    "scratch": str(workdir / version_key),
+                    "in_memory": in_memory,
+                }
+            )
+            if answer["status"] != "done":
+                logging.error(f"{version_key} failed on {configpath}:\n{answer['error']}")
+            answers.append({**answer, "version": version_key})
+        worker.stop()
+        return answers
+
+    try:
+        with ThreadPoolExecutor(len(jobs)) as pool:
+            results = [answer for answers in pool.map(run_jobs, jobs) for answer in answers]
+    finally:
+        for worker in workers:
+            if worker.process.poll() is None:
+                worker.process.kill()
+    version_stores = {version_key: [] for version_key in version_keys}
+    for _, version_key, store, _ in jobs:
+        version_stores[version_key].append(store)
+    attributes = {
+        version_key: {"venvpath": str(venvpath), "uclchem_version": uclchem_version}
+        for version_key, venvpath, uclchem_version in zip(version_keys, venvpaths, versions)
+    }
+    link_comparison_store(comparison_store, version_stores, attributes)
+    return results
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Run configurations with several UCLCHEM environments.")
+    parser.add_argument("comparison_store", help="The store to write the comparison to")
+    parser.add_argument("--configpaths", nargs="+", required=True)
+    parser.add_argument("--venvpaths", nargs="+", required=True)
+    parser.add_argument("--workers-per-venv", type=int, default=1)
+    parser.add_argument("--in-memory", action="store_true")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--cache-size", type=float, default=None)
+    args = parser.parse_args()
+    results = run_matrix(
+        args.venvpaths,
+        args.configpaths,
+        args.comparison_store,
+        workers_per_venv=args.workers_per_venv,
+        in_memory=args.in_memory,
+        worker_args=get_worker_args(args.no_cache, args.cache_dir, args.cache_size),
+    )
+    sys.exit(any(answer["status"] != "done" for answer in results))
@@ -1,32 +1,113 @@
+import inspect
+
+import numpy as np
+import pandas as pd
 import uclchem
 
+# The keys in the parameter dictionary that make UCLCHEM read or write files.
+FILE_KEYS = ["outputFile", "abundSaveFile", "abundLoadFile", "columnFile"]
 
-def run_model(name, param_dict, outspecies, model_args={}):
-    """Simple wrapper that converts the name of a model to the uclchem model itself, then runs it with the options.
 
-    For a general guideline on which parameters to use for everything see: https://uclchem.github.io/docs/parameters
+def get_model(name):
+    """Obtain the model function from the uclchem wrapper given its name.
 
     Args:
         name (str): The model you wish to use
-        param_dict (dict[str, Union[float, bool, str]]): An UCLCHEM parameter dictionary
-        outspecies (list[str]): A list with the species you wish to write to the output file
-        model_args (dict, optional): Optional arguments for the specific model. i.e. temp_idx for hot_core. Defaults to {}.
 
     Returns:
-        _type_: _description_
+        Callable: The UCLCHEM model function
     """
-        # Obtain the model from uclchem wrapper
-    model = {
+    return {
         "cloud": uclchem.model.cloud,
         "hot_core": uclchem.model.hot_core,
         "collapse": uclchem.model.collapse,
         "cshock": uclchem.model.cshock,
         "jshock": uclchem.model.jshock,
     }[name]
-    # Run UCLCHEM
-    model(
+
+
+def supports_in_memory(name):
+    """Check whether the installed UCLCHEM can return the model output as arrays.
+
+    Older versions of UCLCHEM (<3.3) can only write their output to a text file.
+
+    Args:
+        name (str): The model you wish to use
+
+    Returns:
+        bool: True if the model accepts `return_dataframe`.
+    """
+    return "return_dataframe" in inspect.signature(get_model(name)).parameters
+
+
+def get_success_flag(result) -> int:
+    """The success flag of the result of a UCLCHEM model in file mode, 0 if this version does not return one."""
+    if isinstance(result, (list, tuple, np.ndarray)):
+        result = result[0] if len(result) else None
+    return 0 if result is None else int(result)
+
+
+def run_model(
+    name,
+    param_dict,
+    outspecies,
+    model_args={},
+    return_dataframe=False,
+    starting_chemistry=None,
+):
+    """Simple wrapper that converts the name of a model to the uclchem model itself, then runs it with the options.
+
+    For a general guideline on which parameters to use for everything see: https://uclchem.github.io/docs/parameters
+
+    Args:
+        name (str): The model you wish to use
+        param_dict (dict[str, Union[float, bool, str]]): An UCLCHEM parameter dictionary
+        outspecies (list[str]): A list with the species you wish to write to the output file
+        model_args (dict, optional): Optional arguments for the specific model. i.e. temp_idx for hot_core. Defaults to {}.
+        return_dataframe (bool, optional): Capture the full output in memory instead of writing `outputFile`.
+            UCLCHEM does not allow any of the file keys in `param_dict` in this mode. Defaults to False.
+        starting_chemistry (np.ndarray, optional): The abundances to start from, replaces `abundLoadFile`
+            when running in memory. Defaults to None.
+
+    Returns:
+        Union[int, tuple[pd.DataFrame, np.ndarray]]: The success flag of UCLCHEM (negative if the model failed),
+            or if `return_dataframe` the full output (physics followed by abundances, identical to the csv)
+            and the final abundances.
+    """
+    # Obtain the model from uclchem wrapper
+    model = get_model(name)
+    if not return_dataframe:
+        # Run UCLCHEM, it returns the success flag followed by the final abundances of the outspecies.
+        result = model(
+            param_dict=param_dict,
+            out_species=outspecies,
+            **model_args,
+        )
+        return get_success_flag(result)
+    if not supports_in_memory(name):
+        raise RuntimeError(
+            "This version of UCLCHEM cannot return its output in memory, use the csv output instead."
+        )
+    used_file_keys = [key for key in FILE_KEYS if key in param_dict]
+    if used_file_keys:
+        raise RuntimeError(
+            f"Cannot run in memory with the file options {used_file_keys} in the param_dict."
+        )
+    if starting_chemistry is not None:
+        model_args = {**model_args, "starting_chemistry": starting_chemistry}
+    result = model(
         param_dict=param_dict,
         out_species=outspecies,
+        return_dataframe=True,
         **model_args,
     )
-    return model
+    # The number of returned dataframes differs between UCLCHEM versions, but they always
+    # start with the physics and chemistry and end with the success flag.
+    success_flag = result[-1]
+    if success_flag < 0:
+        raise RuntimeError(f"UCLCHEM failed with error code {success_flag}")
+    physics_df, chemistry_df = [r for r in result if isinstance(r, pd.DataFrame)][:2]
+    abundances_start = next(
+        (r for r in result[:-1] if isinstance(r, np.ndarray)), None
+    )
+    return pd.concat((physics_df, chemistry_df), axis=1), abundances_start
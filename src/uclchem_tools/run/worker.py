@@ -0,0 +1,103 @@
+"""Persistent worker that runs configurations inside one UCLCHEM virtual environment.
+
+The worker is started by the matrix runner (see matrix.py) with the python of a virtual
+environment. It imports UCLCHEM once and then runs the configurations it receives as json
+lines on stdin, answering every request with one json line. UCLCHEM itself prints to
+stdout, so the protocol uses a copy of the original stdout and stdout is sent to stderr.
+"""
+import json
+import logging
+from argparse import ArgumentParser
+import os
+import pathlib
+import sys
+import traceback
+from importlib.metadata import version
+
+import yaml
+
+from main import run_config
+from model import FILE_KEYS
+
+
+def relocate_files(param_dict, scratch_dir):
+    """Move all the files of a parameter dictionary into the scratch directory.
+
+    Several environments run the same configurations at the same time, so they cannot
+    share their output files. Relative paths are kept so that abundSaveFile and
+    abundLoadFile chains between configurations still match.
+    """
+    param_dict = dict(param_dict)
+    for key in FILE_KEYS:
+        if key in param_dict:
+            path = pathlib.Path(param_dict[key])
+            path = scratch_dir / (path.relative_to("/") if path.is_absolute() else path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            param_dict[key] = str(path)
+    return param_dict
+
+
+def handle(request, cache, writers):
+    """Run a single configuration into the store of the request."""
+    with open(request["configpath"]) as fh:
+        config = yaml.safe_load(fh)
+    config["param_dict"] = relocate_files(
+        config["param_dict"], pathlib.Path(request["scratch"])
+    )
+    config["settings"]["hdf_save"] = request["store"]
+    run_config(
+        config,
+        request["configpath"],
+        in_memory=request.get("in_memory", False),
+        cache=cache,
+        writers=writers,
+    )
+    # Make every finished configuration durable, the store stays open for the next one.
+    for writer in writers.values():
+        writer.flush()
+    return {
+        "status": "done",
+        "configpath": request["configpath"],
+        "datakey": pathlib.Path(
+            config["param_dict"].get("outputFile", request["configpath"])
+        ).stem,
+    }
+
+
+def serve(no_cache=False, cache_dir=None, cache_size=None):
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    if no_cache:
+        cache = None
+    else:
+        from cache import DEFAULT_MAX_BYTES, RunCache
+
+        max_bytes = DEFAULT_MAX_BYTES if cache_size is None else int(cache_size * 1024**3)
+        cache = RunCache(cache_dir, max_bytes=max_bytes)
+    protocol.write(json.dumps({"status": "ready", "version": version("uclchem")}) + "\n")
+    writers = {}
+    for line in sys.stdin:
+        request = json.loads(line)
+        if request.get("command") == "stop":
+            break
+        try:
+            answer = handle(request, cache, writers)
+        except Exception:
+            logging.exception(f"Failed to run {request.get('configpath')}")
+            answer = {
+                "status": "error",
+                "configpath": request.get("configpath"),
+                "error": traceback.format_exc(),
+            }
+        protocol.write(json.dumps(answer) + "\n")
+    for writer in writers.values():
+        writer.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Worker of the matrix runner, reads requests from stdin.")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--cache-size", type=float, default=None, help="Maximum size of the run cache in GiB.")
+    args = parser.parse_args()
+    serve(no_cache=args.no_cache, cache_dir=args.cache_dir, cache_size=args.cache_size)
@@ -0,0 +1,172 @@
+"""Deterministic partitioning of grid runs and conversions over the tasks of a job array.
+
+Every task computes the same partition independently, so no coordination is needed: a task
+only needs its index and the total number of tasks, from the command line or from the
+environment variables of the scheduler. Work is balanced by an estimated cost per item
+instead of by count, and each task writes a completion marker so that a collector step can
+tell when the whole grid is done.
+"""
+import heapq
+import json
+import logging
+import os
+import pathlib
+import time
+
+
+def get_task_from_env():
+    """Obtain the index and count of the current task from the job array environment variables.
+
+    Supports SLURM, SGE, LSF and PBS. PBS does not export the size of the array, in that case
+    the count is None and it has to be passed explicitly.
+
+    Returns:
+        tuple[int, int]: The zero-based task index and the number of tasks, or (None, None) outside a job array.
+    """
+    env = os.environ
+    if "SLURM_ARRAY_TASK_ID" in env:
+        first = int(env.get("SLURM_ARRAY_TASK_MIN", 0))
+        count = env.get("SLURM_ARRAY_TASK_COUNT")
+        return int(env["SLURM_ARRAY_TASK_ID"]) - first, int(count) if count else None
+    if env.get("SGE_TASK_ID", "undefined") != "undefined":
+        first = int(env.get("SGE_TASK_FIRST", 1))
+        step = int(env.get("SGE_TASK_STEPSIZE", 1))
+        count = (int(env["SGE_TASK_LAST"]) - first) // step + 1 if "SGE_TASK_LAST" in env else None
+        return (int(env["SGE_TASK_ID"]) - first) // step, count
+    if int(env.get("LSB_JOBINDEX", 0)) > 0:
+        count = env.get("LSB_JOBINDEX_END")
+        return int(env["LSB_JOBINDEX"]) - 1, int(count) if count else None
+    for key in ["PBS_ARRAY_INDEX", "PBS_ARRAYID"]:
+        if key in env:
+            return int(env[key]), None
+    return None, None
+
+
+def resolve_task(task_index=None, task_count=None):
+    """Combine the task given on the command line with the environment, the command line wins.
+
+    Returns:
+        tuple[int, int]: The task index and count, or (None, None) if we are not part of a job array.
+    """
+    env_index, env_count = get_task_from_env()
+    task_index = env_index if task_index is None else task_index
+    task_count = env_count if task_count is None else task_count
+    if task_index is None and task_count is None:
+        return None, None
+    if task_index is None or task_count is None:
+        raise ValueError(
+            f"Need both a task index and a task count, got {task_index} and {task_count}."
+        )
+    if not 0 <= task_index < task_count:
+        raise ValueError(f"Task index {task_index} is not in [0, {task_count}).")
+    return task_index, task_count
+
+
+def partition_by_cost(costs, task_count):
+    """Divide items over tasks such that the total cost of each task is balanced.
+
+    Uses the longest processing time first heuristic: the most expensive remaining item goes
+    to the task with the lowest total cost. Ties are broken by index, so the result only
+    depends on the costs and is identical in every task.
+
+    Args:
+        costs (list[float]): The estimated cost of every item
+        task_count (int): The number of tasks
+
+    Returns:
+        list[list[int]]: For every task, the indices of its items in their original order.
+    """
+    order = sorted(range(len(costs)), key=lambda i: (-costs[i], i))
+    loads = [(0.0, task) for task in range(task_count)]
+    partition = [[] for _ in range(task_count)]
+    for i in order:
+        load, task = heapq.heappop(loads)
+        partition[task].append(i)
+        heapq.heappush(loads, (load + costs[i], task))
+    return [sorted(items) for items in partition]
+
+
+def get_task_items(costs, task_index, task_count):
+    """The indices of the items of a single task, see partition_by_cost."""
+    return partition_by_cost(costs, task_count)[task_index]
+
+
+def estimate_config_cost(config) -> float:
+    """Estimate the relative cost of running a configuration.
+
+    Uses the number of written timesteps, finalTime / writeStep, unless the settings specify a `cost`.
+    """
+    if "cost" in config.get("settings", {}):
+        return float(config["settings"]["cost"])
+    param_dict = config.get("param_dict", {})
+    return float(param_dict.get("finalTime", 5.0e6)) / float(
+        param_dict.get("writeStep", 1)
+    )
+
+
+def estimate_file_cost(path) -> float:
+    """Estimate the relative cost of converting an output file by its size."""
+    try:
+        return float(os.path.getsize(path))
+    except OSError:
+        return 1.0
+
+
+def get_marker_path(marker_dir, task_index, task_count) -> pathlib.Path:
+    return pathlib.Path(marker_dir) / f"task-{task_index:05d}-of-{task_count:05d}.done"
+
+
+def write_marker(marker_dir, task_index, task_count, items=None):
+    """Write the completion marker of a task, atomically so a collector never reads half a marker.
+
+    Args:
+        marker_dir (Path): The directory shared by all tasks
+        task_index (int): The index of this task
+        task_count (int): The number of tasks
+        items (list, optional): What this task did, stored in the marker for bookkeeping. Defaults to None.
+    """
+    marker_path = get_marker_path(marker_dir, task_index, task_count)
+    marker_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = marker_path.with_suffix(f".tmp{os.getpid()}")
+    with open(tmp_path, "w") as fh:
+        json.dump(
+            {
+                "task_index": task_index,
+                "task_count": task_count,
+                "items": items or [],
+                "finished": time.time(),
+            },
+            fh,
+        )
+    os.replace(tmp_path, marker_path)
+
+
+def get_missing_tasks(marker_dir, task_count):
+    """The indices of the tasks that did not write their completion marker yet."""
+    return [
+        task_index
+        for task_index in range(task_count)
+        if not get_marker_path(marker_dir, task_index, task_count).exists()
+    ]
+
+
+def wait_for_tasks(marker_dir, task_count, timeout=None, poll_interval=10.0):
+    """Block until all tasks wrote their completion marker.
+
+    Args:
+        marker_dir (Path): The directory shared by all tasks
+        task_count (int): The number of tasks
+        timeout (float, optional): Give up after this many seconds, None waits forever. Defaults to None.
+        poll_interval (float, optional): Seconds between checks. Defaults to 10.0.
+
+    Returns:
+        bool: True if all tasks are done, False if the timeout passed first.
+    """
+    start = time.time()
+    while missing := get_missing_tasks(marker_dir, task_count):
+        if timeout is not None and time.time() - start > timeout:
+            logging.warning(f"Still waiting for tasks {missing}, giving up.")
+            return False
+        logging.info(f"Waiting for {len(missing)} of {task_count} tasks.")
+        time.sleep(poll_interval)
+    return True
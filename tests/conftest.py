@@ -1,10 +1,22 @@
-"""
-    Dummy conftest.py for uclchem_tools.
+"""Fixtures shared by the tests, a small network and stores written without UCLCHEM."""
+import pytest
+from helpers import make_network, write_store
 
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    - https://docs.pytest.org/en/stable/fixture.html
-    - https://docs.pytest.org/en/stable/writing_plugins.html
-"""
 
-# import pytest
+@pytest.fixture
+def network():
+    return make_network()
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "grid.h5"
+    write_store(path)
+    return path
+
+
+@pytest.fixture
+def dense_store(tmp_path):
+    path = tmp_path / "dense.h5"
+    write_store(path, dense=True, summary=True)
+    return path
@@ -0,0 +1,75 @@
+"""Small networks, outputs and stores written without UCLCHEM."""
+import numpy as np
+import pandas as pd
+
+from uclchem_tools.io.network import Network
+
+SPECIES = ["H", "H2", "CO", "#CO"]
+REACTION_TYPES = ["PHOTON", "CRP", "CRPHOT", "FREEZE", "DESORB"]
+
+
+def make_tables(species=SPECIES) -> tuple:
+    """The species and reaction tables of a small network, like uclchem.utils returns them."""
+    species_table = pd.DataFrame(
+        {"NAME": species, "MASS": np.arange(1, len(species) + 1), "BINDING_ENERGY": 0.0}
+    )
+    reaction_table = pd.DataFrame(
+        {
+            "Reactant 1": ["H", "CO", "#CO"],
+            "Reactant 2": ["H", "FREEZE", "DESORB"],
+            "Reactant 3": ["NAN", "NAN", "NAN"],
+            "Product 1": ["H2", "#CO", "CO"],
+            "Product 2": ["NAN", "NAN", "NAN"],
+            "Product 3": ["NAN", "NAN", "NAN"],
+            "Product 4": ["NAN", "NAN", "NAN"],
+            "Alpha": [1e-17, 1.0, 1.0],
+        }
+    )
+    return species_table, reaction_table
+
+
+def make_network(species=SPECIES) -> Network:
+    return Network(*make_tables(species), REACTION_TYPES)
+
+
+def make_output(density: float, temperature: float, n_rows: int = 8, species=("H", "H2", "CO")) -> pd.DataFrame:
+    """A full output with smooth abundances that depend on the parameters."""
+    time = np.concatenate([[0.0], np.logspace(0, 6, n_rows - 1)])
+    df = pd.DataFrame({"Time": time, "Density": density, "gasTemp": temperature})
+    for i, specie in enumerate(species):
+        df[specie] = 10 ** (-8 + 0.1 * i + 0.5 * np.log10(density) - 0.01 * temperature) * (1 + time / 1e6)
+    return df.astype("float32")
+
+
+def write_store(
+    path,
+    n_models: int = 6,
+    network: Network = None,
+    dense: bool = False,
+    summary: bool = False,
+    first: int = 0,
+    **writer_kwargs,
+) -> pd.DataFrame:
+    """Write a store of the models grid_<first> to grid_<first + n_models - 1> and return its model dataframe."""
+    from uclchem_tools.io.resample import get_time_grid
+    from uclchem_tools.io.writer import open_writer
+
+    network = make_network() if network is None else network
+    storage_ids = [f"grid_{i}" for i in range(first, first + n_models)]
+    rows = []
+    with open_writer(path, **writer_kwargs) as writer:
+        if dense:
+            writer.enable_dense(storage_ids, get_time_grid(1.0, 1e6, 16))
+        if summary:
+            writer.enable_summary(storage_ids)
+        for storage_id, i in zip(storage_ids, range(first, first + n_models)):
+            density, temperature = 10.0 ** (2 + i % 3), 10.0 + 10 * i
+            writer.write_network(network, storage_id)
+            writer.write_abundances(storage_id, make_output(density, temperature))
+            writer.model_done()
+            rows.append(
+                {"initialDens": density, "initialTemp": temperature, "finalTime": 1e6, "storage_id": storage_id}
+            )
+        model_df = pd.DataFrame(rows)
+        writer.write_model_df(model_df)
+    return model_df
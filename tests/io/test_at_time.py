@@ -0,0 +1,46 @@
+import h5py
+import numpy as np
+import pytest
+from helpers import make_output
+
+from uclchem_tools.io.io import DataLoaderHDF
+
+
+def output_at(storage_id, time):
+    """The output of a model of the store fixture at one of its output times."""
+    i = int(storage_id.split("_")[1])
+    output = make_output(10.0 ** (2 + i % 3), 10.0 + 10 * i)
+    return output[output["Time"] == np.float32(time)].iloc[0]
+
+
+def drop_time_index(path):
+    with h5py.File(path, "a") as fh:
+        for storage_id in fh:
+            if isinstance(fh[storage_id], h5py.Group) and "time_index" in fh[storage_id]:
+                del fh[f"{storage_id}/time_index"]
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_nearest(store, legacy):
+    if legacy:
+        drop_time_index(store)
+    at_time = DataLoaderHDF(store).at_time(10**2.6, ["CO", "H"])
+    assert list(at_time.columns) == ["CO", "H"]
+    for storage_id in at_time.index:
+        np.testing.assert_allclose(at_time.loc[storage_id], output_at(storage_id, 1e3)[["CO", "H"]], rtol=1e-6)
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_linear(store, legacy):
+    if legacy:
+        drop_time_index(store)
+    at_time = DataLoaderHDF(store).at_time(10**2.5, ["CO"], method="linear", storage_ids=["grid_1"])
+    expected = np.sqrt(output_at("grid_1", 1e2)["CO"] * output_at("grid_1", 1e3)["CO"])
+    np.testing.assert_allclose(at_time.loc["grid_1", "CO"], expected, rtol=1e-5)
+
+
+def test_outside_the_outputs(store):
+    loader = DataLoaderHDF(store)
+    assert loader.at_time(1e7, ["CO"])["CO"].isna().all()
+    with pytest.raises(ValueError):
+        loader.at_time(1e3, method="cubic")
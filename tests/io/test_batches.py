@@ -0,0 +1,55 @@
+import threading
+
+import numpy as np
+import pytest
+
+from uclchem_tools.io.io import DataLoaderHDF
+
+
+@pytest.fixture
+def all_rows(store):
+    loader = DataLoaderHDF(store)
+    return np.concatenate(
+        [loader.read_abundances(storage_id, ["Time", "CO"]).to_numpy() for storage_id in loader.datasets]
+    ).astype("float32")
+
+
+def test_batches_in_order(store, all_rows):
+    batches = list(DataLoaderHDF(store).iter_batches(5, species=["Time", "CO"], prefetch=2))
+    assert [len(batch) for batch in batches] == [5] * 9 + [3]
+    assert all(batch.dtype == np.float32 and batch.flags["C_CONTIGUOUS"] for batch in batches)
+    np.testing.assert_array_equal(np.concatenate(batches), all_rows)
+
+
+def test_shuffled_batches(store, all_rows):
+    loader = DataLoaderHDF(store)
+    batches = list(
+        loader.iter_batches(5, species=["Time", "CO"], shuffle=True, seed=1, drop_last=True, block_rows=3)
+    )
+    assert [len(batch) for batch in batches] == [5] * 9
+    rows = np.concatenate(batches)
+    assert not np.array_equal(rows, all_rows[: len(rows)])
+    # Every row is read at most once.
+    assert len(np.unique(rows, axis=0)) == len(rows)
+    assert np.isin(rows[:, 1], all_rows[:, 1]).all()
+    seeded = list(
+        loader.iter_batches(5, species=["Time", "CO"], shuffle=True, seed=1, drop_last=True, block_rows=3)
+    )
+    np.testing.assert_array_equal(np.concatenate(seeded), rows)
+
+
+def test_batches_of_some_models(store):
+    batches = list(DataLoaderHDF(store).iter_batches(100, storage_ids=["grid_1", "grid_2"]))
+    assert len(batches) == 1
+    assert batches[0].shape == (16, len(DataLoaderHDF(store).columns))
+
+
+def test_stop_iterating_early(store):
+    loader = DataLoaderHDF(store).keep_open()
+    batches = loader.iter_batches(2, species=["Time", "CO"], prefetch=1, block_rows=2)
+    next(batches)
+    batches.close()
+    assert "iter_batches" not in [thread.name for thread in threading.enumerate()]
+    # The handle kept open is not used by the reader thread.
+    assert loader.read_abundances("grid_0", ["CO"]).shape == (8, 1)
+    loader.close()
@@ -0,0 +1,63 @@
+import os
+import pathlib
+import threading
+import time
+
+import numpy as np
+import pytest
+from helpers import make_network, make_output
+
+import uclchem_tools
+from uclchem_tools.io.coordinator import WriteCoordinator, connect_writer, get_rendezvous_path
+from uclchem_tools.io.io import DataLoaderHDF
+
+SRC = str(pathlib.Path(uclchem_tools.__file__).parents[1])
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    """A coordinator serving in a thread of the test process."""
+    path = tmp_path / "grid.h5"
+    coordinator = WriteCoordinator(path, idle_timeout=0.2)
+    thread = threading.Thread(target=coordinator.serve, daemon=True)
+    thread.start()
+    while not get_rendezvous_path(path).exists():
+        time.sleep(0.01)
+    yield path
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+
+
+def test_interleaved_clients(coordinator):
+    networks = [make_network(), make_network(["H", "H2", "CO", "#CO", "HCO+"])]
+    outputs = [make_output(1e3, 10.0), make_output(1e4, 20.0, species=("H", "H2", "CO", "HCO+"))]
+    clients = [connect_writer(coordinator) for _ in range(2)]
+    for i, client in enumerate(clients):
+        client.write_network(networks[i], f"grid_{i}")
+    for i, client in enumerate(clients):
+        client.write_abundances(f"grid_{i}", outputs[i], networks[i].hash)
+        client.model_done()
+    with pytest.raises(RuntimeError):
+        # The columns do not match the network, the coordinator reports the error to the client.
+        clients[0].write_abundances("grid_0", outputs[1])
+    for client in clients:
+        client.close()
+    while get_rendezvous_path(coordinator).exists():
+        time.sleep(0.05)
+    loader = DataLoaderHDF(coordinator)
+    assert sorted(loader.networks) == sorted(network.hash for network in networks)
+    np.testing.assert_allclose(loader.read_abundances("grid_1")["HCO+"], outputs[1]["HCO+"])
+
+
+def test_connect_starts_a_coordinator(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join([SRC, os.environ.get("PYTHONPATH", "")]))
+    path = tmp_path / "grid.h5"
+    with connect_writer(path, idle_timeout=0.2) as writer:
+        writer.write_network(make_network(), "grid_0")
+        writer.write_abundances("grid_0", make_output(1e3, 10.0))
+        writer.model_done()
+    start = time.time()
+    while get_rendezvous_path(path).exists() and time.time() - start < 30:
+        time.sleep(0.05)
+    assert not get_rendezvous_path(path).exists()
+    assert DataLoaderHDF(path).datasets == ["grid_0"]
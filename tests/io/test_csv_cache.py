@@ -0,0 +1,65 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import make_network, make_output
+
+from uclchem_tools.io import csv_cache, io
+
+
+@pytest.fixture
+def csv_directory(tmp_path):
+    """Full output files with up to date cache entries, so they are read without UCLCHEM."""
+    for i in range(3):
+        path = tmp_path / f"model_{i}Full.dat"
+        output = make_output(10.0 ** (2 + i), 10.0)
+        output.to_csv(path, index=False)
+        csv_cache._save_cache(csv_cache.get_cache_path(path), csv_cache._get_file_key(path), output)
+    return tmp_path
+
+
+def test_cache_is_invalidated_by_changes(csv_directory):
+    path = csv_directory / "model_0Full.dat"
+    assert csv_cache.is_cached(path)
+    path.write_text("Time,CO\n")
+    assert not csv_cache.is_cached(path)
+
+
+def test_cache_roundtrip(tmp_path):
+    path = tmp_path / "modelFull.dat"
+    path.write_text("")
+    output = make_output(1e3, 10.0)
+    output["point"] = np.arange(len(output))
+    csv_cache._save_cache(csv_cache.get_cache_path(path), csv_cache._get_file_key(path), output)
+    cached = csv_cache._load_cache(csv_cache.get_cache_path(path), csv_cache._get_file_key(path))
+    pd.testing.assert_frame_equal(cached, output)
+
+
+def test_loader_reads_lazily_from_the_cache(csv_directory, monkeypatch):
+    monkeypatch.setattr(io, "get_uclchem_network", make_network)
+    # The rates module needs UCLCHEM, it must not be imported without get_rates.
+    monkeypatch.setitem(sys.modules, "uclchem_tools.io.rates", None)
+    loader = io.DataLoaderCSV(str(csv_directory) + "/")
+    assert loader.keys() == ["model_0Full", "model_1Full", "model_2Full"]
+    assert not loader.csv_store
+    abundances = loader["model_1Full"]["abundances"]
+    np.testing.assert_allclose(abundances.to_numpy(), make_output(1e3, 10.0).to_numpy())
+    assert list(loader.csv_store) == ["model_1Full"]
+    loader.preload(n_jobs=1, progress=False)
+    assert len(loader.csv_store) == 3
+
+
+def test_loader_loads_the_network_on_first_use(csv_directory, monkeypatch):
+    def get_uclchem_network():
+        calls.append(None)
+        return make_network()
+
+    calls = []
+    monkeypatch.setattr(io, "get_uclchem_network", get_uclchem_network)
+    loader = io.DataLoaderCSV(str(csv_directory) + "/")
+    loader.preload(n_jobs=1, progress=False)
+    assert not calls
+    assert loader["model_0Full"]["species"] == list(make_network().species_names)
+    assert loader.reactions is loader.network.reaction_table
+    assert len(calls) == 1
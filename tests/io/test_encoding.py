@@ -0,0 +1,99 @@
+import h5py
+import numpy as np
+import pandas as pd
+from helpers import SPECIES, make_network, make_output
+
+from uclchem_tools.io.encoding import (
+    FLOOR_CODE,
+    decode_log16,
+    encode_frame,
+    encode_log16,
+    read_header,
+    read_rows,
+)
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.writer import open_writer
+
+
+def test_log16_roundtrip():
+    values = np.array([0.0, 1e-30, 1e-20, 3.3e-9, 0.5, 1.0], dtype="float32")
+    codes = encode_log16(values)
+    assert codes.dtype == np.uint16
+    assert codes[0] == codes[1] == FLOOR_CODE
+    decoded = decode_log16(codes)
+    np.testing.assert_allclose(decoded[2:], values[2:], rtol=1e-3)
+    np.testing.assert_allclose(decoded[:2], 1e-30)
+
+
+def test_encode_frame_layout():
+    df = pd.DataFrame(
+        {"Time": [0.0, 1.0], "CO": [1e-5, 2e-5], "H": [1e-30, 0.0], "gasTemp": [10.0, 10.0], "E-": [-1.0, 1.0]}
+    )
+    mask, codes, offsets, raw, layout = encode_frame(df)
+    # CO is encoded, H stays at the floor, Time, gasTemp and the negative E- are raw.
+    np.testing.assert_array_equal(layout, [-2, 0, -1, -3, -4])
+    np.testing.assert_array_equal(np.unpackbits(mask, axis=1, count=1), [[1], [1]])
+    assert codes.shape == (2,)
+    np.testing.assert_array_equal(offsets, [0, 1, 2])
+    np.testing.assert_array_equal(raw, df[["Time", "gasTemp", "E-"]].to_numpy("float32"))
+
+
+def test_log16_store(tmp_path):
+    path = tmp_path / "log16.h5"
+    output = make_output(1e4, 30.0)
+    output["#CO"] = np.float32(1e-30)
+    with open_writer(path, encoding="log16") as writer:
+        for storage_id in ["grid_0", "grid_1"]:
+            writer.write_network(make_network(), storage_id)
+            writer.write_abundances(storage_id, output)
+            writer.model_done()
+        writer.write_model_df(
+            pd.DataFrame({"initialDens": [1e4, 1e3], "finalTime": [1e6, 1e6], "storage_id": ["grid_0", "grid_1"]})
+        )
+    with h5py.File(path) as fh:
+        assert fh["grid_0/abundances"].shape == (8, 1)
+        assert fh["grid_0/abundances_codes"].dtype == np.uint16
+        assert fh["grid_0/abundances_codes"].shape == (8 * 3,)
+    loader = DataLoaderHDF(path)
+    abundances = loader.read_abundances("grid_0", ["Time", "CO", "#CO", "gasTemp"])
+    np.testing.assert_array_equal(abundances["Time"], output["Time"])
+    np.testing.assert_array_equal(abundances["gasTemp"], output["gasTemp"])
+    np.testing.assert_allclose(abundances["CO"], output["CO"], rtol=1e-3)
+    np.testing.assert_allclose(abundances["#CO"], 1e-30)
+    np.testing.assert_allclose(loader.at_time(1e3, ["CO"]).loc["grid_0", "CO"], output["CO"].iloc[4], rtol=1e-3)
+
+
+def test_floor_runs(tmp_path):
+    path = tmp_path / "log16.h5"
+    output = make_output(1e4, 30.0, species=SPECIES)
+    # The species form one after the other, the runs at the floor are not stored.
+    for i, specie in enumerate(SPECIES):
+        output.loc[: 2 * i, specie] = np.float32(1e-30)
+    with open_writer(path, encoding="log16") as writer:
+        writer.write_network(make_network(), "grid_0")
+        writer.write_abundances("grid_0", output)
+        writer.model_done()
+    with h5py.File(path) as fh:
+        assert len(fh["grid_0/abundances_codes"]) == (output[SPECIES] > 1e-30).sum().sum()
+        header = read_header(fh, "grid_0/abundances")
+        columns = [header.index(column) for column in ["CO", "Time", "#CO", "H"]]
+        expected = output[["CO", "Time", "#CO", "H"]].to_numpy()
+        for rows in [slice(None), slice(3, 6), slice(1, 8, 3), 4, slice(5, 5)]:
+            np.testing.assert_allclose(read_rows(fh, "grid_0/abundances", rows, columns), expected[rows], rtol=1e-3)
+        np.testing.assert_allclose(read_rows(fh, "grid_0/abundances"), output.to_numpy(), rtol=1e-3)
+
+
+def test_log16_is_smaller(tmp_path):
+    species = [f"X{i}" for i in range(40)]
+    output = make_output(1e4, 30.0, n_rows=64, species=species)
+    for i, specie in enumerate(species):
+        output.loc[: i, specie] = 0.0
+    sizes = {}
+    for encoding in ["float32", "log16"]:
+        with open_writer(tmp_path / f"{encoding}.h5", encoding=encoding) as writer:
+            writer.write_abundances("grid_0", output)
+        with h5py.File(tmp_path / f"{encoding}.h5") as fh:
+            sizes[encoding] = sum(
+                dataset.nbytes for key, dataset in fh["grid_0"].items() if key.startswith("abundances")
+            )
+    assert sizes["log16"] < sizes["float32"] / 2
@@ -0,0 +1,29 @@
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import uclchem_tools
+
+SRC = str(pathlib.Path(uclchem_tools.__file__).parents[1])
+HEAVY_DEPENDENCIES = ["uclchem", "tables", "tqdm", "joblib", "scipy", "zarr"]
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "uclchem_tools.io.io",
+        "uclchem_tools.io.writer",
+        "uclchem_tools.io.csv_cache",
+        "uclchem_tools.io.merge",
+        "uclchem_tools.io.inspector",
+    ],
+)
+def test_readers_do_not_import_heavy_dependencies(module):
+    code = f"import json, sys, {module}; print(json.dumps([m for m in {HEAVY_DEPENDENCIES} if m in sys.modules]))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([SRC, os.environ.get("PYTHONPATH", "")])}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    assert json.loads(result.stdout) == []
@@ -0,0 +1,71 @@
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import write_store
+
+from uclchem_tools.io.inspector import advise_chunks, apply_chunks, get_layout_notes, inspect_store
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.trace import AccessTrace
+
+
+def test_inspect_store(store):
+    report = inspect_store(store)
+    assert isinstance(report, pd.DataFrame) and len(report)
+    assert isinstance(get_layout_notes(report, store.stat().st_size), list)
+
+
+def test_apply_chunks_only_rechunks_the_abundances(tmp_path):
+    path = tmp_path / "grid.h5"
+    write_store(path, n_models=4)
+    with h5py.File(path, "a") as fh:
+        # A second 2D output of every model that must keep its layout.
+        for storage_id in ["grid_0", "grid_1", "grid_2", "grid_3"]:
+            fh.create_dataset(f"{storage_id}/derivatives", data=np.ones((8, 6)), chunks=(8, 6))
+    loader = DataLoaderHDF(path, trace=True)
+    for storage_id in loader.datasets:
+        loader.read_abundances(storage_id, ["CO"])
+    advice = advise_chunks(path, loader.trace)
+    advice.update(rechunk=True, chunks=(4, 1))
+    apply_chunks(path, tmp_path / "rechunked.h5", advice, progress=False)
+    with h5py.File(path, "r") as source, h5py.File(tmp_path / "rechunked.h5", "r") as fh:
+        assert fh["grid_0/abundances"].chunks == (4, 1)
+        assert fh["grid_0/derivatives"].chunks == (8, 6)
+        assert fh["grid_0/time_index"].chunks == source["grid_0/time_index"].chunks
+        np.testing.assert_array_equal(fh["grid_0/abundances"][:], source["grid_0/abundances"][:])
+
+
+def test_inspect_store_reports_every_kind(store):
+    report = inspect_store(store).set_index("path")
+    abundances = [path for path in report.index if path.endswith("abundances")]
+    assert report.loc[abundances, "count"].max() == 6
+
+
+def test_trace_roundtrip(store, tmp_path):
+    loader = DataLoaderHDF(store, trace=True)
+    loader.read_abundances("grid_0", ["CO"])
+    loader.at_time(1e3, ["H", "CO"], storage_ids=["grid_1"])
+    assert len(loader.trace) == 2
+    loader.trace.save(tmp_path / "trace.csv")
+    trace = AccessTrace.load(tmp_path / "trace.csv")
+    pd.testing.assert_frame_equal(trace.to_df(), loader.trace.to_df())
+    storage_id, start, stop, n_rows, _, columns = trace.records[1]
+    assert (storage_id, stop - start, n_rows, columns) == ("grid_1", 1, 8, "3 5")
+
+
+def test_advise_chunks_for_single_columns(store):
+    loader = DataLoaderHDF(store, trace=True)
+    for storage_id in loader.datasets:
+        loader.read_abundances(storage_id, ["CO"])
+    advice = advise_chunks(store, loader.trace, chunk_overhead_bytes=0)
+    assert advice["rechunk"]
+    assert advice["chunks"][1] == 1
+    assert advice["amplification"] == 1.0
+    assert advice["current_amplification"] > 1.0
+    with pytest.raises(ValueError):
+        advise_chunks(store, AccessTrace())
+
+
+def test_apply_chunks_without_gain(store, tmp_path):
+    apply_chunks(store, tmp_path / "rechunked.h5", {"rechunk": False})
+    assert not (tmp_path / "rechunked.h5").exists()
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import make_network, make_output
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.writer import open_writer
+
+pytest.importorskip("scipy")
+
+
+def log_abundance(density, temperature, time, index=2):
+    """The log10 abundance of the index-th species of helpers.make_output."""
+    return -8 + 0.1 * index + 0.5 * np.log10(density) - 0.01 * temperature + np.log10(1 + time / 1e6)
+
+
+def write_grid(path, parameters):
+    """Write a store with a model for every (density, temperature) pair."""
+    network = make_network()
+    rows = []
+    with open_writer(path) as writer:
+        for i, (density, temperature) in enumerate(parameters):
+            storage_id = f"grid_{i}"
+            writer.write_network(network, storage_id)
+            writer.write_abundances(storage_id, make_output(density, np.nan_to_num(temperature)))
+            writer.model_done()
+            rows.append(
+                {"initialDens": density, "initialTemp": temperature, "finalTime": 1e6, "storage_id": storage_id}
+            )
+        writer.write_model_df(pd.DataFrame(rows))
+    return path
+
+
+@pytest.fixture
+def regular_store(tmp_path):
+    return write_grid(
+        tmp_path / "regular.h5",
+        [(density, temperature) for density in (1e2, 1e5) for temperature in (10.0, 30.0)],
+    )
+
+
+def test_regular_grid(regular_store):
+    interpolator = DataLoaderHDF(regular_store).interpolator(["CO"])
+    assert interpolator.axes is not None
+    time = interpolator.time_grid[10]
+    abundances, error = interpolator({"initialDens": 10**3.5, "initialTemp": 20.0}, time)
+    # The abundances are linear in the log density and temperature, so the interpolation is exact.
+    np.testing.assert_allclose(np.log10(abundances[0, 0]), log_abundance(10**3.5, 20.0, time), atol=1e-5)
+    assert error[0, 0] > 0
+
+
+def test_scattered_grid(store):
+    loader = DataLoaderHDF(store)
+    interpolator = loader.interpolator(["H", "CO"])
+    assert interpolator.axes is None
+    times = interpolator.time_grid[[5, 20]]
+    abundances, error = interpolator({"initialDens": 1e3, "initialTemp": 20.0}, times)
+    assert abundances.shape == (2, 2)
+    np.testing.assert_allclose(np.log10(abundances[:, 1]), log_abundance(1e3, 20.0, times), atol=1e-5)
+    np.testing.assert_allclose(error, 0.0, atol=1e-5)
+    assert loader.interpolator(["H", "CO"]) is interpolator
+
+
+def test_outside_the_grid_is_nan(store):
+    interpolator = DataLoaderHDF(store).interpolator(["CO"])
+    abundances, _ = interpolator({"initialDens": 1e8, "initialTemp": 20.0}, 1e3)
+    assert np.isnan(abundances).all()
+    with pytest.raises(KeyError):
+        interpolator({"initialDens": 1e3}, 1e3)
+
+
+def test_skips_models_without_parameters(tmp_path):
+    path = write_grid(
+        tmp_path / "grid.h5",
+        [(1e2, np.nan), (1e2, 10.0), (1e3, 20.0), (1e4, 30.0), (1e2, 40.0), (1e3, 50.0)],
+    )
+    interpolator = DataLoaderHDF(path).interpolator(["CO"])
+    assert interpolator.storage_ids == [f"grid_{i}" for i in range(1, 6)]
@@ -0,0 +1,78 @@
+import warnings
+
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import SPECIES, make_network, make_output
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.writer import StoreWriter
+
+tables = pytest.importorskip("tables")
+
+
+def legacy_df_to_h5py(fh, key, df):
+    """df_to_h5py of the versions before the StoreWriter, the header is stored as python strings."""
+    fh.create_dataset(f"/{key}", data=df.to_numpy())
+    fh.create_dataset(f"/{key}_header", data=df.columns.values)
+
+
+def get_rates(output):
+    return pd.DataFrame(
+        {"reaction_0": output["CO"].to_numpy() * 2.0}, index=pd.Index(output["Time"], name="Time")
+    )
+
+
+@pytest.fixture
+def legacy_store(tmp_path):
+    """A store in the layout of the GridConverter before the StoreWriter, with rates."""
+    path = tmp_path / "legacy.h5"
+    model_df = pd.DataFrame(
+        {
+            "initialDens": [1e2, 1e3, 1e4],
+            "initialTemp": [10.0, 20.0, 30.0],
+            "storage_id": ["grid_0", "grid_1", "grid_2"],
+        }
+    )
+    model_df.to_hdf(path, key="model_df")
+    species_lookup, reactions, species = make_network().get_store_tables()
+    with h5py.File(path, "a") as fh:
+        for _, row in model_df.iterrows():
+            output = make_output(row["initialDens"], row["initialTemp"], species=SPECIES)
+            legacy_df_to_h5py(fh, f"{row['storage_id']}/abundances", output)
+        # The network tables of all models at the root of the store.
+        fh.create_dataset("/index_species_lookup", data=species_lookup)
+        legacy_df_to_h5py(fh, "/reactions", reactions)
+        legacy_df_to_h5py(fh, "/species", species)
+    # The rates were PyTables frames, one per species.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=tables.NaturalNameWarning)
+        with pd.HDFStore(path) as store:
+            for _, row in model_df.iterrows():
+                rates = get_rates(make_output(row["initialDens"], row["initialTemp"], species=SPECIES))
+                for specie in SPECIES:
+                    for rate_type in ["total_rates", "production", "destruction"]:
+                        store.put(f"{row['storage_id']}/rates/{rate_type}/{specie}", rates, index=False)
+    return path
+
+
+def test_read_a_legacy_store(legacy_store):
+    loader = DataLoaderHDF(legacy_store)
+    assert loader.datasets == ["grid_0", "grid_1", "grid_2"]
+    assert loader.species == SPECIES
+    assert loader.networks == []
+    output = make_output(1e3, 20.0, species=SPECIES)
+    model = loader["grid_1"]
+    np.testing.assert_array_equal(model["abundances"].to_numpy(), output.to_numpy())
+    pd.testing.assert_frame_equal(model["total_rates"]["#CO"], get_rates(output))
+    np.testing.assert_array_equal(loader.read_abundances("grid_2", ["CO"])["CO"], make_output(1e4, 30.0)["CO"])
+    assert loader.query(initialDens=(1e3, None)) == ["grid_1", "grid_2"]
+    assert loader.nearest({"initialDens": 1e2, "initialTemp": 10.0})[0] == ["grid_0"]
+    assert loader.at_time(1.0, ["CO"]).shape == (3, 1)
+
+
+def test_appending_to_a_legacy_store_warns(legacy_store, caplog):
+    with StoreWriter(legacy_store):
+        pass
+    assert "earlier version" in caplog.text
@@ -0,0 +1,88 @@
+import h5py
+import numpy as np
+import pytest
+from helpers import make_network, make_output, write_store
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.merge import merge_stores, repack_store
+from uclchem_tools.io.shards import finalize_shards, get_shard_path
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Two stores that share the models grid_2 and grid_3."""
+    paths = [tmp_path / "a.h5", tmp_path / "b.h5"]
+    write_store(paths[0], n_models=4, dense=True, summary=True)
+    write_store(paths[1], n_models=4, first=2, dense=True, summary=True)
+    return paths
+
+
+def test_conflicts_stop_the_merge(stores, tmp_path):
+    with pytest.raises(RuntimeError):
+        merge_stores(stores, tmp_path / "merged.h5", progress=False)
+    with pytest.raises(ValueError):
+        merge_stores(stores, tmp_path / "merged.h5", on_conflict="overwrite", progress=False)
+
+
+def test_skip(stores, tmp_path):
+    merge_stores(stores, tmp_path / "merged.h5", on_conflict="skip", progress=False)
+    loader = DataLoaderHDF(tmp_path / "merged.h5")
+    assert loader.datasets == [f"grid_{i}" for i in range(6)]
+    assert list(loader.models_df["storage_id"]) == loader.datasets
+    np.testing.assert_allclose(
+        loader["grid_5"]["abundances"].to_numpy(), make_output(1e4, 60.0).to_numpy()
+    )
+    # The dense tensor and the summary are stacked in the order of the models.
+    dense = loader.get_dense(["CO"])
+    assert dense["storage_ids"] == loader.datasets
+    np.testing.assert_array_equal(dense["values"][4:], DataLoaderHDF(stores[1]).get_dense(["CO"])["values"][2:])
+    assert list(loader.summary("final").index) == loader.datasets
+    assert loader.nearest({"initialTemp": 60.0})[0][0] == "grid_5"
+
+
+def test_rename(stores, tmp_path):
+    merge_stores(stores, tmp_path / "merged.h5", on_conflict="rename", progress=False)
+    loader = DataLoaderHDF(tmp_path / "merged.h5")
+    assert sorted(loader.datasets) == sorted(
+        [f"grid_{i}" for i in range(6)] + ["grid_2_1", "grid_3_1"]
+    )
+    np.testing.assert_array_equal(
+        loader["grid_2_1"]["abundances"].to_numpy(), loader["grid_2"]["abundances"].to_numpy()
+    )
+
+
+def test_merge_keeps_the_networks(tmp_path):
+    paths = [tmp_path / "a.h5", tmp_path / "b.h5"]
+    write_store(paths[0], n_models=2)
+    network = make_network(["H", "H2", "CO", "#CO", "HCO+"])
+    write_store(paths[1], n_models=2, first=2, network=network)
+    merge_stores(paths, tmp_path / "merged.h5", progress=False)
+    loader = DataLoaderHDF(tmp_path / "merged.h5")
+    assert len(loader.networks) == 2
+    assert loader.network_of("grid_3") == network.hash
+
+
+def test_repack(tmp_path, store):
+    repack_store(store, tmp_path / "repacked.h5", compression="gzip", chunk_rows=4, progress=False)
+    with h5py.File(store, "r") as source, h5py.File(tmp_path / "repacked.h5", "r") as fh:
+        assert fh["grid_0/abundances"].compression == "gzip"
+        assert fh["grid_0/abundances"].chunks[0] == 4
+        np.testing.assert_array_equal(fh["grid_0/abundances"][...], source["grid_0/abundances"][...])
+
+
+def test_repack_a_sharded_master(tmp_path):
+    path = tmp_path / "grid.h5"
+    for shard_index in range(2):
+        write_store(get_shard_path(path, shard_index, 2), n_models=3, first=3 * shard_index, dense=True)
+    finalize_shards(path, 2)
+    repack_store(path, tmp_path / "repacked.h5", progress=False)
+    for shard_index in range(2):
+        get_shard_path(path, shard_index, 2).unlink()
+    loader = DataLoaderHDF(tmp_path / "repacked.h5")
+    assert loader.datasets == [f"grid_{i}" for i in range(6)]
+    with h5py.File(tmp_path / "repacked.h5", "r") as fh:
+        assert not fh["grid_4/abundances"].is_virtual
+    np.testing.assert_allclose(
+        loader["grid_4"]["abundances"].to_numpy(), make_output(1e3, 50.0).to_numpy()
+    )
+    assert np.isfinite(loader.get_dense()["values"]).all()
@@ -0,0 +1,65 @@
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.model_table import ModelTable, mask_predicate, read_model_table, write_model_table
+
+
+@pytest.fixture
+def table(tmp_path):
+    model_df = pd.DataFrame(
+        {
+            "initialDens": [1e3, np.nan, 1e5, 1e4, np.nan],
+            "zeta": [1, 2, 3, 4, 5],
+            "storage_id": [f"grid_{i}" for i in range(5)],
+        }
+    )
+    with h5py.File(tmp_path / "grid.h5", "a") as fh:
+        write_model_table(fh, model_df)
+    fh = h5py.File(tmp_path / "grid.h5", "r")
+    yield model_df, ModelTable(fh)
+    fh.close()
+
+
+def test_roundtrip(table):
+    model_df, model_table = table
+    pd.testing.assert_frame_equal(read_model_table(model_table.model_group.parent), model_df, check_dtype=False)
+
+
+@pytest.mark.parametrize(
+    "predicate, expected",
+    [((1e4, None), [2, 3]), ((None, None), [0, 2, 3]), ((None, 1e4), [0, 3]), (1e5, [2]), ((1e6, None), [])],
+)
+def test_range_excludes_nan(table, predicate, expected):
+    model_df, model_table = table
+    np.testing.assert_array_equal(model_table.where(initialDens=predicate), expected)
+    np.testing.assert_array_equal(np.flatnonzero(mask_predicate(model_df["initialDens"].to_numpy(), predicate)), expected)
+
+
+def test_where_combines_predicates(table):
+    _, model_table = table
+    rows = model_table.where(initialDens=(1e3, None), zeta=(2, 4))
+    assert model_table.storage_ids(rows) == ["grid_2", "grid_3"]
+    assert list(model_table.where(storage_id=["grid_1", "grid_4"])) == [1, 4]
+
+
+def test_loader_query(store):
+    loader = DataLoaderHDF(store)
+    assert loader.query(initialDens=(1e3, None), initialTemp=(None, 40.0)) == ["grid_1", "grid_2"]
+    assert loader.query(initialDens=[1e2]) == ["grid_0", "grid_3"]
+    assert [storage_id for storage_id, _ in loader.iter_models(initialTemp=60.0)] == ["grid_5"]
+    with pytest.raises(KeyError):
+        loader.query(zeta=1.0)
+    assert loader._models_df is None
+
+
+def test_loader_query_of_a_legacy_store(store):
+    pytest.importorskip("tables")
+    # Stores written by older versions keep the model dataframe as a PyTables blob.
+    with h5py.File(store, "a") as fh:
+        del fh["model_df"]
+    model_df = pd.DataFrame({"initialDens": [1e2, 1e3, 1e4, 1e2, 1e3, 1e4], "storage_id": [f"grid_{i}" for i in range(6)]})
+    model_df.to_hdf(store, key="model_df")
+    assert DataLoaderHDF(store).query(initialDens=(1e3, None)) == ["grid_1", "grid_2", "grid_4", "grid_5"]
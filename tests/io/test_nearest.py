@@ -0,0 +1,82 @@
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.nearest import NearestIndex
+
+
+@pytest.fixture
+def model_df():
+    return pd.DataFrame(
+        {
+            "initialDens": [1e2, 1e3, np.nan, 1e4, 1e5, 1e6],
+            "initialTemp": [10.0, 20.0, 30.0, np.inf, 50.0, 60.0],
+            "storage_id": [f"grid_{i}" for i in range(6)],
+        }
+    )
+
+
+@pytest.fixture(params=["tree", "brute_force"])
+def get_index(request, monkeypatch):
+    if request.param == "brute_force":
+        monkeypatch.setattr(NearestIndex, "_get_tree", lambda self, dims: None)
+    return NearestIndex.from_model_df
+
+
+def test_skips_non_finite_rows(model_df, get_index):
+    index = get_index(model_df)
+    np.testing.assert_array_equal(index.rows, [0, 1, 4, 5])
+    assert index.log_scaled.tolist() == [True, False]
+    assert np.isfinite(index.points).all()
+    rows, distances = index.query({"initialDens": 1e4})
+    assert rows.tolist() in ([1], [4])
+    rows, _ = index.query({"initialDens": 1e5, "initialTemp": 50.0}, k=2)
+    assert rows.tolist() == [4, 5]
+
+
+@pytest.mark.parametrize("k, shape", [(1, (3,)), (2, (3, 2))])
+def test_query_broadcasts(model_df, get_index, k, shape):
+    index = get_index(model_df)
+    rows, distances = index.query({"initialDens": np.array([1e2, 1e5, 1e6]), "initialTemp": np.array([10.0, 50.0, 60.0])}, k=k)
+    assert rows.shape == shape and distances.shape == shape
+    np.testing.assert_array_equal(rows if k == 1 else rows[:, 0], [0, 4, 5])
+
+
+def test_empty(get_index):
+    index = get_index(pd.DataFrame({"initialDens": [np.nan, np.nan], "initialTemp": [1.0, 2.0]}), columns=["initialDens"])
+    assert len(index.points) == 0
+    rows, distances = index.query({"initialDens": 1e3}, k=3)
+    assert len(rows) == 0 and len(distances) == 0
+    rows, _ = index.query({"initialDens": np.array([1e3, 1e4])})
+    assert rows.shape == (2, 0)
+
+
+def test_loader_nearest(store):
+    loader = DataLoaderHDF(store)
+    storage_ids, distances = loader.nearest({"initialDens": 1e3, "initialTemp": 20.0})
+    assert storage_ids == ["grid_1"]
+    assert distances[0] == pytest.approx(0.0)
+
+
+def test_group_roundtrip(model_df, tmp_path):
+    index = NearestIndex.from_model_df(model_df)
+    with h5py.File(tmp_path / "index.h5", "w") as fh:
+        index.to_group(fh)
+    with h5py.File(tmp_path / "index.h5", "r") as fh:
+        loaded = NearestIndex.from_group(fh)
+    np.testing.assert_array_equal(loaded.points, index.points)
+    np.testing.assert_array_equal(loaded.rows, index.rows)
+    assert loaded.columns == index.columns
+    np.testing.assert_array_equal(loaded.query({"initialDens": 1e5})[0], [4])
+
+
+def test_single_model(tmp_path):
+    index = NearestIndex.from_model_df(pd.DataFrame({"initialDens": [1e4], "storage_id": ["grid_0"]}))
+    assert index.columns == []
+    assert index.points.shape == (1, 0)
+    with h5py.File(tmp_path / "index.h5", "w") as fh:
+        index.to_group(fh)
+    with h5py.File(tmp_path / "index.h5", "r") as fh:
+        assert NearestIndex.from_group(fh).points.shape == (1, 0)
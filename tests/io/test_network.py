@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from helpers import make_network
+
+from uclchem_tools.io.network import NAN_INDEX, get_name_column
+
+
+def test_lookup_and_encoding(network):
+    assert network.lookup_names[NAN_INDEX] == "NAN"
+    assert network.species_lookup["CO"] == 3
+    assert network.species_lookup["FREEZE"] == 1 + len(network.species_names) + 3
+    np.testing.assert_array_equal(network.encode(np.array([["co", "h2"], ["NAN", "#CO"]])), [[3, 2], [0, 4]])
+
+
+def test_reactions_with(network):
+    np.testing.assert_array_equal(network.reactions_with("H"), [0])
+    np.testing.assert_array_equal(network.reactions_with("#co"), [1, 2])
+    assert len(network.reactions_with("FREEZE")) == 1
+
+
+def test_store_tables_only_hold_numbers(network):
+    lookup, reactions, species = network.get_store_tables()
+    assert lookup.dtype.kind == "S"
+    assert all(pd.api.types.is_numeric_dtype(dtype) for dtype in reactions.dtypes)
+    assert list(species.columns)[0] == "name_index"
+    np.testing.assert_array_equal(species["name_index"], [1, 2, 3, 4])
+
+
+def test_hash_identifies_the_tables(network):
+    assert make_network().hash == network.hash
+    assert make_network(["H", "H2", "CO", "#CO", "HCO+"]).hash != network.hash
+
+
+def test_name_column():
+    assert get_name_column(pd.DataFrame({"Name": []})) == "Name"
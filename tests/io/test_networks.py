@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import make_network, make_output
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.writer import open_writer
+
+NETWORK_A = make_network()
+NETWORK_B = make_network(["H", "H2", "CO", "#CO", "HCO+"])
+OUTPUTS = {
+    "grid_0": (NETWORK_A, make_output(1e3, 10.0)),
+    "grid_1": (NETWORK_B, make_output(1e4, 20.0, species=("H", "HCO+", "CO"))),
+}
+
+
+@pytest.fixture
+def mixed_store(tmp_path):
+    path = tmp_path / "mixed.h5"
+    with open_writer(path) as writer:
+        for storage_id, (network, output) in OUTPUTS.items():
+            writer.write_network(network, storage_id)
+            writer.write_abundances(storage_id, output, network.hash)
+            writer.model_done()
+        writer.write_model_df(
+            pd.DataFrame({"initialDens": [1e3, 1e4], "finalTime": 1e6, "storage_id": list(OUTPUTS)})
+        )
+    return path
+
+
+def test_networks_of_the_models(mixed_store):
+    loader = DataLoaderHDF(mixed_store)
+    assert sorted(loader.networks) == sorted([NETWORK_A.hash, NETWORK_B.hash])
+    assert loader.network_of("grid_0") == NETWORK_A.hash
+    assert loader.network_of("grid_1") == NETWORK_B.hash
+    assert loader.columns == ["Time", "Density", "gasTemp", "H", "H2", "CO", "HCO+"]
+
+
+def test_aligned_abundances(mixed_store):
+    loader = DataLoaderHDF(mixed_store)
+    for storage_id, (_, output) in OUTPUTS.items():
+        abundances = loader.read_abundances(storage_id)
+        assert list(abundances.columns) == loader.columns
+        missing = [column for column in loader.columns if column not in output]
+        assert abundances[missing].isna().all().all()
+        np.testing.assert_array_equal(abundances[output.columns], output)
+    at_time = loader.at_time(1e3, ["H2", "HCO+"])
+    assert np.isnan(at_time.loc["grid_0", "HCO+"]) and np.isnan(at_time.loc["grid_1", "H2"])
+    assert at_time.loc["grid_1", "HCO+"] == OUTPUTS["grid_1"][1]["HCO+"].iloc[4]
+
+
+def test_unknown_column(mixed_store):
+    with pytest.raises(KeyError):
+        DataLoaderHDF(mixed_store).read_abundances("grid_0", ["CH3OH"])
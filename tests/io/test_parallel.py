@@ -0,0 +1,38 @@
+import pytest
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.parallel import iter_parallel
+
+
+def final_co(model):
+    return float(model["abundances"]["CO"].iloc[-1])
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_map(store, n_jobs):
+    loader = DataLoaderHDF(store)
+    expected = {key: final_co(loader[key]) for key in loader.datasets}
+    results = list(loader.map(final_co, n_jobs=n_jobs, chunksize=2, progress=False))
+    assert [key for key, _ in results] == loader.datasets
+    assert dict(results) == pytest.approx(expected)
+    assert loader._fh is None
+
+
+def test_map_unordered_with_a_lambda(store):
+    loader = DataLoaderHDF(store)
+    results = dict(
+        loader.map(
+            lambda model: len(model["abundances"]),
+            keys=["grid_0", "grid_3", "grid_5"],
+            n_jobs=2,
+            chunksize=1,
+            ordered=False,
+            progress=False,
+        )
+    )
+    assert results == {"grid_0": 8, "grid_3": 8, "grid_5": 8}
+
+
+def test_iter_parallel_bounds_the_tasks_in_flight():
+    results = list(iter_parallel(pow, [(2, i) for i in range(10)], n_jobs=2, max_in_flight=1))
+    assert results == [2**i for i in range(10)]
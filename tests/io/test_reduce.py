@@ -0,0 +1,34 @@
+import h5py
+import numpy as np
+import pytest
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.parallel import _WORKER_LOADERS
+
+
+@pytest.mark.parametrize("use_dense", [True, False])
+def test_reduce_releases_the_store(dense_store, use_dense):
+    store = dense_store
+    loader = DataLoaderHDF(store)
+    statistics = loader.reduce(use_dense=use_dense, progress=False)
+    assert statistics.n_models == len(loader.datasets)
+    assert not loader.is_kept_open
+    assert not _WORKER_LOADERS
+    # No read handle is left behind, so the store can be appended to again.
+    with h5py.File(store, "a") as fh:
+        fh.attrs["reopened"] = True
+
+
+def test_reduce_keeps_the_handle_of_the_caller(store):
+    loader = DataLoaderHDF(store).keep_open()
+    loader.reduce(progress=False)
+    assert loader.is_kept_open
+    loader.close()
+
+
+def test_reduce_parallel_matches_serial(store):
+    loader = DataLoaderHDF(store)
+    serial = loader.reduce(use_dense=False, progress=False)
+    parallel = loader.reduce(use_dense=False, n_jobs=2, chunksize=2, progress=False)
+    assert parallel.n_models == serial.n_models
+    np.testing.assert_allclose(parallel.mean(), serial.mean(), rtol=1e-5)
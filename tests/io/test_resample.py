@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from helpers import make_output
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.resample import get_increasing_times, get_time_grid, resample, resample_log
+
+
+def test_time_grid():
+    time_grid = get_time_grid(1.0, 1e6, 7)
+    np.testing.assert_allclose(time_grid, np.logspace(0, 6, 7))
+    with pytest.raises(ValueError):
+        get_time_grid(0.0, 1e6)
+
+
+def test_increasing_times_skip_restarts():
+    times = np.array([0.0, 1.0, 10.0, 10.0, 0.0, 5.0, 100.0])
+    np.testing.assert_array_equal(
+        get_increasing_times(times), [False, True, True, False, False, False, True]
+    )
+
+
+def test_resample_is_linear_in_log_space():
+    times = np.array([0.0, 1.0, 100.0])
+    values = np.array([[1.0, 0.0], [1e-10, 0.0], [1e-6, 2.0]])
+    time_grid = np.array([0.1, 10.0, 100.0])
+    log_values = resample_log(times, values[:, :1], time_grid)
+    assert np.isnan(log_values[0, 0])
+    np.testing.assert_allclose(log_values[1:, 0], [-8.0, -6.0])
+    # The column that is not strictly positive is resampled linearly.
+    np.testing.assert_allclose(resample(times, values, time_grid)[1:], [[1e-8, 1.0], [1e-6, 2.0]])
+
+
+def test_dense_tensor(dense_store):
+    loader = DataLoaderHDF(dense_store)
+    dense = loader.get_dense()
+    assert dense["storage_ids"] == [f"grid_{i}" for i in range(6)]
+    assert dense["values"].shape == (6, 16, len(dense["columns"]))
+    np.testing.assert_allclose(dense["times"], get_time_grid(1.0, 1e6, 16))
+    # grid_4 has density 1e3 and temperature 50.
+    output = make_output(1e3, 50.0)
+    expected = resample(output["Time"].to_numpy(), output[["CO", "H"]].to_numpy(), dense["times"])
+    selected = loader.get_dense(["CO", "H"])
+    assert selected["columns"] == ["CO", "H"]
+    np.testing.assert_allclose(selected["values"][4], expected, rtol=1e-5)
+
+
+def test_store_without_dense_tensor(store):
+    with pytest.raises(RuntimeError):
+        DataLoaderHDF(store).get_dense()
@@ -0,0 +1,42 @@
+import h5py
+import numpy as np
+import pytest
+from helpers import make_output, write_store
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.shards import finalize_shards, get_shard_path
+
+
+@pytest.fixture
+def master(tmp_path):
+    path = tmp_path / "grid.h5"
+    for shard_index in range(2):
+        write_store(get_shard_path(path, shard_index, 2), n_models=3, first=3 * shard_index, dense=True, summary=True)
+    finalize_shards(path, 2)
+    return path
+
+
+def test_shard_path(tmp_path):
+    assert get_shard_path(tmp_path / "grid.h5", 3, 16).name == "grid.shard0003-of-0016.h5"
+
+
+def test_master_presents_all_shards(master):
+    loader = DataLoaderHDF(master)
+    assert loader.datasets == [f"grid_{i}" for i in range(6)]
+    model_df = loader.models_df
+    density, temperature = model_df.loc[model_df["storage_id"] == "grid_4", ["initialDens", "initialTemp"]].iloc[0]
+    np.testing.assert_allclose(loader["grid_4"]["abundances"].to_numpy(), make_output(density, temperature).to_numpy())
+    dense = loader.get_dense()
+    assert dense["values"].shape[0] == 6 and np.isfinite(dense["values"]).all()
+    assert list(loader.summary("final").index) == loader.datasets
+    with h5py.File(master, "r") as fh:
+        assert fh["grid_4/abundances"].is_virtual
+
+
+def test_finalize_checks_the_shards(tmp_path):
+    with pytest.raises(RuntimeError):
+        finalize_shards(tmp_path / "grid.h5", 2)
+    for shard_index in range(2):
+        write_store(get_shard_path(tmp_path / "grid.h5", shard_index, 2), n_models=2)
+    with pytest.raises(RuntimeError):
+        finalize_shards(tmp_path / "grid.h5", 2)
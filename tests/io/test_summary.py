@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from helpers import make_output
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.summary import summarize
+
+
+def test_summarize_skips_the_initial_output():
+    times = np.array([0.0, 1.0, 10.0, 100.0])
+    values = np.array([[0.0], [1e-8], [1e-6], [1e-7]])
+    statistics = summarize(times, values)
+    assert statistics["final"][0] == 1e-7
+    assert statistics["peak"][0] == 1e-6
+    assert statistics["peak_time"][0] == 10.0
+    assert statistics["minimum"][0] == 1e-8
+    np.testing.assert_allclose(statistics["log_mean"], [-7.0])
+
+
+def test_summary_of_a_store(dense_store):
+    loader = DataLoaderHDF(dense_store)
+    final = loader.summary("final", ["CO", "H"])
+    assert list(final.columns) == ["CO", "H"]
+    assert list(final.index) == loader.datasets
+    # grid_2 has density 1e4 and temperature 30.
+    output = make_output(1e4, 30.0)
+    np.testing.assert_allclose(final.loc["grid_2"], output[["CO", "H"]].iloc[-1], rtol=1e-6)
+    selected = final.index[final["CO"] > output["CO"].iloc[-1] / 2]
+    assert "grid_2" in selected
+    assert loader.summary("peak_time")["CO"].eq(1e6).all()
+
+
+def test_summary_errors(store, dense_store):
+    with pytest.raises(ValueError):
+        DataLoaderHDF(dense_store).summary("median")
+    with pytest.raises(RuntimeError):
+        DataLoaderHDF(store).summary("final")
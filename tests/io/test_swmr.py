@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import make_output
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.resample import get_time_grid
+from uclchem_tools.io.writer import SWMRStoreWriter, open_writer
+
+
+def test_live_reader_sees_completed_models(tmp_path, network):
+    path = tmp_path / "grid.h5"
+    model_df = pd.DataFrame(
+        {"initialDens": [1e2, 1e3, 1e4], "finalTime": 1e6, "storage_id": ["grid_0", "grid_1", "grid_2"]}
+    )
+    columns = make_output(1e2, 10.0).columns
+    writer = SWMRStoreWriter(
+        path, model_df, columns, network, dense_time_grid=get_time_grid(1.0, 1e6, 8), summary=True
+    )
+    try:
+        # Written out of order, like a grid that converts the fastest models first.
+        for storage_id in ["grid_2", "grid_0"]:
+            density = model_df.set_index("storage_id").loc[storage_id, "initialDens"]
+            writer.write_network(network, storage_id)
+            writer.write_abundances(storage_id, make_output(density, 10.0))
+            writer.model_done()
+        loader = DataLoaderHDF(path, live=True)
+        assert loader.datasets == ["grid_2", "grid_0"]
+        np.testing.assert_allclose(loader["grid_0"]["abundances"].to_numpy(), make_output(1e2, 10.0).to_numpy())
+        assert loader.query(initialDens=(None, 1e3)) == ["grid_0"]
+        writer.write_abundances("grid_1", make_output(1e3, 10.0))
+        writer.model_done()
+        assert loader.refresh() == ["grid_1"]
+        with pytest.raises(NotImplementedError):
+            writer.write_rates("grid_1", "CO", None, None, None)
+    finally:
+        writer.close()
+    loader = DataLoaderHDF(path)
+    assert loader.summary("final", ["CO"]).notna().all().all()
+
+
+def test_store_without_model_dataframe(tmp_path, network):
+    path = tmp_path / "grid.h5"
+    with open_writer(path) as writer:
+        for storage_id in ["grid_0", "grid_1"]:
+            writer.write_network(network, storage_id)
+            writer.write_abundances(storage_id, make_output(1e3, 10.0))
+            writer.model_done()
+    loader = DataLoaderHDF(path)
+    assert loader.datasets == ["grid_0", "grid_1"]
+    assert loader.refresh() == []
+    with pytest.raises(RuntimeError):
+        loader.nearest({"initialDens": 1e3})
+    with pytest.raises(RuntimeError):
+        loader.query(initialDens=(1e3, None))
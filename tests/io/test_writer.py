@@ -0,0 +1,86 @@
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import make_network, make_output, write_store
+
+from uclchem_tools.io.io import DataLoaderHDF
+from uclchem_tools.io.writer import StoreWriter, open_writer
+
+
+@pytest.mark.parametrize("explicit", [False, True])
+def test_interleaved_networks(tmp_path, explicit):
+    path = tmp_path / "grid.h5"
+    network_a = make_network()
+    network_b = make_network(["H", "H2", "CO", "#CO", "HCO+"])
+    output_a = make_output(1e3, 10.0)
+    output_b = make_output(1e4, 20.0, species=("H", "H2", "CO", "HCO+"))
+    with open_writer(path) as writer:
+        # Two clients of a coordinator: both link their model before either writes it.
+        writer.write_network(network_a, "grid_a")
+        writer.write_network(network_b, "grid_b")
+        writer.write_abundances("grid_a", output_a, network_a.hash if explicit else None)
+        writer.write_abundances("grid_b", output_b, network_b.hash if explicit else None)
+    with h5py.File(path, "r") as fh:
+        for network, output in [(network_a, output_a), (network_b, output_b)]:
+            header = fh[f"networks/{network.hash}/abundances_header"][:].astype(str)
+            np.testing.assert_array_equal(header, output.columns)
+        assert fh["grid_b"].attrs["network"] == network_b.hash
+
+
+def test_store_fixture(store):
+    loader = DataLoaderHDF(store)
+    assert loader.datasets == [f"grid_{i}" for i in range(6)]
+    np.testing.assert_array_equal(loader["grid_4"]["abundances"].to_numpy(), make_output(1e3, 50.0).to_numpy())
+
+
+def test_mismatching_columns_of_a_network(tmp_path):
+    network = make_network()
+    with open_writer(tmp_path / "grid.h5") as writer:
+        writer.write_network(network, "grid_0")
+        writer.write_abundances("grid_0", make_output(1e3, 10.0))
+        writer.write_network(network, "grid_1")
+        with pytest.raises(RuntimeError):
+            writer.write_abundances("grid_1", make_output(1e3, 10.0, species=("H", "CO")))
+
+
+@pytest.mark.parametrize("suffix", [".h5", ".zarr"])
+def test_roundtrip(tmp_path, suffix):
+    if suffix == ".zarr":
+        pytest.importorskip("zarr")
+    path = tmp_path / f"grid{suffix}"
+    model_df = write_store(path, dense=True, summary=True)
+    if suffix == ".zarr":
+        from uclchem_tools.io.zarr_store import DataLoaderZarr as loader_class
+    else:
+        loader_class = DataLoaderHDF
+    loader = loader_class(path)
+    assert sorted(loader.datasets) == sorted(model_df["storage_id"])
+    abundances = loader["grid_2"]["abundances"]
+    expected = make_output(*model_df.loc[2, ["initialDens", "initialTemp"]])
+    np.testing.assert_allclose(abundances.to_numpy(), expected.to_numpy(), rtol=1e-6)
+    assert loader.get_dense()["values"].shape == (len(model_df), 16, expected.shape[1])
+
+
+def test_writer_session_writes_derivatives_and_rates(tmp_path, network):
+    path = tmp_path / "grid.h5"
+    output = make_output(1e3, 10.0, species=("H", "H2", "CO", "#CO"))
+    rates = pd.DataFrame({"Time": output["Time"], "reaction_0": 1.0}).set_index("Time")
+    with StoreWriter(path, flush_every=2) as writer:
+        for storage_id in ["grid_0", "grid_1", "grid_2"]:
+            writer.write_network(network, storage_id)
+            writer.write_abundances(storage_id, output)
+            writer.write_derivatives(storage_id, output.diff().fillna(0.0))
+            for specie in network.species_names:
+                writer.write_rates(storage_id, specie, rates, rates, pd.DataFrame())
+            writer.model_done()
+        # Flushed after the second model only.
+        assert writer._unflushed == 1
+    with h5py.File(path, "r") as fh:
+        assert list(fh["networks"]) == [network.hash]
+        assert fh["grid_1/derivatives"].shape == output.shape
+    loader = DataLoaderHDF(path)
+    assert loader.species == list(network.species_names)
+    model = loader["grid_2"]
+    np.testing.assert_array_equal(model["total_rates"]["CO"].index, output["Time"])
+    assert model["destruction"]["CO"].empty
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import make_output
+
+from uclchem_tools.io.resample import get_time_grid
+from uclchem_tools.io.writer import open_writer
+from uclchem_tools.io.zarr_store import DataLoaderZarr, ZarrStoreWriter
+
+pytest.importorskip("zarr")
+
+
+def test_concurrent_sessions_share_a_store(tmp_path, network):
+    path = tmp_path / "grid.zarr"
+    storage_ids = [f"grid_{i}" for i in range(4)]
+    time_grid = get_time_grid(1.0, 1e6, 8)
+    # Two writers that are open at the same time, like two processes of a job array.
+    writers = [open_writer(path) for _ in range(2)]
+    assert all(isinstance(writer, ZarrStoreWriter) for writer in writers)
+    for writer in writers:
+        writer.enable_dense(storage_ids, time_grid)
+        writer.enable_summary(storage_ids)
+    for i, storage_id in enumerate(storage_ids):
+        writer = writers[i % 2]
+        writer.write_network(network, storage_id)
+        writer.write_abundances(storage_id, make_output(10.0 ** (2 + i), 10.0))
+        writer.model_done()
+    writers[0].write_model_df(
+        pd.DataFrame({"initialDens": [10.0 ** (2 + i) for i in range(4)], "storage_id": storage_ids})
+    )
+    for writer in writers:
+        writer.close()
+    loader = DataLoaderZarr(path)
+    assert loader.datasets == storage_ids
+    np.testing.assert_allclose(loader["grid_3"]["abundances"].to_numpy(), make_output(1e5, 10.0).to_numpy())
+    assert np.isfinite(loader.get_dense()["values"]).all()
+    assert loader.summary("final", ["CO"]).notna().all().all()
+    assert loader.query(initialDens=(1e3, 1e4)) == ["grid_1", "grid_2"]
@@ -0,0 +1,65 @@
+"""A fake UCLCHEM for the run module, the scripts in run/ import each other as top level modules."""
+import importlib.machinery
+import pathlib
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+from helpers import REACTION_TYPES, make_output, make_tables
+
+import uclchem_tools.run as run_package
+from uclchem_tools.io.network import get_uclchem_network
+
+RUN_MODULES = ["main", "model", "cache", "matrix", "worker"]
+
+
+def _cloud(param_dict, out_species, return_dataframe=False, starting_chemistry=None):
+    """Writes (or returns) the output of make_output, the density sets the abundances."""
+    output = make_output(param_dict.get("initialDens", 1e2), param_dict.get("initialTemp", 10.0))
+    if starting_chemistry is not None:
+        output.iloc[:, 3:] *= starting_chemistry[0]
+    final = output.iloc[-1, 3:].to_numpy(dtype="float64")
+    if not return_dataframe:
+        output.to_csv(param_dict["outputFile"], index=False)
+        if "abundSaveFile" in param_dict:
+            np.savetxt(param_dict["abundSaveFile"], final)
+        return [0] + [final[0]]
+    return output.iloc[:, :3], output.iloc[:, 3:], final, 0
+
+
+@pytest.fixture
+def fake_uclchem_package(monkeypatch):
+    """Install a fake uclchem package and make the scripts of run/ importable."""
+    uclchem = types.ModuleType("uclchem")
+    # main.py looks for UCLCHEM with importlib.util.find_spec.
+    uclchem.__spec__ = importlib.machinery.ModuleSpec("uclchem", None)
+    uclchem.model = types.SimpleNamespace(
+        cloud=_cloud, hot_core=_cloud, collapse=_cloud, cshock=_cloud, jshock=_cloud
+    )
+    uclchem.utils = types.SimpleNamespace(
+        get_species_table=lambda: make_tables()[0],
+        get_reaction_table=lambda: make_tables()[1],
+    )
+    uclchem.analysis = types.SimpleNamespace(read_output_file=pd.read_csv)
+    makerates = types.ModuleType("uclchem.makerates")
+    reaction = types.ModuleType("uclchem.makerates.reaction")
+    reaction.reaction_types = REACTION_TYPES
+    # The rates module imports the compiled wrapper.
+    wrap = types.ModuleType("uclchem.uclchemwrap")
+    wrap.uclchemwrap = types.SimpleNamespace()
+    for name, module in [
+        ("uclchem", uclchem),
+        ("uclchem.makerates", makerates),
+        ("uclchem.makerates.reaction", reaction),
+        ("uclchem.uclchemwrap", wrap),
+    ]:
+        monkeypatch.setitem(sys.modules, name, module)
+    # Import the run modules again with the fake.
+    for name in RUN_MODULES:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    monkeypatch.syspath_prepend(str(pathlib.Path(run_package.__file__).parent))
+    get_uclchem_network.cache_clear()
+    yield uclchem
+    get_uclchem_network.cache_clear()
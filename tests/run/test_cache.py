@@ -0,0 +1,113 @@
+import pathlib
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import uclchem_tools.run as run_package
+from uclchem_tools.run.cache import RunCache
+from uclchem_tools.run.main import execute_model
+
+PARAM_DICT = {"initialDens": 1e4, "finalTime": 1e6}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RunCache(tmp_path / "cache")
+
+
+def get_key(cache, param_dict):
+    return cache.get_key("3.3+abc", "cloud", {}, param_dict, "CO")
+
+
+def test_key_ignores_output_paths(cache):
+    a = get_key(cache, {**PARAM_DICT, "outputFile": "a/out.csv"})
+    b = get_key(cache, {**PARAM_DICT, "outputFile": "b/other.csv"})
+    assert a == b
+    assert get_key(cache, {**PARAM_DICT, "initialDens": 10_000}) == get_key(cache, PARAM_DICT)
+
+
+def test_key_depends_on_requested_outputs(cache):
+    # A run without an abundSaveFile cannot be restored for a run that needs one.
+    with_output = get_key(cache, {**PARAM_DICT, "outputFile": "out.csv"})
+    with_save = get_key(cache, {**PARAM_DICT, "outputFile": "out.csv", "abundSaveFile": "start.dat"})
+    assert with_output != with_save
+    assert with_output != get_key(cache, PARAM_DICT)
+
+
+def test_store_and_restore(cache, tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("Time,CO\n0,1e-10\n")
+    param_dict = {**PARAM_DICT, "outputFile": str(output)}
+    key = get_key(cache, param_dict)
+    cache.store(key, param_dict)
+    assert key in cache
+    restored = tmp_path / "restored.csv"
+    cache.restore(key, {**param_dict, "outputFile": str(restored)})
+    assert restored.read_text() == output.read_text()
+
+
+def test_store_skips_missing_outputs(cache, tmp_path):
+    output = tmp_path / "out.csv"
+    output.write_text("Time,CO\n")
+    param_dict = {**PARAM_DICT, "outputFile": str(output), "abundSaveFile": str(tmp_path / "missing.dat")}
+    key = get_key(cache, param_dict)
+    cache.store(key, param_dict)
+    assert key not in cache
+
+
+@pytest.fixture
+def fake_uclchem(monkeypatch):
+    """A fake UCLCHEM model for the run module, it writes its output file unless it fails."""
+    monkeypatch.syspath_prepend(str(pathlib.Path(run_package.__file__).parent))
+    import cache as cache_module
+
+    monkeypatch.setattr(cache_module, "get_uclchem_fingerprint", lambda: "3.3+abc")
+    state = types.SimpleNamespace(success_flag=0, calls=[])
+
+    def run_model(name, param_dict, outspecies, model_args):
+        state.calls.append(name)
+        if state.success_flag >= 0:
+            pathlib.Path(param_dict["outputFile"]).write_text("Time,CO\n")
+        return state.success_flag
+
+    monkeypatch.setitem(sys.modules, "model", types.SimpleNamespace(run_model=run_model))
+    return state
+
+
+def get_config(tmp_path):
+    return {"param_dict": {**PARAM_DICT, "outputFile": str(tmp_path / "out.csv")}, "outspecies": ["CO"]}
+
+
+def test_execute_model_caches_successful_runs(fake_uclchem, cache, tmp_path):
+    config = get_config(tmp_path)
+    execute_model("cloud", config, {}, cache=cache)
+    execute_model("cloud", config, {}, cache=cache)
+    assert fake_uclchem.calls == ["cloud"]
+
+
+def test_execute_model_does_not_cache_failed_runs(fake_uclchem, cache, tmp_path):
+    fake_uclchem.success_flag = -1
+    config = get_config(tmp_path)
+    execute_model("cloud", config, {}, cache=cache)
+    execute_model("cloud", config, {}, cache=cache)
+    assert fake_uclchem.calls == ["cloud", "cloud"]
+    assert not any(cache.cache_dir.iterdir())
+
+
+def test_store_and_restore_in_memory(cache):
+    df = pd.DataFrame({"Time": [0.0, 1.0], "CO": [1e-10, 2e-10]})
+    key = cache.get_key("3.3+abc", "cloud", {}, PARAM_DICT, "CO", in_memory=True)
+    assert key != get_key(cache, PARAM_DICT)
+    cache.store(key, PARAM_DICT, df, np.array([1.0, 2.0]))
+    restored, abundances_start = cache.restore(key, PARAM_DICT)
+    pd.testing.assert_frame_equal(restored, df)
+    np.testing.assert_array_equal(abundances_start, [1.0, 2.0])
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = RunCache(tmp_path / "cache", max_bytes=0)
+    cache.store("a" * 64, PARAM_DICT, pd.DataFrame({"CO": np.ones(1000)}))
+    assert not any(cache.cache_dir.iterdir())
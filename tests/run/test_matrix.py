@@ -0,0 +1,67 @@
+import h5py
+import pytest
+
+from uclchem_tools.run import matrix
+from uclchem_tools.run.matrix import get_version_keys, get_worker_args, link_comparison_store
+
+
+@pytest.mark.parametrize(
+    "options, expected",
+    [
+        ({}, []),
+        ({"no_cache": True, "cache_size": 5.0}, ["--no-cache"]),
+        ({"cache_dir": "/tmp/cache"}, ["--cache-dir", "/tmp/cache"]),
+        ({"cache_dir": "/tmp/cache", "cache_size": 2.5}, ["--cache-dir", "/tmp/cache", "--cache-size", "2.5"]),
+    ],
+)
+def test_worker_args_forward_the_cache_options(options, expected):
+    assert get_worker_args(**options) == expected
+
+
+def test_version_keys_tell_worktrees_apart():
+    venvpaths = ["/src/uclchem-a/.venv", "/src/uclchem-b/.venv", "/src/uclchem-c/.venv"]
+    keys = get_version_keys(venvpaths, ["3.3.0", "3.3.0", "3.4.0"])
+    assert keys == ["3.3.0@uclchem-a", "3.3.0@uclchem-b", "3.4.0"]
+    with pytest.raises(RuntimeError):
+        get_version_keys(venvpaths[:1] * 2, ["3.3.0", "3.3.0"])
+
+
+def test_link_comparison_store(tmp_path):
+    workdir = tmp_path / "comparison.d"
+    workdir.mkdir()
+    with h5py.File(workdir / "3.3.0-0.h5", "w") as fh:
+        fh["grid_0/abundances"] = [[1.0]]
+    link_comparison_store(
+        tmp_path / "comparison.h5",
+        {"3.3.0": [workdir / "3.3.0-0.h5", workdir / "missing.h5"]},
+        {"3.3.0": {"uclchem_version": "3.3.0"}},
+    )
+    with h5py.File(tmp_path / "comparison.h5", "r") as fh:
+        assert fh["3.3.0/grid_0/abundances"][0, 0] == 1.0
+        assert fh["3.3.0"].attrs["uclchem_version"] == "3.3.0"
+
+
+def test_workers_are_stopped_when_one_does_not_start(tmp_path, monkeypatch):
+    started = []
+
+    class FakeWorker:
+        def __init__(self, venvpath, worker_args=None):
+            if "broken" in str(venvpath):
+                raise RuntimeError(f"The worker in {venvpath} stopped")
+            self.version = "3.3.0"
+            self.stopped = False
+            started.append(self)
+
+        def stop(self):
+            self.stopped = True
+
+    monkeypatch.setattr(matrix, "Worker", FakeWorker)
+    with pytest.raises(RuntimeError):
+        matrix.run_matrix(
+            ["/src/uclchem-a/.venv", "/src/broken/.venv", "/src/uclchem-c/.venv"],
+            [],
+            tmp_path / "comparison.h5",
+            workers_per_venv=2,
+        )
+    assert len(started) == 4
+    assert all(worker.stopped for worker in started)
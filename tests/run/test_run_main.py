@@ -0,0 +1,134 @@
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import yaml
+from helpers import make_output
+
+import uclchem_tools
+from uclchem_tools.run.main import get_task_configpaths
+from uclchem_tools.utils.partition import get_missing_tasks
+
+SRC = str(pathlib.Path(uclchem_tools.__file__).parents[1])
+MAIN = str(pathlib.Path(uclchem_tools.__file__).parent / "run" / "main.py")
+SCHEDULER_VARIABLES = [
+    "SLURM_ARRAY_TASK_ID",
+    "SLURM_ARRAY_TASK_MIN",
+    "SLURM_ARRAY_TASK_COUNT",
+    "SGE_TASK_ID",
+    "LSB_JOBINDEX",
+    "PBS_ARRAY_INDEX",
+    "PBS_ARRAYID",
+]
+
+
+def get_config(tmp_path, name="model", **param_dict):
+    return {
+        "model": "cloud",
+        "settings": {"run_model": True, "hdf_save": str(tmp_path / "grid.h5"), "get_rates": False},
+        "param_dict": {"initialDens": 1e3, "outputFile": str(tmp_path / f"{name}.csv"), **param_dict},
+        "outspecies": ["CO"],
+    }
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_run_config_writes_the_store(fake_uclchem_package, tmp_path, in_memory):
+    from main import run_config
+
+    from uclchem_tools.io.io import DataLoaderHDF
+
+    run_config(get_config(tmp_path), "model.yaml", in_memory=in_memory)
+    loader = DataLoaderHDF(tmp_path / "grid.h5")
+    assert "model" in loader.datasets
+    np.testing.assert_allclose(
+        loader["model"]["abundances"].to_numpy(), make_output(1e3, 10.0).to_numpy(), rtol=1e-6
+    )
+    # In memory runs do not write the csv.
+    assert (tmp_path / "model.csv").exists() != in_memory
+
+
+def test_in_memory_chain_uses_the_saved_abundances(fake_uclchem_package, tmp_path):
+    from main import run_config
+
+    from uclchem_tools.io.io import DataLoaderHDF
+
+    writers = {}
+    run_config(get_config(tmp_path, "first", abundSaveFile="start.dat"), "first.yaml", in_memory=True, writers=writers)
+    run_config(get_config(tmp_path, "second", abundLoadFile="start.dat"), "second.yaml", in_memory=True, writers=writers)
+    for writer in writers.values():
+        writer.close()
+    loader = DataLoaderHDF(tmp_path / "grid.h5")
+    first, second = loader["first"]["abundances"], loader["second"]["abundances"]
+    # The second run started from the final abundances of the first.
+    np.testing.assert_allclose(second["H"], first["H"] * first["H"].iloc[-1], rtol=1e-5)
+
+
+def test_run_model_in_memory_refuses_file_keys(fake_uclchem_package):
+    from model import run_model
+
+    df, abundances_start = run_model("cloud", {"initialDens": 1e3}, ["CO"], return_dataframe=True)
+    assert list(df.columns) == list(make_output(1e3, 10.0).columns)
+    assert abundances_start.shape == (3,)
+    with pytest.raises(RuntimeError):
+        run_model("cloud", {"outputFile": "out.csv"}, ["CO"], return_dataframe=True)
+
+
+def test_venv_command_keeps_paths_with_spaces(fake_uclchem_package, tmp_path):
+    from main import get_venv_command
+
+    args = argparse.Namespace(
+        configpaths=[str(tmp_path / "my grid" / "model.yaml")],
+        in_memory=True,
+        no_cache=False,
+        cache_dir=str(tmp_path / "run cache"),
+        coordinate_writes=False,
+        cache_size=2.0,
+    )
+    command = get_venv_command(tmp_path / "my venv", args)
+    assert command[0] == str(tmp_path / "my venv" / "bin/python")
+    assert command[1].endswith("main.py")
+    assert command[2:] == [
+        str(tmp_path / "my grid" / "model.yaml"),
+        "--in-memory",
+        "--cache-dir",
+        str(tmp_path / "run cache"),
+        "--cache-size",
+        "2.0",
+        "--task-index",
+        "0",
+        "--task-count",
+        "1",
+    ]
+
+
+def test_job_array_is_partitioned_once_with_a_venv(tmp_path):
+    configpaths = []
+    for i, final_time in enumerate([1e6, 1e5, 1e4, 1e3]):
+        configpath = tmp_path / f"model_{i}.yaml"
+        configpath.write_text(yaml.safe_dump({"param_dict": {"finalTime": final_time, "writeStep": 1}}))
+        configpaths.append(str(configpath))
+    # A fake venv, its python records the command line it was started with.
+    python = tmp_path / "venv" / "bin" / "python"
+    python.parent.mkdir(parents=True)
+    python.write_text(f'#!/bin/sh\nprintf "%s\\n" "$@" > {tmp_path / "argv.txt"}\n')
+    python.chmod(0o755)
+    env = {key: value for key, value in os.environ.items() if key not in SCHEDULER_VARIABLES}
+    env.update(
+        PYTHONPATH=os.pathsep.join([SRC, os.environ.get("PYTHONPATH", "")]),
+        SLURM_ARRAY_TASK_ID="1",
+        SLURM_ARRAY_TASK_MIN="0",
+        SLURM_ARRAY_TASK_COUNT="2",
+    )
+    command = [sys.executable, MAIN, *configpaths, "--venvpath", str(tmp_path / "venv")]
+    subprocess.run([*command, "--marker-dir", str(tmp_path / "markers")], env=env, check=True)
+    argv = (tmp_path / "argv.txt").read_text().splitlines()
+    # The child runs all configurations of task 1, instead of task 1 of those.
+    task_configpaths = get_task_configpaths(configpaths, 1, 2)
+    assert argv[1 : 1 + len(task_configpaths)] == task_configpaths
+    assert argv[argv.index("--task-count") + 1] == "1"
+    assert argv[argv.index("--task-index") + 1] == "0"
+    assert get_missing_tasks(tmp_path / "markers", 2) == [0]
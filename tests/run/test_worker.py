@@ -0,0 +1,42 @@
+import pathlib
+
+import yaml
+
+
+def test_relocate_files_keeps_chains(fake_uclchem_package, tmp_path):
+    from worker import relocate_files
+
+    scratch = tmp_path / "scratch"
+    param_dict = relocate_files(
+        {"initialDens": 1e3, "outputFile": "/data/out.csv", "abundSaveFile": "start.dat"}, scratch
+    )
+    assert param_dict["initialDens"] == 1e3
+    assert pathlib.Path(param_dict["outputFile"]) == scratch / "data/out.csv"
+    assert relocate_files({"abundLoadFile": "start.dat"}, scratch)["abundLoadFile"] == param_dict["abundSaveFile"]
+    assert (scratch / "data").is_dir()
+
+
+def test_handle_writes_to_the_store_of_the_request(fake_uclchem_package, tmp_path):
+    from worker import handle
+
+    from uclchem_tools.io.io import DataLoaderHDF
+
+    configpath = tmp_path / "model.yaml"
+    with open(configpath, "w") as fh:
+        yaml.safe_dump(
+            {
+                "model": "cloud",
+                "settings": {"run_model": True, "hdf_save": True, "get_rates": False},
+                "param_dict": {"initialDens": 1e3, "outputFile": "model.csv"},
+                "outspecies": ["CO"],
+            },
+            fh,
+        )
+    writers = {}
+    request = {"configpath": str(configpath), "store": str(tmp_path / "3.3.0-0.h5"), "scratch": str(tmp_path / "scratch")}
+    answer = handle(request, None, writers)
+    for writer in writers.values():
+        writer.close()
+    assert answer == {"status": "done", "configpath": str(configpath), "datakey": "model"}
+    assert (tmp_path / "scratch/model.csv").exists()
+    assert "model" in DataLoaderHDF(tmp_path / "3.3.0-0.h5").datasets
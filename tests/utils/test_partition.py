@@ -0,0 +1,100 @@
+import json
+
+import pytest
+import yaml
+
+from uclchem_tools.run.main import get_task_configpaths
+from uclchem_tools.utils.partition import (
+    estimate_config_cost,
+    get_marker_path,
+    get_missing_tasks,
+    partition_by_cost,
+    resolve_task,
+    wait_for_tasks,
+    write_marker,
+)
+
+# The job array variables of SLURM, SGE, LSF and PBS.
+SCHEDULER_VARIABLES = [
+    "SLURM_ARRAY_TASK_ID",
+    "SLURM_ARRAY_TASK_MIN",
+    "SLURM_ARRAY_TASK_COUNT",
+    "SGE_TASK_ID",
+    "SGE_TASK_FIRST",
+    "SGE_TASK_LAST",
+    "SGE_TASK_STEPSIZE",
+    "LSB_JOBINDEX",
+    "LSB_JOBINDEX_END",
+    "PBS_ARRAY_INDEX",
+    "PBS_ARRAYID",
+]
+
+
+@pytest.fixture(autouse=True)
+def no_job_array(monkeypatch):
+    for variable in SCHEDULER_VARIABLES:
+        monkeypatch.delenv(variable, raising=False)
+
+
+def test_partition_balances_costs():
+    costs = [10, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+    partition = partition_by_cost(costs, 2)
+    assert partition[0] == [0]
+    assert sorted(partition[0] + partition[1]) == list(range(len(costs)))
+    assert partition_by_cost(costs, 2) == partition
+
+
+@pytest.mark.parametrize(
+    "env, expected",
+    [
+        ({"SLURM_ARRAY_TASK_ID": "5", "SLURM_ARRAY_TASK_MIN": "1", "SLURM_ARRAY_TASK_COUNT": "8"}, (4, 8)),
+        ({"SGE_TASK_ID": "3", "SGE_TASK_FIRST": "1", "SGE_TASK_LAST": "9", "SGE_TASK_STEPSIZE": "2"}, (1, 5)),
+        ({"LSB_JOBINDEX": "2", "LSB_JOBINDEX_END": "4"}, (1, 4)),
+        ({}, (None, None)),
+    ],
+)
+def test_resolve_task_from_the_environment(monkeypatch, env, expected):
+    for variable, value in env.items():
+        monkeypatch.setenv(variable, value)
+    assert resolve_task() == expected
+
+
+def test_resolve_task_checks_the_index(monkeypatch):
+    monkeypatch.setenv("PBS_ARRAY_INDEX", "2")
+    with pytest.raises(ValueError):
+        resolve_task()
+    assert resolve_task(task_count=3) == (2, 3)
+    with pytest.raises(ValueError):
+        resolve_task(task_index=3, task_count=3)
+
+
+def test_config_cost():
+    assert estimate_config_cost({"param_dict": {"finalTime": 1e6, "writeStep": 10}}) == 1e5
+    assert estimate_config_cost({"settings": {"cost": 3}, "param_dict": {}}) == 3.0
+
+
+def test_markers(tmp_path):
+    write_marker(tmp_path, 0, 2, ["a.yaml"])
+    assert get_missing_tasks(tmp_path, 2) == [1]
+    assert not wait_for_tasks(tmp_path, 2, timeout=0.0, poll_interval=0.0)
+    write_marker(tmp_path, 1, 2)
+    assert wait_for_tasks(tmp_path, 2, timeout=0.0)
+    with open(get_marker_path(tmp_path, 0, 2)) as fh:
+        assert json.load(fh)["items"] == ["a.yaml"]
+
+
+def test_chains_stay_on_one_task(tmp_path):
+    param_dicts = [
+        {"finalTime": 1e6, "abundSaveFile": "a.dat"},
+        {"finalTime": 1e6, "abundLoadFile": "a.dat"},
+        {"finalTime": 1e6},
+        {"finalTime": 1e6},
+    ]
+    configpaths = []
+    for i, param_dict in enumerate(param_dicts):
+        configpaths.append(str(tmp_path / f"{i}.yaml"))
+        with open(configpaths[-1], "w") as fh:
+            yaml.safe_dump({"param_dict": param_dict}, fh)
+    tasks = [get_task_configpaths(configpaths, task_index, 2) for task_index in range(2)]
+    assert sorted(tasks[0] + tasks[1]) == sorted(configpaths)
+    assert any(configpaths[:2] == task[:2] for task in tasks)